@@ -0,0 +1,77 @@
+"""Throughput and CPU cost of copying a download to a local file.
+
+Copies `--size` MB with `osfclient.models.file.copyfileobj`, the loop used
+by `File.write_to`, from two sources: an in-memory stream, which shows the
+cost of the loop itself, and the streamed response of a local mock of the
+OSF, which adds the HTTP stack. Prints GB/s and the CPU seconds the copying
+thread spent per GB, the server's thread is not counted.
+
+    $ python benchmarks/bench_copy.py --size 1024
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from osfclient.models.file import copyfileobj  # noqa: E402
+
+from mock_server import MockOSFServer, file_content  # noqa: E402
+
+
+def in_memory(size):
+    content = file_content(0, 2**24)
+    stream = io.BytesIO(content * (size // len(content)))
+    stream.seek(0)
+    return stream
+
+
+def from_server(server):
+    response = requests.get(server._wb_url('file'), stream=True)
+    response.raw.decode_content = True
+    return response.raw
+
+
+def measure(name, source, size, repeat):
+    best = None
+    for _ in range(repeat):
+        fsrc = source()
+        with open(os.devnull, 'wb') as fdst:
+            wall, cpu = time.time(), time.thread_time()
+            copyfileobj(fsrc, fdst, size)
+            wall, cpu = time.time() - wall, time.thread_time() - cpu
+        if best is None or wall < best[0]:
+            best = (wall, cpu)
+
+    wall, cpu = best
+    gb = size / 2.**30
+    print('{:<10} {:6.2f} GB/s  {:5.2f} CPU s/GB'.format(
+        name, gb / wall, cpu / gb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=1024,
+                        help='MB to copy, a multiple of 16')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    size = args.size * 2**20
+    # the progress bars would drown the results
+    sys.stderr = open(os.devnull, 'w')
+    try:
+        measure('memory', lambda: in_memory(size), size, args.repeat)
+        with MockOSFServer(file_size=size) as server:
+            measure('http', lambda: from_server(server), size, args.repeat)
+    finally:
+        sys.stderr = sys.__stderr__
+
+
+if __name__ == '__main__':
+    main()
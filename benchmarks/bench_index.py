@@ -0,0 +1,74 @@
+"""Time to build a `StorageIndex` and to look up paths in it.
+
+Fills an index with fake entries (a million by default) and measures how
+long single path lookups and listing all files take.
+
+    $ python benchmarks/bench_index.py --entries 1000000
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from osfclient.models import StorageIndex  # noqa: E402
+
+STORAGE = 'f3szh:osfstorage'
+
+
+def entry(path):
+    return {
+        'id': path,
+        'attributes': {'kind': 'file', 'name': os.path.basename(path),
+                       'materialized_path': '/' + path, 'size': 1024,
+                       'date_modified': '2017-03-20T16:24:57.417044',
+                       'extra': {'hashes': {'md5': '0' * 32,
+                                            'sha256': '0' * 64}}},
+        'links': {'download': 'https://files.osf.io/v1/resources/f3szh/'
+                              'providers/osfstorage/' + path}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=10**6)
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+
+    paths = ['folder{}/file{}.txt'.format(n % 1000, n)
+             for n in range(args.entries)]
+    directory = tempfile.mkdtemp()
+    try:
+        index = StorageIndex(directory)
+
+        start = time.time()
+        writer = index.writer(STORAGE)
+        for path in paths:
+            writer.add(entry(path))
+        writer.commit()
+        print('indexed {} entries in {:.1f}s ({:.0f} MB)'.format(
+            args.entries, time.time() - start,
+            os.path.getsize(index.path) / 2.**20))
+
+        sample = random.sample(paths, min(args.lookups, len(paths)))
+        start = time.time()
+        for path in sample:
+            assert index.get(STORAGE, path) is not None
+        per_lookup = (time.time() - start) / len(sample)
+        print('lookup {:.3f}ms'.format(1000 * per_lookup))
+
+        start = time.time()
+        n_files = sum(1 for _ in index.files(STORAGE))
+        print('listed {} files in {:.1f}s'.format(n_files,
+                                                  time.time() - start))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Time spent decoding the JSON of OSF responses.
+
+Builds a listing page of 100 files and folders, a list of storages and a
+project from the shapes in `osfclient/tests/fake_responses.py` and decodes
+each many times with the json module, with `requests.Response.json()` and
+with `osfclient.models.session.loads()` (which uses orjson if installed).
+
+    $ python benchmarks/bench_json.py --repeat 2000
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from osfclient.models import session  # noqa: E402
+from osfclient.tests import fake_responses  # noqa: E402
+
+
+def documents():
+    names = ['file{}.txt'.format(n) for n in range(90)]
+    folders = ['folder{}'.format(n) for n in range(10)]
+    listing = fake_responses.files_node('f3szh', 'osfstorage', names,
+                                        folder_names=folders)
+    return [
+        ('listing page', json.dumps(listing).encode('utf-8')),
+        ('storages', json.dumps(fake_responses.storage_node(
+            'f3szh', ['osfstorage', 'github', 'figshare'])).encode('utf-8')),
+        ('project', json.dumps(fake_responses.project_node).encode('utf-8')),
+    ]
+
+
+def response(content):
+    response = requests.Response()
+    response._content = content
+    response.encoding = 'utf-8'
+    response.status_code = 200
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    print('orjson', 'installed' if session.orjson is not None else
+          'not installed')
+    for name, content in documents():
+        decoders = [
+            ('json.loads', lambda: json.loads(content.decode('utf-8'))),
+            ('Response.json', lambda: response(content).json()),
+            ('loads', lambda: session.loads(content)),
+        ]
+        for decoder, decode in decoders:
+            elapsed = timeit.timeit(decode, number=args.repeat)
+            print('{:<13} {:>7} bytes  {:<14} {:8.1f}us  {:6.0f} MB/s'.format(
+                name, len(content), decoder, 1e6 * elapsed / args.repeat,
+                len(content) * args.repeat / elapsed / 2**20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Memory used by the `File` objects of a large listing.
+
+Parses pages of fake but complete OSF file entries, like a listing of a
+large storage would, keeps a `File` for every entry and measures with
+tracemalloc how many bytes each one takes once the JSON is gone.
+
+    $ python benchmarks/bench_memory.py --files 1000000
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from osfclient.models import File  # noqa: E402
+from osfclient.models import OSFSession  # noqa: E402
+from osfclient.tests import fake_responses  # noqa: E402
+
+
+def page(start, size):
+    names = ['file{}.txt'.format(n) for n in range(start, start + size)]
+    listing = fake_responses.files_node('f3szh', 'osfstorage', names)
+    for n, entry in enumerate(listing['data']):
+        # the links of real files contain their id
+        entry['id'] = '{:024x}'.format(start + n)
+        entry['attributes']['path'] = '/' + entry['id']
+        for name, link in entry['links'].items():
+            entry['links'][name] = link.replace(
+                '58becc229ad5a101f98293a3', entry['id']).replace(
+                names[n], entry['id'])
+        entry['attributes']['extra']['hashes'] = {'md5': '0' * 32,
+                                                  'sha256': '0' * 64}
+    return json.dumps(listing)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=10**6)
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    session = OSFSession()
+    # the same text for every page, only the parsing is measured
+    text = page(0, args.page_size)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.time()
+    files = []
+    for _ in range(0, args.files, args.page_size):
+        for entry in json.loads(text)['data']:
+            files.append(File(entry, session))
+    elapsed = time.time() - start
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    print('{} files in {:.1f}s, {:.0f} MB, {:.0f} bytes per file'.format(
+        len(files), elapsed, used / 2.**20, used / float(len(files))))
+
+    tracemalloc.start()
+    entries = [json.loads(text)['data'] for _ in range(10)]
+    per_entry = tracemalloc.get_traced_memory()[0] / (10. * args.page_size)
+    tracemalloc.stop()
+    print('for comparison the JSON of an entry takes {:.0f} bytes'.format(
+        per_entry))
+    del entries
+
+
+if __name__ == '__main__':
+    main()
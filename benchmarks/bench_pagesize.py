@@ -0,0 +1,62 @@
+"""Number of requests and time needed to list a large storage.
+
+Lists all files of a storage with 10,000 files (by default) in a local mock
+of the OSF API using different page sizes. The mock server uses a default
+page size of 10 and allows at most 100 entries per page, like the OSF.
+Rate limiting is disabled so that only the number of round trips matters.
+
+    $ python benchmarks/bench_pagesize.py --page-sizes 0 50 100
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from osfclient import OSF  # noqa: E402
+
+from mock_server import MockOSFServer  # noqa: E402
+
+
+def list_files(server, page_size):
+    osf = OSF(rate_limit=None, page_size=page_size)
+    osf.session.base_url = server.api_url
+    project = osf.project(server.project_id)
+    return sum(1 for _ in project.storage().files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--folders', type=int, default=9)
+    parser.add_argument('--files', type=int, default=1000,
+                        help='Files per folder')
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='Simulated server latency in seconds')
+    parser.add_argument('--page-sizes', type=int, nargs='+',
+                        default=[0, 50, 100],
+                        help="Page sizes to try, 0 uses the server's default")
+    args = parser.parse_args()
+
+    with MockOSFServer(n_folders=args.folders, files_per_folder=args.files,
+                       latency=args.latency) as server:
+        print('{} folders, {} files, {:.0f}ms latency'.format(
+            args.folders, server.n_files, 1000 * args.latency))
+        print('{:>10} {:>10} {:>10}'.format('page size', 'requests',
+                                            'list [s]'))
+
+        for page_size in args.page_sizes:
+            server.reset_count()
+            start = time.time()
+            n_files = list_files(server, page_size or None)
+            duration = time.time() - start
+            assert n_files == server.n_files, n_files
+
+            print('{:>10} {:>10} {:>10.2f}'.format(
+                page_size or 'default', server.request_count, duration))
+
+
+if __name__ == '__main__':
+    main()
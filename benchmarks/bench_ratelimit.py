@@ -0,0 +1,105 @@
+"""Wall-clock time to list and clone a project at different rate limits.
+
+Runs against a local mock of the OSF API, `--latency` simulates the round
+trip time to the real server. A rate of 0 disables rate limiting.
+
+    $ python benchmarks/bench_ratelimit.py --rates 1 5 20 0 --burst 1 10
+"""
+from __future__ import print_function
+
+import argparse
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from osfclient import OSF  # noqa: E402
+
+from mock_server import MockOSFServer  # noqa: E402
+
+
+@contextlib.contextmanager
+def quiet_stderr():
+    # `File.write_to` draws a progress bar for every file
+    stderr = sys.stderr
+    with open(os.devnull, 'w') as devnull:
+        sys.stderr = devnull
+        try:
+            yield
+        finally:
+            sys.stderr = stderr
+
+
+def connect(server, rate, burst):
+    osf = OSF(rate_limit=rate or None, burst=burst)
+    osf.session.base_url = server.api_url
+    return osf.project(server.project_id)
+
+
+def list_files(server, rate, burst):
+    project = connect(server, rate, burst)
+    return sum(1 for store in project.storages for _ in store.files)
+
+
+def clone(server, rate, burst):
+    project = connect(server, rate, burst)
+    output = tempfile.mkdtemp()
+    try:
+        n = 0
+        for store in project.storages:
+            for file_ in store.files:
+                path = os.path.join(output, file_.path.lstrip('/'))
+                directory = os.path.dirname(path)
+                if not os.path.exists(directory):
+                    os.makedirs(directory)
+                with open(path, 'wb') as fp:
+                    file_.write_to(fp)
+                n += 1
+        return n
+    finally:
+        shutil.rmtree(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--folders', type=int, default=5)
+    parser.add_argument('--files', type=int, default=3,
+                        help='Files per folder')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Simulated server latency in seconds')
+    parser.add_argument('--rates', type=float, nargs='+',
+                        default=[1, 5, 20, 0])
+    parser.add_argument('--burst', type=int, nargs='+', default=[1, 10])
+    args = parser.parse_args()
+
+    with MockOSFServer(n_folders=args.folders, files_per_folder=args.files,
+                       latency=args.latency) as server:
+        print('{} folders, {} files, {:.0f}ms latency'.format(
+            args.folders, server.n_files, 1000 * args.latency))
+        print('{:>8} {:>6} {:>10} {:>10} {:>10}'.format(
+            'rate/s', 'burst', 'requests', 'list [s]', 'clone [s]'))
+
+        for rate in args.rates:
+            for burst in args.burst:
+                server.reset_count()
+                start = time.time()
+                list_files(server, rate, burst)
+                list_time = time.time() - start
+                n_requests = server.request_count
+
+                start = time.time()
+                with quiet_stderr():
+                    clone(server, rate, burst)
+                clone_time = time.time() - start
+
+                print('{:>8} {:>6} {:>10} {:>10.2f} {:>10.2f}'.format(
+                    rate or 'inf', burst, n_requests, list_time,
+                    clone_time))
+
+
+if __name__ == '__main__':
+    main()
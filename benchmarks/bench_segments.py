@@ -0,0 +1,74 @@
+"""Time to download a large file in one stream or in segments.
+
+Downloads a 64MB file (by default) from a local mock of the OSF whose
+connections each send at most `--bandwidth` MB per second, the way a
+single TCP stream over a long distance is limited. With `segments > 1`
+the file is fetched with several Range requests at the same time.
+
+    $ python benchmarks/bench_segments.py --size 64 --segments 1 2 4 8
+"""
+from __future__ import print_function
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from osfclient import OSF  # noqa: E402
+from osfclient.models import File  # noqa: E402
+
+from mock_server import MockOSFServer, file_content  # noqa: E402
+
+
+def md5(path):
+    hash_md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=64,
+                        help='Size of the file in MB')
+    parser.add_argument('--bandwidth', type=float, default=16,
+                        help='MB per second per connection')
+    parser.add_argument('--segments', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--no-ranges', action='store_true',
+                        help='Pretend the server does not support ranges')
+    args = parser.parse_args()
+
+    size = args.size * 2**20
+    expected = hashlib.md5(file_content(0, size)).hexdigest()
+    directory = tempfile.mkdtemp()
+    server = MockOSFServer(file_size=size, ranges=not args.no_ranges,
+                           bandwidth=args.bandwidth * 2**20)
+    try:
+        with server:
+            osf = OSF(rate_limit=None)
+            file_ = File(server.file_json(None, 0), osf.session)
+            # the progress bars would drown the results
+            sys.stderr = open(os.devnull, 'w')
+            for segments in args.segments:
+                path = os.path.join(directory, 'file{}'.format(segments))
+                start = time.time()
+                with open(path, 'wb') as fp:
+                    file_.write_to(fp, segments=segments)
+                elapsed = time.time() - start
+                assert md5(path) == expected
+                print('{:>2} segments: {:6.2f}s {:7.1f} MB/s'.format(
+                    segments, elapsed, args.size / elapsed))
+    finally:
+        sys.stderr = sys.__stderr__
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
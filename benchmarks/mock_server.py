@@ -0,0 +1,341 @@
+"""A local stand-in for the OSF API used by the benchmarks.
+
+Serves a synthetic project with one `osfstorage` storage containing
+`n_folders` folders with `files_per_folder` files each (plus the same number
+of files at the top level). Responses have the same shape as the ones in
+`osfclient/tests/fake_responses.py`. All links point back at the server so
+the client never talks to the real OSF.
+
+Usage::
+
+    with MockOSFServer(n_folders=10, files_per_folder=5) as server:
+        osf = OSF(rate_limit=None)
+        osf.session.base_url = server.api_url
+        project = osf.project(server.project_id)
+"""
+import json
+import re
+import threading
+import time
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.urllib.parse import parse_qs, urlencode, urlparse
+
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+# the contents of every file: byte number `n` is `n % 256`
+_BLOCK = bytes(bytearray(range(256))) * 256
+
+
+def file_content(begin, end):
+    """Bytes `begin` to `end` of every file served by the mock."""
+    return b''.join(_content_chunks(begin, end))
+
+
+def _content_chunks(begin, end):
+    while begin < end:
+        size = min(len(_BLOCK) - 256, end - begin)
+        offset = begin % 256
+        yield _BLOCK[offset:offset + size]
+        begin += size
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class MockOSFServer(object):
+    """Run a fake OSF API in a background thread.
+
+    `latency` is the number of seconds every request takes before the server
+    answers, use it to simulate the round trip time to the real OSF.
+
+    File downloads support Range requests unless `ranges` is false, each
+    connection sends at most `bandwidth` bytes per second if set.
+    """
+    def __init__(self, n_folders=10, files_per_folder=10, file_size=1024,
+                 latency=0., project_id='bench', ranges=True,
+                 bandwidth=None):
+        self.n_folders = n_folders
+        self.files_per_folder = files_per_folder
+        self.file_size = file_size
+        self.latency = latency
+        self.project_id = project_id
+        self.ranges = ranges
+        self.bandwidth = bandwidth
+
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0),
+                                            self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    @property
+    def api_url(self):
+        return self.url + '/v2/'
+
+    @property
+    def n_files(self):
+        return (self.n_folders + 1) * self.files_per_folder
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_count(self):
+        with self._lock:
+            self.request_count = 0
+
+    # JSON documents
+    def _storage_url(self):
+        return '{}/v2/nodes/{}/files/osfstorage/'.format(self.url,
+                                                         self.project_id)
+
+    def _folder_url(self, folder):
+        return self._storage_url() + 'folder{}/'.format(folder)
+
+    def _wb_url(self, path):
+        return '{}/v1/resources/{}/providers/osfstorage/{}'.format(
+            self.url, self.project_id, path)
+
+    def project_json(self):
+        return {'data': {
+            'id': self.project_id,
+            'type': 'nodes',
+            'links': {'self': '{}/v2/nodes/{}/'.format(self.url,
+                                                      self.project_id)},
+            'attributes': {'title': 'Benchmark project',
+                           'date_created': '2017-03-20T16:24:57.417044',
+                           'date_modified': '2017-03-20T16:24:57.417044',
+                           'description': ''},
+            'relationships': {'files': {'links': {'related': {
+                'href': '{}/v2/nodes/{}/files/'.format(self.url,
+                                                      self.project_id),
+                'meta': {}}}}},
+        }}
+
+    def storages_json(self):
+        storage = {
+            'id': '{}:osfstorage'.format(self.project_id),
+            'type': 'files',
+            'attributes': {'node': self.project_id, 'path': '/',
+                           'kind': 'folder', 'name': 'osfstorage',
+                           'provider': 'osfstorage'},
+            'links': {'upload': self._wb_url(''),
+                      'new_folder': self._wb_url('?kind=folder')},
+            'relationships': {'files': {'links': {'related': {
+                'href': self._storage_url(), 'meta': {}}}}},
+        }
+        return {'data': [storage],
+                'links': {'first': None, 'last': None, 'prev': None,
+                          'next': None, 'meta': {'total': 1,
+                                                 'per_page': 10}}}
+
+    def file_json(self, folder, index):
+        if folder is None:
+            name = 'file{}.txt'.format(index)
+            materialized = '/' + name
+        else:
+            name = 'file{}-{}.txt'.format(folder, index)
+            materialized = '/folder{}/{}'.format(folder, name)
+        file_id = 'f{}x{}'.format(folder, index)
+        info = '{}/v2/files/{}/'.format(self.url, file_id)
+        wb_url = self._wb_url(file_id)
+        return {
+            'id': file_id,
+            'type': 'files',
+            'attributes': {
+                'extra': {'hashes': {'sha256': None, 'md5': None}},
+                'kind': 'file',
+                'name': name,
+                'last_touched': None,
+                'materialized_path': materialized,
+                'date_modified': '2017-03-20T16:24:57.417044',
+                'current_version': 1,
+                'date_created': '2017-03-20T16:24:57.417044',
+                'provider': 'osfstorage',
+                'path': '/' + file_id,
+                'current_user_can_comment': True,
+                'guid': None,
+                'checkout': None,
+                'tags': [],
+                'size': self.file_size,
+            },
+            'links': {'info': info, 'self': info, 'move': wb_url,
+                      'upload': wb_url, 'download': wb_url,
+                      'delete': wb_url,
+                      'html': 'https://osf.io/{}/files/osfstorage/{}'.format(
+                          self.project_id, file_id)},
+            'relationships': {'node': {'links': {'related': {
+                'href': '{}/v2/nodes/{}/'.format(self.url, self.project_id),
+                'meta': {}}}}},
+        }
+
+    def folder_json(self, folder):
+        folder_id = 'folder{}'.format(folder)
+        info = '{}/v2/files/{}/'.format(self.url, folder_id)
+        wb_url = self._wb_url(folder_id + '/')
+        return {
+            'id': folder_id,
+            'type': 'files',
+            'attributes': {
+                'extra': {'hashes': {'sha256': None, 'md5': None}},
+                'kind': 'folder',
+                'name': folder_id,
+                'materialized_path': '/{}/'.format(folder_id),
+                'date_modified': None,
+                'date_created': None,
+                'provider': 'osfstorage',
+                'path': '/{}/'.format(folder_id),
+                'size': None,
+            },
+            'links': {'info': info, 'self': info, 'move': wb_url,
+                      'upload': wb_url, 'delete': wb_url,
+                      'new_folder': wb_url + '?kind=folder'},
+            'relationships': {'files': {'links': {'related': {
+                'href': self._folder_url(folder), 'meta': {}}}}},
+        }
+
+    def listing(self, folder):
+        """All entries in the root (`folder=None`) or a folder."""
+        entries = [self.file_json(folder, i)
+                   for i in range(self.files_per_folder)]
+        if folder is None:
+            entries.extend(self.folder_json(i)
+                           for i in range(self.n_folders))
+        return entries
+
+    def page(self, url, entries, query):
+        """Paginate `entries` the way the OSF does."""
+        page_size = DEFAULT_PAGE_SIZE
+        if 'page[size]' in query:
+            page_size = min(int(query['page[size]'][0]), MAX_PAGE_SIZE)
+        page = int(query.get('page', ['1'])[0])
+
+        start = (page - 1) * page_size
+        data = entries[start:start + page_size]
+
+        next_url = None
+        if start + page_size < len(entries):
+            params = dict((k, v[0]) for k, v in query.items())
+            params['page'] = page + 1
+            next_url = url + '?' + urlencode(params)
+
+        return {'data': data,
+                'links': {'first': None, 'last': None, 'prev': None,
+                          'next': next_url,
+                          'meta': {'total': len(entries),
+                                   'per_page': page_size}}}
+
+    def route(self, path, query):
+        """Return `(status, JSON document)` for an API request."""
+        base = '/v2/nodes/{}/'.format(self.project_id)
+        if path == '/v2/guids/{}/'.format(self.project_id):
+            return 200, {'data': {'id': self.project_id, 'type': 'nodes'}}
+        if path == base:
+            return 200, self.project_json()
+        if path == base + 'files/':
+            return 200, self.storages_json()
+        if path == base + 'files/osfstorage/':
+            return 200, self.page(self.url + path, self.listing(None), query)
+        if path.startswith(base + 'files/osfstorage/folder'):
+            folder = int(path.rstrip('/').rsplit('folder', 1)[1])
+            return 200, self.page(self.url + path, self.listing(folder),
+                                  query)
+        return 404, {'errors': [{'detail': 'Not found.'}]}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_file(self):
+                begin, end = 0, server.file_size
+                match = re.match(r'bytes=(\d+)-(\d*)$',
+                                 self.headers.get('Range', ''))
+                if server.ranges and match is not None:
+                    begin = int(match.group(1))
+                    if begin >= end:
+                        self.send_response(416)
+                        self.send_header('Content-Range',
+                                         'bytes */{}'.format(end))
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    if match.group(2):
+                        end = min(int(match.group(2)) + 1, end)
+                    self.send_response(206)
+                    self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                        begin, end - 1, server.file_size))
+                else:
+                    self.send_response(200)
+                if server.ranges:
+                    self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(end - begin))
+                self.end_headers()
+
+                started = time.time()
+                sent = 0
+                try:
+                    for chunk in _content_chunks(begin, end):
+                        self.wfile.write(chunk)
+                        sent += len(chunk)
+                        if server.bandwidth:
+                            ahead = (sent / float(server.bandwidth) -
+                                     (time.time() - started))
+                            if ahead > 0:
+                                time.sleep(ahead)
+                except (IOError, OSError):
+                    # the client hung up, for example after its segment
+                    pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                parsed = urlparse(self.path)
+                # `OSFSession.build_url` produces double slashes
+                path = re.sub('/+', '/', parsed.path)
+                if path.startswith('/v1/resources/'):
+                    self._send_file()
+                    return
+
+                status, document = server.route(path,
+                                                 parse_qs(parsed.query))
+                self._send(status, json.dumps(document).encode('utf-8'),
+                           'application/vnd.api+json')
+
+        return Handler
@@ -4,7 +4,7 @@ import six
 import argparse
 from textwrap import dedent
 
-from .cli import clone, fetch, geturl, list_, remove, upload, init
+from .cli import clone, fetch, geturl, list_, refresh, remove, upload, init
 from . import __version__
 
 
@@ -20,6 +20,7 @@ def main():
         fetch     Fetch an individual file from a project
         geturl    Get download url for an individual file from a project
         list      List all files from all storages for a project
+        refresh   Update the local index of a project and show changes
         upload    Upload a new file to an existing project
         remove    Remove a file from a project's storage
 
@@ -33,6 +34,35 @@ def main():
                               'OSF_PASSWORD environment variable'))
     parser.add_argument('-p', '--project', default=None,
                         help='OSF project ID')
+    parser.add_argument('--rate-limit', default=None, type=float,
+                        metavar='N',
+                        help=('Maximum number of requests per second, 0 to '
+                              'disable (default: 1)'))
+    parser.add_argument('--burst', default=None, type=int, metavar='N',
+                        help=('Number of requests that can be made in a '
+                              'burst before rate limiting (default: 1)'))
+    parser.add_argument('--concurrency', default=None, type=int,
+                        metavar='N',
+                        help='Number of requests to make in parallel')
+    parser.add_argument('--retries', default=None, type=int, metavar='N',
+                        help=('Number of times to retry a request that failed '
+                              'because of network or server problems '
+                              '(default: 3)'))
+    parser.add_argument('--cache', default=False, action='store_true',
+                        help=('Keep responses from the OSF on disk and only '
+                              'download them again if they changed. Set '
+                              'OSF_CACHE_DIR to choose where'))
+    parser.add_argument('--from-index', default=False, action='store_true',
+                        help=('Remember the files of each storage in a '
+                              'local index and answer list, fetch, geturl '
+                              'and remove from it'))
+    parser.add_argument('--checksums', default=False, action='store_true',
+                        help=('Remember the hashes of downloaded files so '
+                              'that --update does not have to read them '
+                              'again'))
+    parser.add_argument('--stats', default=False, action='store_true',
+                        help=('Print statistics about the requests made to '
+                              'the OSF when done'))
     parser.add_argument('-v', '--version', action='version',
                         version='%(prog)s {}'.format(__version__))
     # dest=command stores the name of the command in a variable, this is
@@ -49,6 +79,9 @@ def main():
     clone_parser.add_argument('-U', '--update',
                                help='Overwrite only if local and remote files differ',
                                action='store_true')
+    clone_parser.add_argument('-j', '--jobs', default=1, type=int,
+                              metavar='N',
+                              help='Number of files to download in parallel')
 
     def _add_subparser(name, description, aliases=[]):
         options = {
@@ -71,6 +104,10 @@ def main():
     fetch_parser.add_argument('-U', '--update',
                                help='Overwrite only if local and remote files differ',
                                action='store_true')
+    fetch_parser.add_argument('-s', '--segments', default=1, type=int,
+                              metavar='N',
+                              help=('Download a large file in N parts at '
+                                    'the same time'))
     fetch_parser.add_argument('remote', help='Remote path',
                               default=None)
     fetch_parser.add_argument('local', help='Local path',
@@ -86,6 +123,10 @@ def main():
     list_parser = _add_subparser('list', list.__doc__, aliases=['ls'])
     list_parser.set_defaults(func=list_)
 
+    # Update the index of all storages in a project
+    refresh_parser = _add_subparser('refresh', refresh.__doc__)
+    refresh_parser.set_defaults(func=refresh)
+
     # Upload a single file or a directory tree
     upload_parser = _add_subparser('upload', upload.__doc__)
     upload_parser.set_defaults(func=upload)
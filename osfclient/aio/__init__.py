@@ -0,0 +1,14 @@
+"""Asyncio client for the Open Science Framework.
+
+Requires Python 3.7 or later and `aiohttp`, install it with
+``pip install osfclient[async]``.
+"""
+from .api import AsyncOSF
+from .models import AsyncFile
+from .models import AsyncFolder
+from .models import AsyncProject
+from .models import AsyncStorage
+from .session import AsyncOSFSession
+
+
+__all__ = ['AsyncOSF']
@@ -0,0 +1,85 @@
+from ..exceptions import OSFException
+from ..models import OSFCore
+from .models import AsyncProject
+from .session import AsyncOSFSession
+
+
+class AsyncOSF(OSFCore):
+    """Interact with the Open Science Framework using asyncio.
+
+    This is the asyncio counterpart of `osfclient.OSF`. Use it as an
+    asynchronous context manager so that the connections are closed::
+
+        async with AsyncOSF(token=token) as osf:
+            project = await osf.project('f3szh')
+            storage = await project.storage()
+            async for file_ in storage.files:
+                print(file_.path)
+
+    Additional keyword arguments like `rate_limit` or `concurrency` are used
+    to configure the `AsyncOSFSession` used for all requests.
+    """
+    def __init__(self, username=None, password=None, token=None,
+                 **session_options):
+        super(AsyncOSF, self).__init__({}, AsyncOSFSession(**session_options))
+        self.can_login = False
+        try:
+            self.login(username, password, token)
+            self.can_login = True
+        except OSFException:
+            pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Close all connections to the OSF."""
+        await self.session.close()
+
+    def login(self, username=None, password=None, token=None):
+        """Login user for protected API calls."""
+        if token is not None:
+            self.session.token_auth(token)
+        elif username is not None and password is not None:
+            self.session.basic_auth(username, password)
+        else:
+            raise OSFException("No login details provided.")
+
+    async def project(self, project_id):
+        """Fetch project `project_id`."""
+        # the OSF resolves a GUID to the object it refers to
+        response = await self._get(self._build_url('guids', project_id))
+        response = self._json(response, 200)
+        type_ = response['data']['type']
+        if type_ not in AsyncProject._types:
+            raise OSFException('{} is unrecognized type {}. Clone supports '
+                               'projects and registrations'.format(project_id,
+                                                                   type_))
+
+        if 'relationships' not in response['data']:
+            url = self._build_url(type_, project_id)
+            response = self._json(await self._get(url), 200)
+        return AsyncProject(response, self.session)
+
+    async def guid(self, guid):
+        """Determines JSONAPI type for provided GUID"""
+        response = await self._get(self._build_url('guids', guid))
+        return self._json(response, 200)['data']['type']
+
+    @property
+    def username(self):
+        if self.session.auth is not None:
+            return self.session.auth[0]
+
+    @property
+    def password(self):
+        if self.session.auth is not None:
+            return self.session.auth[1]
+
+    @property
+    def token(self):
+        if self.session.token is not None:
+            return self.session.token
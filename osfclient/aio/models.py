@@ -0,0 +1,368 @@
+"""Asyncio versions of the OSF models.
+
+These share the base classes of the models in `osfclient.models`, which
+interpret the JSON returned by the OSF, but none of their methods that
+talk to the OSF. All methods that talk to the OSF are coroutines and
+iterating over files, folders or storages uses ``async for``. Cloning,
+walking and indexing storages are only available in `osfclient.models`.
+"""
+import asyncio
+from collections import deque
+from itertools import islice
+import os
+
+from ..exceptions import FolderExistsException
+from ..exceptions import HashMismatchException
+from ..models.core import _page_count
+from ..models.core import _page_size
+from ..models.core import _page_url
+from ..models.file import PARTIAL_SUFFIX
+from ..models.file import _BaseFile
+from ..models.file import _BaseFolder
+from ..models.file import _BaseWaterButlerFolder
+from ..models.file import _child_filter
+from ..models.file import _replace
+from ..models.project import _BaseProject
+from ..models.storage import _BaseStorage
+from ..utils import checksum
+from ..utils import file_empty
+from ..utils import norm_remote_path
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+async def _get_page(core, url):
+    return core._json(await core._get(url), 200)
+
+
+async def _iter_pages(core, url, params=None):
+    """Iterate over the entries of a paginated listing page by page.
+
+    Like `OSFCore._iter_pages` up to `session.concurrency` of the following
+    pages are fetched concurrently when the first page tells us how many
+    there are.
+    """
+    kwargs = _page_size(core.session)
+    if params:
+        kwargs['params'] = dict(kwargs.get('params', {}), **params)
+    response = core._json(await core._get(url, **kwargs), 200)
+    yield response['data']
+
+    next_url = core._get_attribute(response, 'links', 'next')
+    pages = _page_count(response)
+    if next_url is not None and pages is not None and pages > 1:
+        urls = (_page_url(next_url, page) for page in range(2, pages + 1))
+        window = core.session.concurrency
+        pending = deque(asyncio.ensure_future(_get_page(core, page_url))
+                        for page_url in islice(urls, window))
+        try:
+            while pending:
+                response = await pending.popleft()
+                for page_url in islice(urls, 1):
+                    pending.append(
+                        asyncio.ensure_future(_get_page(core, page_url)))
+                yield response['data']
+        finally:
+            for task in pending:
+                task.cancel()
+        next_url = core._get_attribute(response, 'links', 'next')
+
+    while next_url is not None:
+        response = await _get_page(core, next_url)
+        yield response['data']
+        next_url = core._get_attribute(response, 'links', 'next')
+
+
+class AsyncFile(_BaseFile):
+    __slots__ = ()
+
+    def __str__(self):
+        return '<AsyncFile [{0}, {1}]>'.format(self.id, self.path)
+
+    async def write_to(self, fp, chunk_size=64*1024):
+        """Write contents of this file to a local file.
+
+        Pass in a filepointer `fp` that has been opened for writing in
+        binary mode. Unlike `File.write_to` no progress bar is shown.
+        """
+        if 'b' not in fp.mode:
+            raise ValueError("File has to be opened in binary mode.")
+
+        try:
+            start = fp.tell()
+        except (AttributeError, IOError):
+            start = None
+
+        attempt = 0
+        while True:
+            try:
+                async with self.session.stream(self._download_url) as resp:
+                    if resp.status_code != 200:
+                        raise RuntimeError("Response has status code "
+                                           "{}.".format(resp.status_code))
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        fp.write(chunk)
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                policy = self.session.retry_policy
+                if start is None or not policy.can_retry('GET', attempt):
+                    raise
+
+            # throw away what we have written and start from scratch
+            fp.seek(start)
+            fp.truncate()
+            await self.session.wait_before_retry(attempt)
+            attempt += 1
+
+    async def download(self, path, checksums=None):
+        """Download this file to `path`.
+
+        Like `File.download` the contents are written to `path` with
+        `PARTIAL_SUFFIX` appended and only renamed to `path` once they
+        match `hashes`, otherwise a `HashMismatchException` is raised.
+        Unlike it the download always starts from the beginning.
+        """
+        partial = path + PARTIAL_SUFFIX
+        with open(partial, 'wb') as fp:
+            await self.write_to(fp)
+
+        expected = self._expected_hash()
+        if expected is not None:
+            hash_type, value = expected
+            if checksum(partial, hash_type) != value:
+                os.remove(partial)
+                raise HashMismatchException(self.path)
+        _replace(partial, path)
+
+        if checksums is not None:
+            checksums.record(path, self.hashes or {})
+
+    async def remove(self):
+        """Remove this file from the remote storage."""
+        response = await self._delete(self._delete_url)
+        if response.status_code != 204:
+            raise RuntimeError('Could not delete {}.'.format(self.path))
+
+    async def update(self, fp):
+        """Update the remote file from a local file.
+
+        Pass in a filepointer `fp` that has been opened for reading in
+        binary mode.
+        """
+        if 'b' not in fp.mode:
+            raise ValueError("File has to be opened in binary mode.")
+
+        if file_empty(fp):
+            response = await self._put(self._upload_url, data=b'')
+        else:
+            response = await self._put(self._upload_url, data=fp)
+
+        if response.status_code != 200:
+            msg = ('Could not update {} (status '
+                   'code: {}).'.format(self.path, response.status_code))
+            raise RuntimeError(msg)
+
+
+class AsyncContainerMixin:
+    __slots__ = ()
+
+    async def _iter_children(self, url, kind, klass, recurse=None):
+        """Iterate over all children of `kind`
+
+        Yield an instance of `klass` when a child is of type `kind`. Uses
+        `recurse` as the path of attributes in the JSON returned from `url`
+        to find more children.
+        """
+        urls = [url]
+
+        while urls:
+            async for page in _iter_pages(self, urls.pop()):
+                for child in page:
+                    kind_ = child['attributes']['kind']
+                    if kind_ == kind:
+                        yield klass(child, self.session)
+                    elif recurse is not None:
+                        # visit the child once done with this listing
+                        urls.append(self._get_attribute(child, *recurse))
+
+    async def _find_child(self, url, name, kind):
+        """Find the child called `name` of `kind` in the listing at `url`."""
+        pages = _iter_pages(self, url, _child_filter(name, kind))
+        try:
+            async for page in pages:
+                for child in page:
+                    attributes = child['attributes']
+                    if (attributes['kind'] == kind and
+                            attributes['name'] == name):
+                        return child
+        finally:
+            await pages.aclose()
+
+    @property
+    def files(self):
+        """Iterate over all files in this folder.
+
+        Unlike a `Storage` instance this does not recursively find all files.
+        Only lists files in this folder.
+        """
+        return self._iter_children(self._files_url, 'file', AsyncFile)
+
+    @property
+    def folders(self):
+        """Iterate over top-level folders in this folder."""
+        return self._iter_children(self._files_url, 'folder', AsyncFolder)
+
+    async def create_folder(self, name, exist_ok=False):
+        url = self._new_folder_url
+        # not retried, see `ContainerMixin.create_folder`
+        response = await self._put(url, params={'name': name}, retry=False)
+        if response.status_code == 409 and not exist_ok:
+            raise FolderExistsException(name)
+
+        elif response.status_code == 409 and exist_ok:
+            folder = await self._find_child(self._files_url, name, 'folder')
+            if folder is not None:
+                return AsyncFolder(folder, self.session)
+
+        elif response.status_code == 201:
+            folder = self.session.decode_json(response)['data']
+            return _AsyncWaterButlerFolder(folder, self.session)
+
+        else:
+            raise RuntimeError("Response has status code {} while creating "
+                               "folder {}.".format(response.status_code,
+                                                   name))
+
+
+class AsyncFolder(AsyncContainerMixin, _BaseFolder):
+    __slots__ = ()
+
+    def __str__(self):
+        return '<AsyncFolder [{0}, {1}]>'.format(self.id, self.path)
+
+
+class _AsyncWaterButlerFolder(AsyncContainerMixin, _BaseWaterButlerFolder):
+    __slots__ = ()
+
+    def __str__(self):
+        return '<_AsyncWaterButlerFolder [{0}]>'.format(self.id)
+
+
+class AsyncStorage(AsyncContainerMixin, _BaseStorage):
+    __slots__ = ()
+
+    def __str__(self):
+        return '<AsyncStorage [{0}]>'.format(self.id)
+
+    @property
+    def files(self):
+        """Iterate over all files in this storage.
+
+        Recursively lists all files in all subfolders.
+        """
+        return self._iter_children(self._files_url, 'file', AsyncFile,
+                                   self._files_key)
+
+    async def file_at(self, path):
+        """Return the file at `path` in this storage, `None` if there is none.
+        """
+        path = norm_remote_path(path)
+        directory, fname = os.path.split(path)
+
+        url = self._files_url
+        for directory in directory.split(os.path.sep):
+            # skip empty directory names
+            if not directory:
+                continue
+            folder = await self._find_child(url, directory, 'folder')
+            if folder is None:
+                return None
+            url = self._get_attribute(folder, *self._files_key)
+
+        file_ = await self._find_child(url, fname, 'file')
+        if file_ is not None:
+            return AsyncFile(file_, self.session)
+
+    async def create_file(self, path, fp, force=False, update=False):
+        """Store a new file at `path` in this storage.
+
+        The contents of the file descriptor `fp` (opened in 'rb' mode)
+        will be uploaded to `path` which is the full path at
+        which to store the file.
+
+        To force overwrite of an existing file, set `force=True`.
+        To overwrite an existing file only if the files differ, set
+        `update=True`.
+        """
+        if 'b' not in fp.mode:
+            raise ValueError("File has to be opened in binary mode.")
+
+        # all paths are assumed to be absolute
+        path = norm_remote_path(path)
+
+        directory, fname = os.path.split(path)
+        directories = directory.split(os.path.sep)
+        # navigate to the right parent object for our file
+        parent = self
+        for directory in directories:
+            # skip empty directory names
+            if directory:
+                parent = await parent.create_folder(directory, exist_ok=True)
+
+        url = parent._new_file_url
+        # not retried, see `Storage.create_file`
+        if file_empty(fp):
+            response = await self._put(url, params={'name': fname},
+                                       data=b'', retry=False)
+        else:
+            response = await self._put(url, params={'name': fname}, data=fp,
+                                       retry=False)
+
+        if response.status_code == 409:
+            if not force and not update:
+                raise FileExistsError(path)
+
+            # find the upload URL for the file we are trying to update
+            file_ = await self.file_at(path)
+            if file_ is None:
+                raise RuntimeError("Could not create a new file at "
+                                   "({}) nor update it.".format(path))
+
+            if not force:
+                if checksum(fp.name) == file_.hashes.get('md5'):
+                    # If the hashes are equal and force is False, we're
+                    # done here
+                    return
+            # in the process of attempting to upload the file we moved
+            # through it -> reset read position to beginning of the file
+            fp.seek(0)
+            await file_.update(fp)
+
+
+class AsyncProject(_BaseProject):
+    def __str__(self):
+        return '<AsyncProject [{0}]>'.format(self.id)
+
+    async def _storages(self):
+        # map of provider names to storages, fetched once and reused
+        if self._stores_expired():
+            stores = self._json(await self._get(self._storages_url), 200)
+            self._index_stores(stores['data'], AsyncStorage)
+        return self._stores
+
+    async def storage(self, provider='osfstorage'):
+        """Return storage `provider`."""
+        stores = await self._storages()
+        if provider not in stores:
+            raise RuntimeError("Project has no storage "
+                               "provider '{}'".format(provider))
+        return stores[provider]
+
+    @property
+    async def storages(self):
+        """Iterate over all storages for this projects."""
+        for store in list((await self._storages()).values()):
+            yield store
@@ -0,0 +1,209 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from ..exceptions import UnauthorizedException
+from ..models.ratelimit import TokenBucket
+from ..models.retry import RetryPolicy
+from ..models.session import DEFAULT_HEADERS
+from ..models.session import THROTTLE_STATUS_CODES
+from ..models.session import loads
+from ..models.session import _body_position
+from ..models.session import _can_resend
+from ..models.session import _retry_after
+from ..models.session import _rewind
+
+
+class AsyncResponse(object):
+    """A response whose body has been read completely."""
+    def __init__(self, status_code, headers, content, json_loads=loads):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self._json_loads = json_loads
+
+    def json(self):
+        return self._json_loads(self.content)
+
+
+class AsyncOSFSession(object):
+    """Handle HTTP session related work for the asyncio client.
+
+    This is the asyncio counterpart of `OSFSession` and takes the same
+    options. Rate limiting, backing off when throttled and retrying failed
+    requests work the same way. At most `concurrency` requests are in
+    flight at any time.
+
+    Close the session with `close()` when done with it.
+    """
+    def __init__(self, rate_limit=1, burst=1, throttle_retries=5,
+                 retries=3, backoff_factor=0.5, timeout=None,
+                 concurrency=10, page_size=100, json_loads=loads):
+        if aiohttp is None:
+            raise ImportError("The asyncio client requires aiohttp. Install "
+                              "it with `pip install osfclient[async]`.")
+
+        self.headers = dict(DEFAULT_HEADERS)
+        self.base_url = 'https://api.osf.io/v2/'
+        self.auth = None
+        self.token = None
+
+        self.rate_limiter = TokenBucket(rate_limit, burst)
+        self.throttle_retries = throttle_retries
+        self.retry_policy = RetryPolicy(retries, backoff_factor)
+        self.timeout = timeout
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.json_loads = json_loads
+
+        # number of retries made and seconds spent waiting for them
+        self.retries = 0
+        self.retry_wait = 0.
+
+        self._client = None
+
+    @property
+    def client(self):
+        # aiohttp sessions have to be created inside the event loop
+        if self._client is None or self._client.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            timeout = aiohttp.ClientTimeout(total=None,
+                                            sock_connect=self.timeout,
+                                            sock_read=self.timeout)
+            self._client = aiohttp.ClientSession(connector=connector,
+                                                 timeout=timeout)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def decode_json(self, response):
+        """Decode the JSON body of `response` with `json_loads`."""
+        return self.json_loads(response.content)
+
+    def basic_auth(self, username, password):
+        self.auth = (username, password)
+        if 'Authorization' in self.headers:
+            self.headers.pop('Authorization')
+
+    def token_auth(self, token):
+        self.token = token
+        self.headers['Authorization'] = "Bearer %s" % token
+
+    def build_url(self, *args):
+        parts = [self.base_url]
+        parts.extend(args)
+        # canonical OSF URLs end with a slash
+        return '/'.join(parts) + '/'
+
+    async def wait_before_retry(self, attempt):
+        """Wait before retry number `attempt` and keep count of retries."""
+        wait = self.retry_policy.backoff(attempt)
+        await asyncio.sleep(wait)
+        self.retries += 1
+        self.retry_wait += wait
+
+    async def _send(self, method, url, read=True, retry=True, **kwargs):
+        """Make a request, retrying it if necessary.
+
+        Returns an `AsyncResponse` if `read` is true, otherwise the
+        `aiohttp.ClientResponse` which the caller has to release. Pass
+        `retry=False` for requests that must not be sent twice.
+        """
+        if self.auth is not None:
+            kwargs['auth'] = aiohttp.BasicAuth(*self.auth)
+        kwargs['headers'] = dict(self.headers, **kwargs.get('headers', {}))
+
+        policy = self.retry_policy
+        can_resend = _can_resend(kwargs)
+        position = _body_position(kwargs)
+
+        attempt = 0
+        throttled = 0
+        while True:
+            _rewind(kwargs, position)
+            delay = self.rate_limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            again = (retry and can_resend and
+                     policy.can_retry(method, attempt))
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                if read:
+                    try:
+                        content = await response.read()
+                    finally:
+                        response.release()
+                    response = AsyncResponse(response.status,
+                                             response.headers, content,
+                                             self.json_loads)
+                else:
+                    response.status_code = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if not again:
+                    raise
+                await self.wait_before_retry(attempt)
+                attempt += 1
+                continue
+
+            status = response.status_code
+            if status == 401:
+                if not read:
+                    response.release()
+                raise UnauthorizedException()
+
+            if status in THROTTLE_STATUS_CODES:
+                self.rate_limiter.backoff(_retry_after(response))
+                if can_resend and throttled < self.throttle_retries:
+                    throttled += 1
+                    if not read:
+                        response.release()
+                    continue
+                return response
+
+            if again and status in policy.status_codes:
+                if not read:
+                    response.release()
+                await self.wait_before_retry(attempt)
+                attempt += 1
+                continue
+
+            self.rate_limiter.recover()
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                self.rate_limiter.pause(_retry_after(response))
+            return response
+
+    async def get(self, url, **kwargs):
+        return await self._send('GET', url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self._send('PUT', url, **kwargs)
+
+    async def patch(self, url, **kwargs):
+        return await self._send('PATCH', url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self._send('DELETE', url, **kwargs)
+
+    async def head(self, url, **kwargs):
+        return await self._send('HEAD', url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, url, **kwargs):
+        """Make a GET request without reading the response body.
+
+        Use as ``async with session.stream(url) as response:`` and read the
+        body from ``response.content``.
+        """
+        response = await self._send('GET', url, read=False, **kwargs)
+        try:
+            yield response
+        finally:
+            response.release()
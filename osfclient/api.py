@@ -1,5 +1,6 @@
 from .exceptions import OSFException
 from .models import OSFCore
+from .models import OSFSession
 from .models import Project
 
 
@@ -9,9 +10,13 @@ class OSF(OSFCore):
     This is the main point of contact for interactions with the
     OSF. Use the methods of this class to find projects, login
     to the OSF, etc.
+
+    Additional keyword arguments like `rate_limit` and `burst` are used to
+    configure the `OSFSession` used for all requests.
     """
-    def __init__(self, username=None, password=None, token=None):
-        super(OSF, self).__init__({})
+    def __init__(self, username=None, password=None, token=None,
+                 **session_options):
+        super(OSF, self).__init__({}, OSFSession(**session_options))
         self.can_login = False
         try:
             self.login(username, password, token)
@@ -30,11 +35,20 @@ class OSF(OSFCore):
 
     def project(self, project_id):
         """Fetch project `project_id`."""
-        type_ = self.guid(project_id)
-        url = self._build_url(type_, project_id)
-        if type_ in Project._types:
-            return Project(self._json(self._get(url), 200), self.session)
-        raise OSFException('{} is unrecognized type {}. Clone supports projects and registrations'.format(project_id, type_))
+        # unless asked not to the OSF resolves a GUID to the object it
+        # refers to, so one request tells us the type and gets the project
+        response = self._json(self._get(self._build_url('guids',
+                                                         project_id)),
+                              200)
+        type_ = response['data']['type']
+
+        if type_ not in Project._types:
+            raise OSFException('{} is unrecognized type {}. Clone supports projects and registrations'.format(project_id, type_))
+
+        if 'relationships' not in response['data']:
+            url = self._build_url(type_, project_id)
+            response = self._json(self._get(url), 200)
+        return Project(response, self.session)
 
     def guid(self, guid):
         """Determines JSONAPI type for provided GUID"""
@@ -4,6 +4,7 @@ These functions implement the functionality of the command-line interface.
 """
 from __future__ import print_function
 
+import atexit
 from functools import wraps
 import getpass
 import os
@@ -17,7 +18,13 @@ from tqdm import tqdm
 
 from .api import OSF
 from .exceptions import UnauthorizedException
-from .utils import norm_remote_path, split_storage, makedirs, checksum
+from .models import ChecksumStore
+from .models import RequestStats
+from .models import ResponseCache
+from .models import StorageIndex
+from .models.storage import clone_storages
+from .utils import split_storage, makedirs, checksum
+from .utils import default_cache_dir
 
 
 def config_from_file():
@@ -58,6 +65,42 @@ def _get_username(args, config):
     return username
 
 
+def _session_options(args):
+    """Collect `OSFSession` options set on the command-line."""
+    options = {}
+
+    rate_limit = getattr(args, 'rate_limit', None)
+    if rate_limit is not None:
+        # a rate of zero means "no limit"
+        options['rate_limit'] = rate_limit or None
+
+    burst = getattr(args, 'burst', None)
+    if burst is not None:
+        options['burst'] = burst
+
+    concurrency = getattr(args, 'concurrency', None)
+    if concurrency is not None:
+        options['concurrency'] = concurrency
+
+    retries = getattr(args, 'retries', None)
+    if retries is not None:
+        options['retries'] = retries
+
+    if getattr(args, 'cache', False):
+        options['cache'] = ResponseCache(default_cache_dir())
+
+    if getattr(args, 'from_index', False):
+        options['index'] = StorageIndex(default_cache_dir())
+
+    return options
+
+
+def _checksum_store(args):
+    # remembers the hashes of downloaded files if asked to
+    if getattr(args, 'checksums', False):
+        return ChecksumStore(default_cache_dir())
+
+
 def _setup_osf(args):
     # Command line options have precedence over environment variables,
     # which have precedence over the config file.
@@ -83,7 +126,19 @@ def _setup_osf(args):
         if password is None:
             password = getpass.getpass('Please input your password: ')
 
-    return OSF(username=username, password=password, token=token)
+    osf = OSF(username=username, password=password, token=token,
+              **_session_options(args))
+
+    if getattr(args, 'stats', False):
+        stats = RequestStats()
+        osf.session.add_hook(stats)
+        atexit.register(_print_stats, stats)
+
+    return osf
+
+
+def _print_stats(stats):
+    print(stats.summary(), file=sys.stderr)
 
 
 def might_need_auth(f):
@@ -153,6 +208,9 @@ def clone(args):
 
     If args.update is True, overwrite any existing local files only if local and
     remote files differ.
+
+    Use args.jobs to download several files at the same time. Files that
+    can not be downloaded are reported at the end.
     """
     osf = _setup_osf(args)
     project = osf.project(args.project)
@@ -160,26 +218,21 @@ def clone(args):
     if args.output is not None:
         output_dir = args.output
 
+    # all storages are listed at the same time, `jobs` files are
+    # downloaded in parallel
+    jobs = getattr(args, 'jobs', None) or 1
+    targets = [(store, os.path.join(output_dir, store.name))
+               for store in project.storages]
     with tqdm(unit='files') as pbar:
-        for store in project.storages:
-            prefix = os.path.join(output_dir, store.name)
-
-            for file_ in store.files:
-                path = file_.path
-                if path.startswith('/'):
-                    path = path[1:]
-
-                path = os.path.join(prefix, path)
-                if os.path.exists(path) and args.update:
-                    if checksum(path) == file_.hashes.get('md5'):
-                        continue
-                directory, _ = os.path.split(path)
-                makedirs(directory, exist_ok=True)
+        failed = clone_storages(targets, jobs=jobs, update=args.update,
+                                callback=lambda file_: pbar.update(),
+                                checksums=_checksum_store(args))
 
-                with open(path, "wb") as f:
-                    file_.write_to(f)
-
-                pbar.update()
+    for item, error in failed:
+        print('Could not copy {}: {}'.format(item, error), file=sys.stderr)
+    if failed:
+        sys.exit('{} files or storages could not be copied.'.format(
+            len(failed)))
 
 
 @might_need_auth
@@ -197,6 +250,11 @@ def fetch(args):
     If args.force is True, write local file even if that file already exists.
     If args.force is False but args.update is True, overwrite an existing local
     file only if local and remote files differ.
+
+    Use args.segments to download a large file in several parts at the same
+    time.
+
+    An interrupted download is continued the next time it is started.
     """
     storage, remote_path = split_storage(args.remote)
 
@@ -216,17 +274,21 @@ def fetch(args):
     project = osf.project(args.project)
 
     store = project.storage(storage)
-    for file_ in store.files:
-        if norm_remote_path(file_.path) == remote_path:
-            if local_path_exists and not args.force and args.update:
-                if file_.hashes.get('md5') == checksum(local_path):
-                    print("Local file %s already matches remote." % local_path)
-                    break
-            with open(local_path, 'wb') as fp:
-                file_.write_to(fp)
-
-            # only fetching one file so we are done
-            break
+    file_ = store.file_at(remote_path,
+                          cached=getattr(args, 'from_index', False))
+    if file_ is not None:
+        checksums = _checksum_store(args)
+        if local_path_exists and not args.force and args.update:
+            if checksums is not None:
+                local = checksums.checksum(local_path)
+            else:
+                local = checksum(local_path)
+            if file_.hashes.get('md5') == local:
+                print("Local file %s already matches remote." % local_path)
+                return
+        file_.download(local_path,
+                       segments=getattr(args, 'segments', None) or 1,
+                       checksums=checksums)
 
 @might_need_auth
 def geturl(args):
@@ -244,12 +306,10 @@ def geturl(args):
     project = osf.project(args.project)
 
     store = project.storage(storage)
-    for file_ in store.files:
-        if norm_remote_path(file_.path) == remote_path:
-            print(ensure_text(file_._html_url))
-
-            # only getting one file url so we are done
-            break
+    file_ = store.file_at(remote_path,
+                          cached=getattr(args, 'from_index', False))
+    if file_ is not None:
+        print(ensure_text(file_._html_url))
 
 @might_need_auth
 def list_(args):
@@ -261,9 +321,10 @@ def list_(args):
 
     project = osf.project(args.project)
 
+    cached = getattr(args, 'from_index', False)
     for store in project.storages:
         prefix = store.name
-        for file_ in store.files:
+        for file_ in store.walk(ordered=True, cached=cached):
             path = file_.path
             if path.startswith('/'):
                 path = path[1:]
@@ -271,6 +332,32 @@ def list_(args):
             print(os.path.join(prefix, path))
 
 
+@might_need_auth
+def refresh(args):
+    """Update the local index of all storages of a project.
+
+    Only folders that changed since the last refresh are listed again. The
+    files that were added (A), modified (M) or removed (D) are printed.
+
+    If the project is private you need to specify a username.
+    """
+    osf = _setup_osf(args)
+    if osf.session.index is None:
+        osf.session.index = StorageIndex(default_cache_dir())
+
+    project = osf.project(args.project)
+
+    for store in project.storages:
+        changes = store.refresh_index()
+        for status, files in (('A', changes.added), ('M', changes.modified),
+                              ('D', changes.removed)):
+            for file_ in files:
+                path = file_.path
+                if path.startswith('/'):
+                    path = path[1:]
+                print(status, os.path.join(store.name, path))
+
+
 @might_need_auth
 def upload(args):
     """Upload a new file to an existing project.
@@ -344,6 +431,9 @@ def remove(args):
     storage, remote_path = split_storage(args.target)
 
     store = project.storage(storage)
-    for f in store.files:
-        if norm_remote_path(f.path) == remote_path:
-            f.remove()
+    file_ = store.file_at(remote_path,
+                          cached=getattr(args, 'from_index', False))
+    if file_ is not None:
+        file_.remove()
+        if osf.session.index is not None:
+            osf.session.index.remove(store.id, remote_path)
@@ -9,3 +9,8 @@ class UnauthorizedException(OSFException):
 class FolderExistsException(OSFException):
     def __init__(self, name):
         self.args = ('Folder %s already exists.' % name,)
+
+
+class HashMismatchException(OSFException):
+    def __init__(self, path):
+        self.args = ('Downloaded %s does not match its hash.' % path,)
@@ -3,9 +3,15 @@
 Users should not have to instantiate classes from here, instead they should
 use `osfclient.OSF()` to access the OSF.
 """
+from .cache import ResponseCache
+from .checksums import ChecksumStore
 from .core import OSFCore
 from .file import File
 from .file import Folder
+from .index import Changeset
+from .index import StorageIndex
 from .project import Project
 from .session import OSFSession
+from .stats import RequestEvent
+from .stats import RequestStats
 from .storage import Storage
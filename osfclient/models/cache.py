@@ -0,0 +1,114 @@
+"""On-disk cache of API responses."""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ..utils import makedirs
+
+
+class ResponseCache(object):
+    """Store responses to GET requests in a SQLite database.
+
+    Responses are revalidated with the server using their `ETag` or
+    `Last-Modified` headers, unchanged responses then cost a `304 Not
+    Modified` round trip instead of downloading them again. Responses
+    younger than `ttl` seconds are used without asking the server.
+
+    Once all stored responses take up more than `max_size` bytes the least
+    recently used ones are removed.
+
+    A cache can be shared by several threads.
+    """
+    def __init__(self, directory, max_size=100 * 2**20, ttl=0):
+        makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'responses.sqlite')
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # responses used without asking the server, responses the server
+        # told us are unchanged and responses that had to be downloaded
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                             " key TEXT PRIMARY KEY,"
+                             " headers TEXT,"
+                             " body BLOB,"
+                             " size INTEGER,"
+                             " stored REAL,"
+                             " accessed REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed"
+                             " ON responses (accessed)")
+        self._size = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get(self, key):
+        """Look up `key`.
+
+        Returns a tuple of the stored headers, body and whether the entry is
+        still fresh. Returns `None` if there is no entry.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT headers, body, stored"
+                                   " FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET accessed = ?"
+                             " WHERE key = ?", (now, key))
+
+            headers, body, stored = row
+            fresh = now - stored < self.ttl
+            if fresh:
+                self.hits += 1
+
+        return json.loads(headers), bytes(body), fresh
+
+    def put(self, key, headers, body):
+        """Store a response."""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT size FROM responses"
+                                   " WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._size -= row[0]
+            self._db.execute("INSERT OR REPLACE INTO responses"
+                             " VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, json.dumps(headers), sqlite3.Binary(body),
+                              len(body), now, now))
+            self._size += len(body)
+            self.misses += 1
+            self._evict()
+
+    def touch(self, key):
+        """Mark the entry for `key` as validated just now."""
+        with self._lock, self._db:
+            self._db.execute("UPDATE responses SET stored = ?"
+                             " WHERE key = ?", (time.time(), key))
+            self.revalidated += 1
+
+    def _evict(self):
+        # remove least recently used entries until we fit into `max_size`
+        if self._size <= self.max_size:
+            return
+
+        rows = self._db.execute("SELECT key, size FROM responses"
+                                " ORDER BY accessed")
+        evict = []
+        for key, size in rows:
+            if self._size <= self.max_size:
+                break
+            evict.append((key,))
+            self._size -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evict)
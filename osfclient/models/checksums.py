@@ -0,0 +1,102 @@
+"""Local store of the hashes of downloaded files."""
+import os
+import sqlite3
+import threading
+
+from ..utils import checksum
+from ..utils import makedirs
+
+
+HASH_TYPES = ('md5', 'sha256')
+
+
+def _modified(stat):
+    # Python 2 has no `st_mtime_ns`
+    mtime_ns = getattr(stat, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(stat.st_mtime * 1e9)
+    return mtime_ns
+
+
+class ChecksumStore(object):
+    """Remember the hashes of local files in a SQLite database.
+
+    Files are recorded with their size and time of modification, a hash
+    is only used while both are unchanged. This saves reading a file again
+    to compare it with the OSF, for example for ``clone --update``.
+
+    A store can be shared by several threads.
+    """
+    def __init__(self, directory):
+        makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'checksums.sqlite')
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS checksums ("
+                             " path TEXT PRIMARY KEY,"
+                             " size INTEGER,"
+                             " modified INTEGER,"
+                             " md5 TEXT,"
+                             " sha256 TEXT)"
+                             " WITHOUT ROWID")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def record(self, path, hashes):
+        """Remember the `hashes` of the file at `path`.
+
+        `hashes` is a dictionary like `File.hashes`. Hashes recorded
+        earlier for the unchanged file are kept unless `hashes` replaces
+        them.
+        """
+        stat = os.stat(path)
+        row = (hashes.get('md5') or None, hashes.get('sha256') or None,
+               os.path.abspath(path), stat.st_size, _modified(stat))
+        with self._lock, self._db:
+            updated = self._db.execute("UPDATE checksums SET"
+                                       " md5 = COALESCE(?, md5),"
+                                       " sha256 = COALESCE(?, sha256)"
+                                       " WHERE path = ? AND size = ?"
+                                       " AND modified = ?", row).rowcount
+            if not updated:
+                self._db.execute("INSERT OR REPLACE INTO checksums"
+                                 " (md5, sha256, path, size, modified)"
+                                 " VALUES (?, ?, ?, ?, ?)", row)
+
+    def get(self, path, hash_type='md5'):
+        """Recorded hash of the file at `path`.
+
+        Returns `None` if there is none or the file changed since.
+        """
+        if hash_type not in HASH_TYPES:
+            raise ValueError(
+                "{} is an invalid hash_type. Expected 'md5' or 'sha256'."
+                .format(hash_type)
+            )
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            row = self._db.execute("SELECT size, modified, {} FROM checksums"
+                                   " WHERE path = ?".format(hash_type),
+                                   (os.path.abspath(path),)).fetchone()
+        if row is not None and row[:2] == (stat.st_size, _modified(stat)):
+            return row[2]
+
+    def checksum(self, path, hash_type='md5'):
+        """Hash of the file at `path`, like `utils.checksum()`.
+
+        Only reads the file if its hash is not known yet.
+        """
+        value = self.get(path, hash_type)
+        if value is None:
+            value = checksum(path, hash_type)
+            self.record(path, {hash_type: value})
+        return value
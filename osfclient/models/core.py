@@ -1,10 +1,59 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import math
 import numbers
 
+from six.moves.urllib.parse import parse_qsl
+from six.moves.urllib.parse import urlencode
+from six.moves.urllib.parse import urlsplit
+from six.moves.urllib.parse import urlunsplit
+
 from .session import OSFSession
 
 
+def _page_count(response):
+    """Number of pages of a paginated response, `None` if unknown.
+
+    The OSF reports the total number of entries and the page size in
+    `links.meta`, some endpoints use a top-level `meta`.
+    """
+    for meta in (response.get('links', {}).get('meta'),
+                 response.get('meta')):
+        if not meta:
+            continue
+        total = meta.get('total')
+        per_page = meta.get('per_page')
+        if total is not None and per_page:
+            return int(math.ceil(total / float(per_page)))
+
+
+def _page_size(session):
+    """Arguments for requesting the first page of a listing.
+
+    Asks for pages of `session.page_size` entries, the 'next' links the
+    OSF returns keep asking for that size.
+    """
+    if session.page_size is None:
+        return {}
+    return {'params': {'page[size]': session.page_size}}
+
+
+def _page_url(url, page):
+    """Change the page number in `url` to `page`."""
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    params = [(key, value) for key, value in parse_qsl(query)
+              if key != 'page']
+    params.append(('page', str(page)))
+    return urlunsplit((scheme, netloc, path, urlencode(params), fragment))
+
+
 # Base class for all models and the user facing API object
 class OSFCore(object):
+    # models are created for every file in a listing, so they use slots,
+    # subclasses list the attributes they set in `_update_attributes`
+    __slots__ = ('session',)
+
     def __init__(self, json, session=None):
         if session is None:
             self.session = OSFSession()
@@ -56,7 +105,7 @@ class OSFCore(object):
             status_code = (status_code,)
 
         if response.status_code in status_code:
-            return response.json()
+            return self.session.decode_json(response)
         else:
             raise RuntimeError("Response has status "
                                "code {} not {}".format(response.status_code,
@@ -64,13 +113,55 @@ class OSFCore(object):
 
     def _follow_next(self, url):
         """Follow the 'next' link on paginated results."""
-        response = self._json(self._get(url), 200)
-        data = response['data']
+        data = []
+        for page in self._iter_pages(url):
+            data.extend(page)
+        return data
+
+    def _iter_pages(self, url, params=None):
+        """Iterate over the entries of a paginated listing page by page.
+
+        Pages of `session.page_size` entries are requested, `params` are
+        added to the query of the first page, for example to filter the
+        listing. When the first page tells us how many pages there are, up
+        to `session.concurrency` of the following pages are fetched in
+        parallel while earlier ones are being used. Otherwise, or if the
+        listing grew in the meantime, we follow the 'next' links one by one.
+        """
+        kwargs = _page_size(self.session)
+        if params:
+            kwargs['params'] = dict(kwargs.get('params', {}), **params)
+        response = self._json(self._get(url, **kwargs), 200)
+        yield response['data']
 
         next_url = self._get_attribute(response, 'links', 'next')
+        pages = _page_count(response)
+        workers = self.session.concurrency
+        if (next_url is not None and pages is not None and pages > 1 and
+                workers > 1):
+            urls = (_page_url(next_url, page)
+                    for page in range(2, pages + 1))
+            pool = ThreadPoolExecutor(workers)
+            pending = deque(pool.submit(self._get_page, page_url)
+                            for page_url in islice(urls, workers))
+            try:
+                while pending:
+                    response = pending.popleft().result()
+                    # keep `workers` pages in flight
+                    for page_url in islice(urls, 1):
+                        pending.append(pool.submit(self._get_page,
+                                                   page_url))
+                    yield response['data']
+            finally:
+                for future in pending:
+                    future.cancel()
+                pool.shutdown()
+            next_url = self._get_attribute(response, 'links', 'next')
+
         while next_url is not None:
-            response = self._json(self._get(next_url), 200)
-            data.extend(response['data'])
+            response = self._get_page(next_url)
+            yield response['data']
             next_url = self._get_attribute(response, 'links', 'next')
 
-        return data
+    def _get_page(self, url):
+        return self._json(self._get(url), 200)
@@ -0,0 +1,324 @@
+"""Download large files in segments over several connections."""
+from concurrent.futures import FIRST_EXCEPTION
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import io
+import math
+import os
+import re
+import threading
+
+from requests.packages.urllib3.exceptions import ProtocolError
+from tqdm import tqdm
+
+from .retry import RETRY_EXCEPTIONS
+from ..utils import monotonic
+
+
+# files are only split into segments of at least this many bytes
+MIN_SEGMENT_SIZE = 8 * 2**20
+
+# reads start at CHUNK_SIZE bytes and adapt to the speed of the connection,
+# see `ChunkSize`
+CHUNK_SIZE = 64 * 2**10
+MIN_CHUNK_SIZE = 16 * 2**10
+MAX_CHUNK_SIZE = 2**20
+
+# progress bars are updated at most this often (in seconds)
+PROGRESS_INTERVAL = 0.1
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+_UNSATISFIED_RANGE = re.compile(r'bytes \*/(\d+)')
+
+
+def range_total(response, offset=0):
+    """Size of the file if `response` answers a request for all of it.
+
+    Only a `206 Partial Content` response starting at byte `offset` tells
+    us that the server supports Range requests, `None` otherwise. A `416
+    Range Not Satisfiable` response for a file of exactly `offset` bytes
+    means there is nothing left to download.
+    """
+    content_range = response.headers.get('Content-Range', '')
+    if response.status_code == 206:
+        match = _CONTENT_RANGE.match(content_range)
+        if match is not None and int(match.group(1)) == offset:
+            return int(match.group(3))
+    elif response.status_code == 416:
+        match = _UNSATISFIED_RANGE.match(content_range)
+        if match is not None and int(match.group(1)) == offset:
+            return offset
+    return None
+
+
+def can_read_back(fp):
+    """True if what was written to `fp` can be read from it again."""
+    readable = getattr(fp, 'readable', None)
+    if readable is None:
+        # Python 2 `file` objects
+        mode = getattr(fp, 'mode', '')
+        return 'r' in mode or '+' in mode
+    try:
+        return readable()
+    except ValueError:
+        return False
+
+
+def can_write_at(fp):
+    """True if `fp` is a real file we can write to at any offset."""
+    try:
+        fp.fileno()
+        fp.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        return False
+    return True
+
+
+class ChunkSize(object):
+    """The number of bytes to read next from a download.
+
+    Reads that fill their buffer almost at once double the size, fast
+    connections are not slowed down by many small reads. Reads that take
+    long halve it, so that slow connections still show progress.
+    """
+    __slots__ = ('size',)
+
+    # seconds
+    fast = 0.01
+    slow = 0.25
+
+    def __init__(self, size=CHUNK_SIZE):
+        self.size = size
+
+    def observe(self, n, elapsed):
+        """Adapt to a read of `n` bytes that took `elapsed` seconds."""
+        if n == self.size and elapsed < self.fast:
+            self.size = min(2 * self.size, MAX_CHUNK_SIZE)
+        elif elapsed > self.slow:
+            self.size = max(self.size // 2, MIN_CHUNK_SIZE)
+
+
+def _can_read_into(fsrc):
+    """True if `readinto()` of `fsrc` can be used to read from it."""
+    # `readinto()` of an `io` stream is reliable, not that of any object
+    # with such a method
+    if not isinstance(fsrc, io.IOBase):
+        return False
+    # urllib3 1.x can return more decompressed bytes than asked for, which
+    # do not fit into the buffer
+    headers = getattr(fsrc, 'headers', None) or {}
+    encoding = headers.get('content-encoding', 'identity')
+    return encoding == 'identity' or not getattr(fsrc, 'decode_content',
+                                                 False)
+
+
+def read_chunks(fsrc, limit=None):
+    """Iterate over the data read from `fsrc`, at most `limit` bytes.
+
+    If `fsrc` supports `readinto()` all chunks are views of one reused
+    buffer, each is only valid until the next one is read. Compressed
+    responses that are decoded while reading are read with `read()`.
+    """
+    sizes = ChunkSize()
+    if _can_read_into(fsrc):
+        buf = memoryview(bytearray(MAX_CHUNK_SIZE))
+    else:
+        buf = None
+
+    while limit is None or limit > 0:
+        size = sizes.size if limit is None else min(sizes.size, limit)
+        started = monotonic()
+        if buf is not None:
+            chunk = buf[:fsrc.readinto(buf[:size]) or 0]
+        else:
+            chunk = fsrc.read(size)
+        if not chunk:
+            return
+        sizes.observe(len(chunk), monotonic() - started)
+        if limit is not None:
+            limit -= len(chunk)
+        yield chunk
+
+
+def hash_written(fp, begin, end, hash_):
+    """Update `hash_` with bytes `begin` to `end` of `fp`.
+
+    Returns `False` if `fp` can not be read.
+    """
+    position = fp.tell()
+    try:
+        fp.seek(begin)
+        for chunk in read_chunks(fp, end - begin):
+            hash_.update(chunk)
+    except (AttributeError, IOError, OSError, ValueError):
+        # for example `io.UnsupportedOperation` for files opened with 'wb'
+        return False
+    finally:
+        fp.seek(position)
+    return True
+
+
+class Progress(object):
+    """Pass the number of bytes seen on to `update` every now and then.
+
+    Calling a progress bar for every chunk adds up to a lot of time for a
+    large file, this only does so every `PROGRESS_INTERVAL` seconds. Call
+    `flush()` when done.
+    """
+    __slots__ = ('update', 'pending', 'last')
+
+    def __init__(self, update):
+        self.update = update
+        self.pending = 0
+        self.last = monotonic()
+
+    def __call__(self, n):
+        self.pending += n
+        now = monotonic()
+        if now - self.last >= PROGRESS_INTERVAL:
+            self.last = now
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.update(self.pending)
+            self.pending = 0
+
+
+if hasattr(os, 'pwrite'):
+    def _write_at(fd, data, offset, lock):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+else:
+    def _write_at(fd, data, offset, lock):
+        # without pwrite seeking and writing has to happen in one go
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+
+
+def _segments(offset, total, segments):
+    """(begin, end) byte offsets of the segments from `offset` to `total`."""
+    size = max(MIN_SEGMENT_SIZE,
+               int(math.ceil((total - offset) / float(segments))))
+    return [(begin, min(begin + size, total))
+            for begin in range(offset, total, size)]
+
+
+def write_segments(file_, fp, first, offset, total, segments):
+    """Download `file_` of `total` bytes in up to `segments` parts to `fp`.
+
+    `first` is the streamed response to a request for everything from byte
+    `offset` on, it provides the first segment. The other segments are
+    requested with Range requests at the same time and each is written at
+    its offset into `fp`, which is grown to its final size first. A segment
+    whose connection drops is resumed following the session's
+    `retry_policy`.
+
+    If the download fails `fp` is cut back to the bytes that arrived
+    without gaps, so that it can be continued from there.
+    """
+    # where the first byte of the file belongs in `fp`
+    start = fp.tell() - offset
+    fp.flush()
+    fd = fp.fileno()
+    if hasattr(os, 'posix_fallocate') and total > offset:
+        try:
+            os.posix_fallocate(fd, start + offset, total - offset)
+        except OSError:
+            # not supported by every file system
+            pass
+    fp.truncate(start + total)
+
+    ranges = _segments(offset, total, segments)
+    # how far each segment got
+    reached = [begin for begin, end in ranges]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    with tqdm(unit='bytes', total=total, initial=offset,
+              unit_scale=True) as pbar:
+        def progress(n):
+            with lock:
+                pbar.update(n)
+
+        def download(n, response):
+            begin, end = ranges[n]
+            _write_range(file_, fd, start, begin, end, response, progress,
+                         lock, stop, reached, n)
+
+        pool = ThreadPoolExecutor(len(ranges))
+        try:
+            futures = [pool.submit(download, n, None if n else first)
+                       for n in range(len(ranges))]
+            wait(futures, return_when=FIRST_EXCEPTION)
+            # let the other segments give up if one of them failed
+            stop.set()
+            for future in futures:
+                future.result()
+        except BaseException:
+            stop.set()
+            pool.shutdown()
+            complete = offset
+            for (begin, end), got in zip(ranges, reached):
+                complete = got
+                if got < end:
+                    break
+            fp.truncate(start + complete)
+            fp.seek(start + complete)
+            raise
+        finally:
+            stop.set()
+            pool.shutdown()
+            first.close()
+
+    fp.seek(start + total)
+
+
+def _write_range(file_, fd, start, begin, end, response, progress, lock,
+                 stop, reached, n):
+    # write bytes `begin` to `end` of `file_` at `start + begin` of `fd`,
+    # keeping track of the progress in `reached[n]`
+    progress = Progress(progress)
+    attempt = 0
+    while True:
+        if response is None:
+            response = file_._get(
+                file_._download_url, stream=True,
+                headers={'Range': 'bytes={}-{}'.format(begin, end - 1),
+                         # offsets refer to the bytes as they are sent
+                         'Accept-Encoding': 'identity'})
+            if response.status_code != 206:
+                response.close()
+                raise RuntimeError("Response to a Range request has status "
+                                   "code {}.".format(response.status_code))
+
+        try:
+            for chunk in read_chunks(response.raw, end - begin):
+                if stop.is_set():
+                    return
+                _write_at(fd, chunk, start + begin, lock)
+                begin += len(chunk)
+                reached[n] = begin
+                progress(len(chunk))
+            if begin < end:
+                raise ProtocolError("Connection closed before the end "
+                                    "of the segment.")
+            return
+        except RETRY_EXCEPTIONS:
+            policy = file_.session.retry_policy
+            if not policy.can_retry('GET', attempt):
+                raise
+        finally:
+            progress.flush()
+            response.close()
+
+        # continue where the connection dropped
+        response = None
+        file_.session.wait_before_retry(attempt)
+        attempt += 1
@@ -1,36 +1,125 @@
+import hashlib
+import os
+
+import six
 from tqdm import tqdm
 
 from .core import OSFCore
+from .download import Progress
+from .download import can_read_back
+from .download import can_write_at
+from .download import hash_written
+from .download import range_total
+from .download import read_chunks
+from .download import write_segments
+from .retry import RETRY_EXCEPTIONS
 from ..exceptions import FolderExistsException
+from ..exceptions import HashMismatchException
+
+
+# files being downloaded are called like this until they are complete
+PARTIAL_SUFFIX = '.part'
+
+# `os.rename` does not replace existing files on Windows
+_replace = getattr(os, 'replace', os.rename)
 
 
-def copyfileobj(fsrc, fdst, total, length=16*1024):
+def copyfileobj(fsrc, fdst, total, hash_=None):
     """Copy data from file-like object fsrc to file-like object fdst
 
-    This is like shutil.copyfileobj but with a progressbar.
+    This is like shutil.copyfileobj but with a progressbar. See
+    `read_chunks()` for how the data is read. Pass a hashlib object as
+    `hash_` to update it with the data along the way.
     """
     with tqdm(unit='bytes', total=total, unit_scale=True) as pbar:
-        while 1:
-            buf = fsrc.read(length)
-            if not buf:
-                break
-            fdst.write(buf)
-            pbar.update(len(buf))
+        progress = Progress(pbar.update)
+        try:
+            for chunk in read_chunks(fsrc):
+                fdst.write(chunk)
+                if hash_ is not None:
+                    hash_.update(chunk)
+                progress(len(chunk))
+        finally:
+            progress.flush()
+
+
+# templates of links shared by many files, see `_compact()`
+_templates = {}
+
 
+def _compact(url, file_):
+    """Store `url` as a template that is shared by many files.
+
+    Most links of a file are the same for all files in a storage except for
+    the id or path of the file. Those links are kept as a (prefix, key,
+    suffix) tuple that all such files share. Other links are kept as they
+    are.
+    """
+    for key in ('osf_path', 'id'):
+        tail = getattr(file_, key)
+        if not tail or not isinstance(url, six.string_types):
+            continue
+        start = url.rfind(tail)
+        if start < 0:
+            continue
+        template = (url[:start], key, url[start + len(tail):])
+        # do not let odd links fill up the templates
+        if template in _templates or len(_templates) < 1024:
+            return _templates.setdefault(template, template)
+    return url
+
+
+class _Link(object):
+    """A link of a file stored in `slot`, possibly as a template."""
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, file_, klass=None):
+        if file_ is None:
+            return self
+        value = getattr(file_, self.slot)
+        if value.__class__ is tuple:
+            prefix, key, suffix = value
+            return prefix + getattr(file_, key) + suffix
+        return value
+
+    def __set__(self, file_, value):
+        setattr(file_, self.slot, value)
+
+
+class _BaseFile(OSFCore):
+    """Attributes of a file, shared by `File` and `aio.AsyncFile`."""
+    # a listing can contain millions of files, so links are stored as
+    # templates (see `_compact()`) and the hashes as a tuple, both are
+    # turned back into strings and a dictionary when used
+    __slots__ = ('id', 'osf_path', 'path', 'name', 'date_created',
+                 'date_modified', 'size', '_hashes', '_endpoint_link',
+                 '_upload_link', '_download_link', '_html_link',
+                 '_delete_link')
+
+    _endpoint = _Link('_endpoint_link')
+    _upload_url = _Link('_upload_link')
+    _download_url = _Link('_download_link')
+    _html_url = _Link('_html_link')
+    _delete_url = _Link('_delete_link')
 
-class File(OSFCore):
     def _update_attributes(self, file):
         if not file:
             return
 
         self.id = self._get_attribute(file, 'id')
-
-        self._endpoint = self._get_attribute(file, 'links', 'self')
-        self._upload_url = self._get_attribute(file, 'links', 'upload')
-        self._download_url = self._upload_url
-        self._html_url = self._get_attribute(file, 'links', 'html')
-        self._delete_url = self._get_attribute(file, 'links', 'delete')
         self.osf_path = self._get_attribute(file, 'attributes', 'path')
+
+        links = self._get_attribute(file, 'links')
+        self._endpoint_link = _compact(self._get_attribute(links, 'self'),
+                                       self)
+        self._upload_link = _compact(self._get_attribute(links, 'upload'),
+                                     self)
+        self._download_link = self._upload_link
+        self._html_link = _compact(self._get_attribute(links, 'html'), self)
+        self._delete_link = _compact(self._get_attribute(links, 'delete'),
+                                     self)
+
         self.path = self._get_attribute(file,
                                         'attributes', 'materialized_path')
         self.name = self._get_attribute(file, 'attributes', 'name')
@@ -42,27 +131,213 @@ class File(OSFCore):
                                           'attributes', 'extra', 'hashes')
         self.size = self._get_attribute(file, 'attributes', 'size')
 
+    @property
+    def hashes(self):
+        if self._hashes is None:
+            return None
+        return dict(zip(self._hashes[::2], self._hashes[1::2]))
+
+    @hashes.setter
+    def hashes(self, hashes):
+        if hashes is not None:
+            # names and values in turn
+            hashes = tuple(item for pair in hashes.items() for item in pair)
+        self._hashes = hashes
+
+    def _expected_hash(self):
+        """(hash type, hex digest) the OSF has for this file or `None`."""
+        # not set for a `File` created without any JSON
+        hashes = getattr(self, 'hashes', None) or {}
+        for hash_type in ('md5', 'sha256'):
+            if hashes.get(hash_type):
+                return hash_type, hashes[hash_type]
+
+
+class File(_BaseFile):
+    __slots__ = ()
+
     def __str__(self):
         return '<File [{0}, {1}]>'.format(self.id, self.path)
 
-    def write_to(self, fp):
+    def write_to(self, fp, segments=1, offset=0):
         """Write contents of this file to a local file.
 
         Pass in a filepointer `fp` that has been opened for writing in
         binary mode.
+
+        If the connection drops during the download and `fp` is seekable
+        the download continues where it stopped, following the session's
+        `retry_policy`. Servers that do not support Range requests send
+        the file again from the start.
+
+        Set `segments` to download a large file in up to that many parts
+        at the same time, each over its own connection. This needs `fp`
+        to be a real file and a server that supports Range requests,
+        otherwise the file is downloaded in one piece.
+
+        Pass `offset` to only write the contents from that byte on, for
+        example to finish a download that was interrupted earlier.
+
+        The data is hashed while it is written and compared with the md5
+        (or sha256) in `hashes`, a `HashMismatchException` is raised if
+        they differ. The first `offset` bytes and the parts of a segmented
+        download are read back from `fp` for this. If `fp` was not opened
+        for reading too (for example with 'wb' instead of 'w+b') a file is
+        downloaded in one piece and a non-zero `offset` raises a
+        `ValueError`.
         """
         if 'b' not in fp.mode:
             raise ValueError("File has to be opened in binary mode.")
 
-        response = self._get(self._download_url, stream=True)
-        if response.status_code == 200:
+        expected = self._expected_hash()
+        hash_ = self._write_from(fp, segments, offset, expected)
+        if hash_ is not None and hash_.hexdigest() != expected[1]:
+            raise HashMismatchException(self.path)
+
+    def _write_from(self, fp, segments, offset, expected):
+        # write the contents from byte `offset` on to `fp` and return the
+        # hash of all of them, `None` if they could not be hashed
+        def new_hash():
+            if expected is not None:
+                return hashlib.new(expected[0])
+
+        try:
+            # where the first byte of the file belongs in `fp`
+            start = fp.tell() - offset
+        except (AttributeError, IOError):
+            start = None
+
+        hash_ = new_hash()
+        if offset and hash_ is not None:
+            if start is None or not hash_written(fp, start, start + offset,
+                                                 hash_):
+                raise ValueError("File has to be opened for reading too, "
+                                 "to check the hash of what it contains "
+                                 "already.")
+
+        # the parts of a segmented download are read back to hash them
+        split = (segments > 1 and can_write_at(fp) and
+                 (expected is None or can_read_back(fp)))
+        attempt = 0
+        while True:
+            if offset or split:
+                # the answer to a range request also tells us whether the
+                # server supports them
+                response = self._get(
+                    self._download_url, stream=True,
+                    headers={'Range': 'bytes={}-'.format(offset),
+                             # offsets refer to the bytes as they are sent
+                             'Accept-Encoding': 'identity'})
+            else:
+                response = self._get(self._download_url, stream=True)
+
+            total = range_total(response, offset)
+            if total == offset:
+                # there is nothing left to download
+                response.close()
+                return hash_
+            elif total is not None:
+                if split:
+                    write_segments(self, fp, response, offset, total,
+                                   segments)
+                    # the segments arrive out of order, read them back
+                    if hash_ is not None and not hash_written(
+                            fp, start + offset, start + total, hash_):
+                        hash_ = None
+                    return hash_
+                length = total - offset
+            elif response.status_code == 416 and offset:
+                # what we have is longer than the file, it must have been
+                # replaced by a smaller one
+                response.close()
+                if start is None:
+                    raise RuntimeError("Can not continue the download, "
+                                       "the file is shorter than what was "
+                                       "written already.")
+                fp.seek(start)
+                fp.truncate()
+                offset = 0
+                hash_ = new_hash()
+                continue
+            elif response.status_code == 200:
+                if offset:
+                    if start is None:
+                        raise RuntimeError("Can not continue the download, "
+                                           "the server does not support "
+                                           "Range requests.")
+                    # the server sent the whole file
+                    fp.seek(start)
+                    fp.truncate()
+                    offset = 0
+                    hash_ = new_hash()
+                length = int(response.headers['Content-Length'])
+            else:
+                raise RuntimeError("Response has status "
+                                   "code {}.".format(response.status_code))
+
+            # a compressed response can not be continued at an offset
+            resumable = (response.headers.get('Content-Encoding', 'identity')
+                         == 'identity')
             response.raw.decode_content = True
-            copyfileobj(response.raw, fp,
-                        int(response.headers['Content-Length']))
-
-        else:
-            raise RuntimeError("Response has status "
-                               "code {}.".format(response.status_code))
+            try:
+                copyfileobj(response.raw, fp, length, hash_=hash_)
+                return hash_
+            except RETRY_EXCEPTIONS:
+                policy = self.session.retry_policy
+                if start is None or not policy.can_retry('GET', attempt):
+                    raise
+
+            if resumable:
+                # continue with what is missing
+                offset = fp.tell() - start
+            else:
+                # throw away what we have written and start from scratch
+                fp.seek(start)
+                fp.truncate()
+                offset = 0
+                hash_ = new_hash()
+            self.session.wait_before_retry(attempt)
+            attempt += 1
+
+    def download(self, path, segments=1, checksums=None):
+        """Download this file to `path`.
+
+        The contents are written to `path` with `PARTIAL_SUFFIX` appended
+        first. If such a partial file is left over from an earlier attempt
+        the download continues where that one stopped. Once complete the
+        file is checked against `hashes` (see `write_to()`) and only then
+        renamed to `path`.
+
+        A partial file that turns out not to match is downloaded once more
+        from the start, a `HashMismatchException` is raised if that does
+        not match either.
+
+        Pass a `ChecksumStore` as `checksums` to remember the hashes of the
+        downloaded file.
+        """
+        partial = path + PARTIAL_SUFFIX
+        try:
+            offset = os.path.getsize(partial)
+        except OSError:
+            offset = 0
+
+        try:
+            # opened for reading as well to check the hash of what is in
+            # the file already
+            with open(partial, 'r+b' if offset else 'w+b') as fp:
+                fp.seek(offset)
+                self.write_to(fp, segments=segments, offset=offset)
+        except HashMismatchException:
+            os.remove(partial)
+            if offset:
+                # the remote file might have changed since the first attempt
+                return self.download(path, segments=segments,
+                                     checksums=checksums)
+            raise
+        _replace(partial, path)
+
+        if checksums is not None:
+            checksums.record(path, self.hashes or {})
 
     def remove(self):
         """Remove this file from the remote storage."""
@@ -94,25 +369,53 @@ class File(OSFCore):
             raise RuntimeError(msg)
 
 
-class ContainerMixin:
+def _child_filter(name, kind):
+    """Query parameters asking the OSF for children called `name`."""
+    return {'filter[name]': name, 'filter[kind]': kind}
+
+
+class ContainerMixin(object):
+    __slots__ = ()
+
     def _iter_children(self, url, kind, klass, recurse=None):
         """Iterate over all children of `kind`
 
         Yield an instance of `klass` when a child is of type `kind`. Uses
         `recurse` as the path of attributes in the JSON returned from `url`
         to find more children.
+
+        Children are yielded as soon as the page listing them arrives, only
+        the URLs of folders still to be visited are kept around.
+        """
+        urls = [url]
+
+        while urls:
+            for page in self._iter_pages(urls.pop()):
+                for child in page:
+                    kind_ = child['attributes']['kind']
+                    if kind_ == kind:
+                        yield klass(child, self.session)
+                    elif recurse is not None:
+                        # visit the child once done with this listing
+                        urls.append(self._get_attribute(child, *recurse))
+
+    def _find_child(self, url, name, kind):
+        """Find the child called `name` of `kind` in the listing at `url`.
+
+        Returns the JSON describing the child or `None`. The OSF filters
+        the listing for us, it also returns children whose name only
+        contains `name` so we still check for an exact match.
         """
-        children = self._follow_next(url)
-
-        while children:
-            child = children.pop()
-            kind_ = child['attributes']['kind']
-            if kind_ == kind:
-                yield klass(child, self.session)
-            elif recurse is not None:
-                # recurse into a child and add entries to `children`
-                url = self._get_attribute(child, *recurse)
-                children.extend(self._follow_next(url))
+        pages = self._iter_pages(url, _child_filter(name, kind))
+        try:
+            for page in pages:
+                for child in page:
+                    attributes = child['attributes']
+                    if (attributes['kind'] == kind and
+                            attributes['name'] == name):
+                        return child
+        finally:
+            pages.close()
 
     @property
     def files(self):
@@ -130,18 +433,20 @@ class ContainerMixin:
 
     def create_folder(self, name, exist_ok=False):
         url = self._new_folder_url
-        # Create a new sub-folder
-        response = self._put(url, params={'name': name})
+        # Create a new sub-folder, not retried: a retry after a lost
+        # response would get a 409 for the folder we just created
+        response = self._put(url, params={'name': name}, retry=False)
         if response.status_code == 409 and not exist_ok:
             raise FolderExistsException(name)
 
         elif response.status_code == 409 and exist_ok:
-            for folder in self.folders:
-                if folder.name == name:
-                    return folder
+            folder = self._find_child(self._files_url, name, 'folder')
+            if folder is not None:
+                return Folder(folder, self.session)
 
         elif response.status_code == 201:
-            return _WaterButlerFolder(response.json()['data'], self.session)
+            return _WaterButlerFolder(self.session.decode_json(response)['data'],
+                                      self.session)
 
         else:
             raise RuntimeError("Response has status code {} while creating "
@@ -149,7 +454,14 @@ class ContainerMixin:
                                                    name))
 
 
-class Folder(OSFCore, ContainerMixin):
+class _BaseFolder(OSFCore):
+    """Attributes of a folder, shared by `Folder` and `aio.AsyncFolder`."""
+    __slots__ = ('id', '_endpoint', '_delete_url', '_new_folder_url',
+                 '_new_file_url', '_move_url', '_files_url', 'osf_path',
+                 'path', 'name', 'date_created', 'date_modified')
+
+    _files_key = ('relationships', 'files', 'links', 'related', 'href')
+
     def _update_attributes(self, file):
         if not file:
             return
@@ -163,8 +475,6 @@ class Folder(OSFCore, ContainerMixin):
         self._new_file_url = self._get_attribute(file, 'links', 'upload')
         self._move_url = self._get_attribute(file, 'links', 'move')
 
-        self._files_key = ('relationships', 'files', 'links', 'related',
-                           'href')
         self._files_url = self._get_attribute(file, *self._files_key)
 
         self.osf_path = self._get_attribute(file, 'attributes', 'path')
@@ -176,20 +486,19 @@ class Folder(OSFCore, ContainerMixin):
         self.date_modified = self._get_attribute(file,
                                                  'attributes', 'date_modified')
 
+
+class Folder(_BaseFolder, ContainerMixin):
+    __slots__ = ()
+
     def __str__(self):
         return '<Folder [{0}, {1}]>'.format(self.id, self.path)
 
 
-class _WaterButlerFolder(OSFCore, ContainerMixin):
-    """A slimmed down `Folder` built from a WaterButler response
-
-    This representation is enough to navigate the folder structure
-    and create new, rename and delete sub-folders.
-
-    Users should never see this, always show them a full `Folder`.
-    """
-    def __str__(self):
-        return '<_WaterButlerFolder [{0}]>'.format(self.id)
+class _BaseWaterButlerFolder(OSFCore):
+    """Attributes of a folder built from a WaterButler response, shared by
+    `_WaterButlerFolder` and its asyncio version."""
+    __slots__ = ('id', 'osf_path', '_delete_url', '_new_folder_url',
+                 '_new_file_url', '_move_url')
 
     def _update_attributes(self, file):
         if not file:
@@ -204,6 +513,20 @@ class _WaterButlerFolder(OSFCore, ContainerMixin):
         self._new_file_url = self._get_attribute(file, 'links', 'upload')
         self._move_url = self._get_attribute(file, 'links', 'move')
 
+
+class _WaterButlerFolder(_BaseWaterButlerFolder, ContainerMixin):
+    """A slimmed down `Folder` built from a WaterButler response
+
+    This representation is enough to navigate the folder structure
+    and create new, rename and delete sub-folders.
+
+    Users should never see this, always show them a full `Folder`.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return '<_WaterButlerFolder [{0}]>'.format(self.id)
+
     @property
     def full_folder(self):
         base_url = "https://api.osf.io/v2/files"
@@ -0,0 +1,224 @@
+"""Local index of the files and folders in a storage."""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ..utils import makedirs
+from ..utils import norm_remote_path
+
+
+class StorageIndex(object):
+    """Keep the file tree of storages in a SQLite database.
+
+    Each file or folder is stored with its path, size, hashes, date of
+    modification and the JSON the OSF returned for it, so that `File`
+    objects can be created from it without asking the OSF. A storage is
+    identified by its `id`, for example ``f3szh:osfstorage``.
+
+    Walking a storage records all entries under a new generation, which
+    replaces the previous one once the walk is complete. Until then the
+    previous generation is used. Looking up a path uses the primary key
+    and takes well under a millisecond even for millions of entries.
+
+    An index can be shared by several threads.
+    """
+    # number of entries written or read at once, committing is the slow
+    # part of writing so this is large
+    batch_size = 10000
+
+    def __init__(self, directory):
+        makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'index.sqlite')
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        # writing a new generation takes many transactions, which are
+        # much faster with a write-ahead log
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS storages ("
+                             " storage TEXT PRIMARY KEY,"
+                             " generation INTEGER,"
+                             " indexed REAL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                             " storage TEXT,"
+                             " generation INTEGER,"
+                             " path TEXT,"
+                             " kind TEXT,"
+                             " name TEXT,"
+                             " size INTEGER,"
+                             " md5 TEXT,"
+                             " sha256 TEXT,"
+                             " modified TEXT,"
+                             " data TEXT,"
+                             " PRIMARY KEY (storage, generation, path))"
+                             " WITHOUT ROWID")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def indexed(self, storage):
+        """Time at which `storage` was last indexed, `None` if never."""
+        rows = self._query("SELECT indexed FROM storages WHERE storage = ?",
+                           (storage,))
+        if rows:
+            return rows[0][0]
+
+    def get(self, storage, path):
+        """JSON of the entry at `path` in `storage`, `None` if unknown."""
+        rows = self._query("SELECT data FROM entries JOIN storages"
+                           " USING (storage, generation)"
+                           " WHERE storage = ? AND path = ?",
+                           (storage, norm_remote_path(path)))
+        if rows:
+            return json.loads(rows[0][0])
+
+    def children(self, storage, folder=''):
+        """JSON of the entries directly in `folder` of `storage` by path."""
+        low, high = _subtree(folder)
+        rows = self._query("SELECT path, data FROM entries JOIN storages"
+                           " USING (storage, generation)"
+                           " WHERE storage = ? AND path > ? AND path < ? AND"
+                           " instr(substr(path, ?), '/') = 0",
+                           (storage, low, high, len(low) + 1))
+        return dict((path, json.loads(data)) for path, data in rows)
+
+    def files(self, storage, folder=''):
+        """Iterate over the JSON of all files in `storage` sorted by path.
+
+        Only files below `folder` are listed if it is given.
+        """
+        path, high = _subtree(folder)
+        while True:
+            # read in batches so that a huge index is not loaded at once
+            rows = self._query("SELECT path, data FROM entries JOIN storages"
+                               " USING (storage, generation)"
+                               " WHERE storage = ? AND path > ? AND"
+                               " path < ? AND kind = 'file'"
+                               " ORDER BY path LIMIT ?",
+                               (storage, path, high, self.batch_size))
+            for path, data in rows:
+                yield json.loads(data)
+            if len(rows) < self.batch_size:
+                break
+
+    def remove(self, storage, path):
+        """Forget the entry at `path` in `storage`."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries WHERE storage = ? AND"
+                             " path = ?", (storage, norm_remote_path(path)))
+
+    def writer(self, storage):
+        """Start recording a new generation of entries for `storage`.
+
+        Call `add()` on the returned object for every entry, then
+        `commit()` once all entries were added or `abort()`.
+        """
+        rows = self._query("SELECT MAX(generation) FROM entries"
+                           " WHERE storage = ?", (storage,))
+        return _IndexWriter(self, storage, (rows[0][0] or 0) + 1)
+
+    def _query(self, sql, parameters):
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def _insert(self, rows):
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO entries"
+                                 " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                 rows)
+
+    def _commit(self, storage, generation):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO storages"
+                             " VALUES (?, ?, ?)",
+                             (storage, generation, time.time()))
+            self._db.execute("DELETE FROM entries WHERE storage = ? AND"
+                             " generation != ?", (storage, generation))
+
+    def _keep(self, storage, generation, folder):
+        low, high = _subtree(folder)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO entries"
+                             " SELECT storage, ?, path, kind, name, size,"
+                             " md5, sha256, modified, data"
+                             " FROM entries JOIN storages"
+                             " USING (storage, generation)"
+                             " WHERE storage = ? AND path > ? AND path < ?",
+                             (generation, storage, low, high))
+
+    def _abort(self, storage, generation):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries WHERE storage = ? AND"
+                             " generation = ?", (storage, generation))
+
+
+def _subtree(folder):
+    # range of the paths below `folder`, '0' is the character after '/'
+    if not folder:
+        return '', u'\U0010ffff'
+    folder = norm_remote_path(folder)
+    return folder + '/', folder + '0'
+
+
+def _row(storage, generation, entry):
+    attributes = entry['attributes']
+    hashes = (attributes.get('extra') or {}).get('hashes') or {}
+    return (storage, generation,
+            norm_remote_path(attributes['materialized_path']),
+            attributes['kind'], attributes['name'], attributes.get('size'),
+            hashes.get('md5'), hashes.get('sha256'),
+            attributes.get('date_modified'), json.dumps(entry))
+
+
+class _IndexWriter(object):
+    def __init__(self, index, storage, generation):
+        self.index = index
+        self.storage = storage
+        self.generation = generation
+        self._rows = []
+
+    def add(self, entry):
+        self._rows.append(_row(self.storage, self.generation, entry))
+        if len(self._rows) >= self.index.batch_size:
+            self._flush()
+
+    def commit(self):
+        self._flush()
+        self.index._commit(self.storage, self.generation)
+
+    def keep(self, folder):
+        """Copy the entries below `folder` from the current generation."""
+        self.index._keep(self.storage, self.generation, folder)
+
+    def abort(self):
+        self._rows = []
+        self.index._abort(self.storage, self.generation)
+
+    def _flush(self):
+        if self._rows:
+            self.index._insert(self._rows)
+            self._rows = []
+
+
+class Changeset(object):
+    """The files `added`, `modified` and `removed` in a storage.
+
+    Each is a list of `File` objects, for removed files as they were
+    last indexed.
+    """
+    def __init__(self):
+        self.added = []
+        self.modified = []
+        self.removed = []
+
+    def __len__(self):
+        return len(self.added) + len(self.modified) + len(self.removed)
+
+    def __repr__(self):
+        return '<Changeset [{} added, {} modified, {} removed]>'.format(
+            len(self.added), len(self.modified), len(self.removed))
@@ -1,14 +1,31 @@
+from collections import OrderedDict
+import os
+import threading
+
 from .core import OSFCore
 from .storage import Storage
+from .storage import clone_storages
+from ..utils import monotonic
 
 
-class Project(OSFCore):
+class _BaseProject(OSFCore):
+    """Attributes of a project, shared by `Project` and `aio.AsyncProject`.
+    """
     _types = [
         'nodes',
         'registrations'
     ]
 
+    # number of seconds for which the list of storages is reused before
+    # fetching it again, `None` means until `refresh()` is called
+    storages_ttl = None
+
     def _update_attributes(self, project):
+        # storages by provider, fetched when first needed
+        self._stores = None
+        self._stores_fetched = None
+        self._stores_lock = threading.Lock()
+
         if not project:
             return
 
@@ -24,25 +41,63 @@ class Project(OSFCore):
         storages = ['relationships', 'files', 'links', 'related', 'href']
         self._storages_url = self._get_attribute(project, *storages)
 
+    def refresh(self):
+        """Forget the storages of this project, they are fetched again when
+        next needed."""
+        with self._stores_lock:
+            self._stores = None
+
+    def _stores_expired(self):
+        if self._stores is None:
+            return True
+        if self.storages_ttl is None:
+            return False
+        return monotonic() - self._stores_fetched > self.storages_ttl
+
+    def _index_stores(self, stores, klass):
+        self._stores = OrderedDict(
+            (self._get_attribute(store, 'attributes', 'provider'),
+             klass(store, self.session))
+            for store in stores)
+        self._stores_fetched = monotonic()
+
+
+class Project(_BaseProject):
     def __str__(self):
         return '<Project [{0}]>'.format(self.id)
 
+    def _storages(self):
+        # map of provider names to storages, fetched once and reused
+        with self._stores_lock:
+            if self._stores_expired():
+                stores = self._json(self._get(self._storages_url), 200)
+                self._index_stores(stores['data'], Storage)
+            return self._stores
+
     def storage(self, provider='osfstorage'):
         """Return storage `provider`."""
-        stores = self._json(self._get(self._storages_url), 200)
-        stores = stores['data']
-        for store in stores:
-            provides = self._get_attribute(store, 'attributes', 'provider')
-            if provides == provider:
-                return Storage(store, self.session)
-
-        raise RuntimeError("Project has no storage "
-                           "provider '{}'".format(provider))
+        stores = self._storages()
+        if provider not in stores:
+            raise RuntimeError("Project has no storage "
+                               "provider '{}'".format(provider))
+        return stores[provider]
 
     @property
     def storages(self):
         """Iterate over all storages for this projects."""
-        stores = self._json(self._get(self._storages_url), 200)
-        stores = stores['data']
-        for store in stores:
-            yield Storage(store, self.session)
+        for store in list(self._storages().values()):
+            yield store
+
+    def clone(self, directory, jobs=1, update=False, callback=None,
+              checksums=None):
+        """Download the files of all storages of this project.
+
+        Each storage is copied to a directory named after it below
+        `directory`. All storages are listed at the same time while `jobs`
+        threads download their files. See `clone_storages()` for the other
+        arguments and the list of failures returned.
+        """
+        targets = [(store, os.path.join(directory, store.name))
+                   for store in self.storages]
+        return clone_storages(targets, jobs=jobs, update=update,
+                              callback=callback, checksums=checksums)
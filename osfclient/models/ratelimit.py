@@ -0,0 +1,148 @@
+"""Client side rate limiting of requests made to the OSF."""
+import threading
+import time
+
+from ..utils import monotonic
+
+
+class TokenBucket(object):
+    """Limit the rate of requests with a token bucket.
+
+    Tokens are added to the bucket at `rate` tokens per second up to a
+    maximum of `burst` tokens. Every request takes one token, when the
+    bucket is empty callers wait until a token becomes available. A `rate`
+    of `None` disables rate limiting.
+
+    When the server signals that we are making too many requests call
+    `backoff()`, this halves the rate (multiplicative decrease). Every
+    successful request then calls `recover()` which adds a fraction
+    `increase` of the configured rate back (additive increase) until the
+    configured rate is reached again.
+
+    A single bucket can be shared by several threads.
+    """
+    def __init__(self, rate=1, burst=1, min_rate=0.1, decrease=0.5,
+                 increase=0.02):
+        self.min_rate = min_rate
+        self.decrease = decrease
+        self.increase = increase
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+
+    def configure(self, rate=1, burst=1):
+        """Change the rate (requests per second) and burst size."""
+        if rate is not None and rate <= 0:
+            raise ValueError("Rate has to be positive, not {}.".format(rate))
+        if burst < 1:
+            raise ValueError("Burst has to be at least 1, not "
+                             "{}.".format(burst))
+
+        with self._lock:
+            self.rate = rate
+            # the rate we return to after backing off
+            self.target_rate = rate
+            self.burst = burst
+            self._tokens = float(burst)
+            self._last = monotonic()
+            # average time between requests, used to pick a starting
+            # rate when backing off without a configured rate
+            self._interval = None
+            # nobody makes a request before this time
+            self._resume_at = self._last
+            # further backoffs before this time do not reduce the rate
+            self._decreased_until = self._last
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it.
+
+        Tokens can be reserved ahead of time, the bucket then goes into
+        debt and later callers wait correspondingly longer. This keeps
+        waiting threads in first-come-first-served order.
+        """
+        with self._lock:
+            now = monotonic()
+            elapsed = now - self._last
+            self._last = now
+            if self._interval is None:
+                self._interval = elapsed
+            else:
+                self._interval = 0.8 * self._interval + 0.2 * elapsed
+
+            paused = max(0., self._resume_at - now)
+            if self.rate is None:
+                return paused
+
+            self._tokens = min(self.burst,
+                               self._tokens + elapsed * self.rate)
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return paused
+            return max(paused, -self._tokens / self.rate)
+
+    def acquire(self):
+        """Wait until a token is available.
+
+        Returns the number of seconds spent waiting.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def backoff(self, delay=None):
+        """Slow down after the server told us to.
+
+        Reduces the rate and, if given, makes everyone wait an extra `delay`
+        seconds (for example from a `Retry-After` header).
+
+        The rate is reduced at most once per interval between requests at
+        the reduced rate, and not before the wait is over. Requests that
+        were already on their way are throttled too, reducing the rate for
+        each of them would slow down far more than the server asked for.
+        """
+        with self._lock:
+            self._pause(delay)
+            now = monotonic()
+            if now < self._decreased_until:
+                return
+
+            if self.rate is None:
+                # estimate the rate we were making requests at
+                if self._interval:
+                    rate = 1. / self._interval
+                else:
+                    rate = float(self.burst)
+                self._unlimited_rate = rate
+            else:
+                rate = self.rate
+            # a configured rate below `min_rate` is never raised
+            self.rate = min(rate, max(self.min_rate, rate * self.decrease))
+            self._decreased_until = max(self._resume_at,
+                                        now + 1. / self.rate)
+
+    def pause(self, delay):
+        """Make everyone wait `delay` seconds without changing the rate."""
+        with self._lock:
+            self._pause(delay)
+
+    def _pause(self, delay):
+        if delay:
+            self._resume_at = max(self._resume_at,
+                                  monotonic() + delay)
+
+    def recover(self):
+        """Move the rate back towards the configured rate."""
+        if self.rate == self.target_rate:
+            return
+
+        with self._lock:
+            if self.rate is None or self.rate == self.target_rate:
+                return
+            if self.target_rate is None:
+                target = self._unlimited_rate
+            else:
+                target = self.target_rate
+
+            self.rate += self.increase * target
+            if self.rate >= target:
+                self.rate = self.target_rate
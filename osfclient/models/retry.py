@@ -0,0 +1,50 @@
+"""Retrying requests that failed because of network or server problems."""
+import random
+import time
+
+from requests.exceptions import ChunkedEncodingError
+from requests.exceptions import ConnectionError
+from requests.exceptions import Timeout
+from requests.packages.urllib3.exceptions import ProtocolError
+from requests.packages.urllib3.exceptions import ReadTimeoutError
+
+
+# exceptions raised when the connection drops while sending a request or
+# reading a response body
+RETRY_EXCEPTIONS = (ConnectionError, Timeout, ChunkedEncodingError,
+                    ProtocolError, ReadTimeoutError)
+
+
+class RetryPolicy(object):
+    """Decide if and when to retry a failed request.
+
+    Requests made with one of `methods` are retried up to `total` times
+    when the connection fails, times out or the server responds with one
+    of `status_codes`. Before retry number `n` (starting at zero) we wait
+    a random time between zero and ``backoff_factor * 2**n`` seconds, but
+    never more than `max_backoff` seconds. The random "jitter" stops many
+    clients from retrying in lock step.
+    """
+    methods = ('GET', 'HEAD', 'DELETE', 'PUT')
+
+    def __init__(self, total=3, backoff_factor=0.5, max_backoff=30.,
+                 status_codes=(500, 502, 504)):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.status_codes = status_codes
+
+    def can_retry(self, method, attempt):
+        """Check if retry number `attempt` of a `method` request is allowed."""
+        return method.upper() in self.methods and attempt < self.total
+
+    def backoff(self, attempt):
+        """Number of seconds to wait before retry number `attempt`."""
+        limit = min(self.max_backoff, self.backoff_factor * 2 ** attempt)
+        return random.uniform(0, limit)
+
+    def sleep(self, attempt):
+        """Wait before retry number `attempt`, returns the time waited."""
+        delay = self.backoff(attempt)
+        time.sleep(delay)
+        return delay
@@ -1,53 +1,514 @@
-import time
+import copy
+from email.utils import mktime_tz, parsedate_tz
 from functools import wraps
+import hashlib
+import json
+import os
+import threading
+import time
 
 import requests
+from requests.adapters import DEFAULT_POOLSIZE
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .ratelimit import TokenBucket
+from .retry import RETRY_EXCEPTIONS
+from .retry import RetryPolicy
+from .stats import RequestEvent
 from ..exceptions import UnauthorizedException
+from ..utils import monotonic
 from ..__version__ import __version__
 
 
-def _rate_limit(func, per_second=1):
+# hosts serving the OSF API and the file contents (WaterButler), each gets
+# its own pool of connections
+API_URL = 'https://api.osf.io/'
+FILES_URL = 'https://files.osf.io/'
+
+DEFAULT_HEADERS = {
+    # Only accept JSON responses
+    'Accept': 'application/vnd.api+json',
+    # Only accept UTF-8 encoded data
+    'Accept-Charset': 'utf-8',
+    # Always send JSON
+    'Content-Type': "application/json",
+    # Custom User-Agent string
+    'User-Agent': 'osfclient v' + __version__,
+}
+
+# status codes with which the server tells us to slow down
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def loads(content):
+    """Decode the JSON document `content`, a `bytes` or text string.
+
+    Uses orjson if it is installed, it is several times faster than the
+    json module for large listings. Documents orjson does not accept are
+    decoded by the json module, so either way errors are the same.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    return json.loads(content)
+
+
+def _seconds_until(value):
+    """Convert a `Retry-After` style header value into seconds.
+
+    The value can either be a number of seconds or a HTTP date.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0., mktime_tz(date) - time.time())
+
+
+def _retry_after(response):
+    """Number of seconds the server asked us to wait, if any."""
+    delay = _seconds_until(response.headers.get('Retry-After'))
+    if delay is not None:
+        return delay
+
+    if response.headers.get('X-RateLimit-Remaining') == '0':
+        reset = _seconds_until(response.headers.get('X-RateLimit-Reset'))
+        # the reset time is either relative or a UNIX timestamp
+        if reset is not None and reset > 10**9:
+            reset = max(0., reset - time.time())
+        return reset
+
+
+def _can_resend(kwargs):
+    """Check if the body of a request can be sent again.
+
+    File-like bodies can be sent again if they can be rewound.
+    """
+    data = kwargs.get('data')
+    if data is None or isinstance(data, (bytes, str, dict)):
+        return True
+    if hasattr(data, 'seek') and hasattr(data, 'tell'):
+        return True
+    return False
+
+
+def _body_position(kwargs):
+    """Position of a file-like request body, used to rewind it."""
+    data = kwargs.get('data')
+    if hasattr(data, 'tell'):
+        return data.tell()
+
+
+def _rewind(kwargs, position):
+    if position is not None:
+        kwargs['data'].seek(position)
+
+
+def _retry(func):
+    """Retry requests that failed because of network or server problems.
+
+    The session's `retry_policy` decides which requests are retried, how
+    often and how long to wait in between. Requests with a body are only
+    retried if the body can be sent again. Pass `retry=False` for requests
+    that must not be sent twice.
+    """
+    @wraps(func)
+    def wrapper(self, url, *args, **kwargs):
+        method = func.__name__
+        policy = self.retry_policy
+        can_resend = kwargs.pop('retry', True) and _can_resend(kwargs)
+        position = _body_position(kwargs)
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+
+        attempt = 0
+        while True:
+            retry = can_resend and policy.can_retry(method, attempt)
+            _rewind(kwargs, position)
+            try:
+                response = func(self, url, *args, **kwargs)
+            except RETRY_EXCEPTIONS:
+                if not retry:
+                    raise
+            else:
+                if not retry or (response.status_code not in
+                                 policy.status_codes):
+                    return response
+                # release the connection before trying again
+                response.close()
+
+            self.wait_before_retry(attempt)
+            attempt += 1
+
+    return wrapper
+
+
+def _body_size(kwargs):
+    """Number of bytes in the body of a request, as far as we can tell."""
+    data = kwargs.get('data')
+    if isinstance(data, (bytes, str)):
+        return len(data)
+    if hasattr(data, 'fileno'):
+        try:
+            return os.fstat(data.fileno()).st_size - data.tell()
+        except (OSError, IOError, ValueError):
+            pass
+    return 0
+
+
+def _response_size(response, kwargs):
+    """Number of bytes in the body of `response`.
+
+    The body of a streamed response has not been read yet, use the size
+    the server announced.
+    """
+    try:
+        if kwargs.get('stream'):
+            return int(response.headers.get('Content-Length', 0))
+        return len(response.content)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _instrument(func):
+    """Tell the session's request hooks about each request.
+
+    Each hook is called with a `RequestEvent` once the request finished,
+    including all retries and time spent waiting for the rate limiter.
+    """
+    @wraps(func)
+    def wrapper(self, url, *args, **kwargs):
+        if not self.request_hooks:
+            return func(self, url, *args, **kwargs)
+
+        event = RequestEvent(func.__name__.upper(), url)
+        event.sent = _body_size(kwargs)
+        self._events.current = event
+        start = monotonic()
+        try:
+            response = func(self, url, *args, **kwargs)
+        except Exception as e:
+            event.error = e
+            raise
+        else:
+            event.status = response.status_code
+            event.received = _response_size(response, kwargs)
+            return response
+        finally:
+            self._events.current = None
+            event.latency = (monotonic() - start - event.throttled -
+                             event.retry_wait)
+            for hook in list(self.request_hooks):
+                hook(event)
+
+    return wrapper
+
+
+# headers of a response stored in the cache
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def _cache_key(session, url, kwargs):
+    """Key identifying a GET request in the response cache.
+
+    Different users can see different responses for the same URL, so the
+    key includes who is asking.
+    """
+    request = requests.Request('GET', url, params=kwargs.get('params'))
+    url = request.prepare().url
+    if session.auth is not None:
+        user = session.auth[0]
+    else:
+        user = session.headers.get('Authorization', '')
+    return hashlib.sha256((user + ' ' + url).encode('utf-8')).hexdigest()
+
+
+def _cached_response(url, headers, body):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = 'utf-8'
+    response._content = body
+    return response
+
+
+def _cache(func):
+    """Use the session's response cache for GET requests.
+
+    Only responses with JSON content are cached, streamed requests (like
+    file downloads) are never cached. Cached responses are revalidated
+    with a conditional request, when the server answers `304 Not Modified`
+    the cached response is returned.
+    """
+    @wraps(func)
+    def wrapper(self, url, *args, **kwargs):
+        cache = self.cache
+        if cache is None or kwargs.get('stream'):
+            return func(self, url, *args, **kwargs)
+
+        key = _cache_key(self, url, kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            headers, body, fresh = cached
+            if fresh:
+                return _cached_response(url, headers, body)
+
+            conditions = {}
+            if 'ETag' in headers:
+                conditions['If-None-Match'] = headers['ETag']
+            if 'Last-Modified' in headers:
+                conditions['If-Modified-Since'] = headers['Last-Modified']
+            kwargs['headers'] = dict(kwargs.get('headers') or {},
+                                     **conditions)
+
+        response = func(self, url, *args, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            cache.touch(key)
+            return _cached_response(url, headers, body)
+
+        content_type = response.headers.get('Content-Type', '')
+        if response.status_code == 200 and 'json' in content_type:
+            headers = dict((name, response.headers[name])
+                           for name in CACHED_HEADERS
+                           if name in response.headers)
+            # without validators a response can only be used while fresh
+            validators = 'ETag' in headers or 'Last-Modified' in headers
+            if validators or cache.ttl > 0:
+                cache.put(key, headers, response.content)
+
+        return response
+
+    return wrapper
+
+
+def _rate_limit(func):
     """Limit number of requests made per second.
 
-    Will sleep for 1/``per_second`` seconds if the last request was
-    made too recently.
+    Waits for a token from the session's `rate_limiter` before making
+    the request. When the server responds that we are making too many
+    requests the rate is reduced and the request is retried up to
+    `throttle_retries` times, after that the throttled response is
+    returned. Successful requests slowly bring the rate back up.
     """
     @wraps(func)
     def wrapper(self, url, *args, **kwargs):
-        if self.last_request is not None:
-            now = time.time()
-            delta = now - self.last_request
-            if delta < 1:
-                time.sleep(1 - delta)
+        can_resend = _can_resend(kwargs)
+        position = _body_position(kwargs)
+
+        for attempt in range(self.throttle_retries + 1):
+            if attempt:
+                _rewind(kwargs, position)
+            waited = self.rate_limiter.acquire()
+            event = self._current_event()
+            if event is not None:
+                event.throttled += waited
+            response = func(self, url, *args, **kwargs)
+
+            throttled = response.status_code in THROTTLE_STATUS_CODES
+            if not throttled:
+                break
+
+            self.rate_limiter.backoff(_retry_after(response))
+            if not can_resend:
+                break
+
+        if not throttled:
+            self.rate_limiter.recover()
+            # we are allowed to make requests but are about to run out
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                self.rate_limiter.pause(_retry_after(response))
+
+        return response
+
+    return wrapper
+
+
+class _Call(object):
+    """A request in flight that other threads can wait for."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+def _single_flight(func):
+    """Share one request between threads making the same GET request.
+
+    While a request is in flight, identical requests from other threads
+    wait for it to finish and get a copy of its response (or its
+    exception) instead of sending their own. Only plain metadata requests
+    are shared, streamed requests and requests with extra options are
+    always sent.
+    """
+    @wraps(func)
+    def wrapper(self, url, *args, **kwargs):
+        if args or set(kwargs) - {'params'}:
+            return func(self, url, *args, **kwargs)
+
+        key = _cache_key(self, url, kwargs)
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+            else:
+                self.saved += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.copy(call.response)
 
-        self.last_request = time.time()
-        return func(self, url, *args, **kwargs)
+        try:
+            call.response = func(self, url, *args, **kwargs)
+            return call.response
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
 
     return wrapper
 
 
 class OSFSession(requests.Session):
+    """Handle HTTP session related work.
+
+    A session can be shared by several threads, for example to download
+    files in parallel. The rate limit then applies to all threads together
+    and the connection pools are sized for `concurrency` threads. Set up
+    authentication before sharing the session, changing it while other
+    threads make requests is not safe.
+    """
     auth = None
     __attrs__ = requests.Session.__attrs__ + ['base_url']
 
-    def __init__(self):
-        """Handle HTTP session related work."""
+    def __init__(self, rate_limit=1, burst=1, throttle_retries=5,
+                 retries=3, backoff_factor=0.5, timeout=None,
+                 concurrency=1, cache=None, page_size=100, index=None,
+                 json_loads=loads):
+        """Create a new session.
+
+        At most `rate_limit` requests per second are made, with bursts of
+        up to `burst` requests. Set `rate_limit` to `None` to disable rate
+        limiting. If the OSF responds that we are making too many requests
+        the rate is lowered automatically and the request retried up to
+        `throttle_retries` times.
+
+        Requests that fail because of connection problems, time outs
+        (`timeout` is in seconds) or server errors are retried up to
+        `retries` times with an exponentially growing wait in between, see
+        `RetryPolicy`.
+
+        Use `add_hook()` to be told about every request made, for example
+        to collect statistics with `RequestStats`.
+
+        `concurrency` is the number of threads expected to use this session
+        at the same time. Identical GET requests made by several threads at
+        the same time are only sent once, `saved` counts how many requests
+        this avoided.
+
+        Listings are requested in pages of `page_size` entries, 100 is the
+        largest size the OSF allows. Use `None` for the server's default.
+
+        Pass a `ResponseCache` as `cache` to keep API responses on disk and
+        only download them again when they changed. Pass a `StorageIndex`
+        as `index` to record the files of storages when walking them.
+
+        Responses are decoded with `json_loads`, by default `loads()`
+        which uses orjson if it is installed.
+        """
         super(OSFSession, self).__init__()
-        self.headers.update({
-            # Only accept JSON responses
-            'Accept': 'application/vnd.api+json',
-            # Only accept UTF-8 encoded data
-            'Accept-Charset': 'utf-8',
-            # Always send JSON
-            'Content-Type': "application/json",
-            # Custom User-Agent string
-            'User-Agent': 'osfclient v' + __version__,
-            })
+        self.headers.update(DEFAULT_HEADERS)
         self.base_url = 'https://api.osf.io/v2/'
-        self.last_request = None
+        self.rate_limiter = TokenBucket(rate_limit, burst)
+        self.throttle_retries = throttle_retries
+        self.retry_policy = RetryPolicy(retries, backoff_factor)
+        self.timeout = timeout
+        self.page_size = page_size
+        self.cache = cache
+        self.index = index
+        self.json_loads = json_loads
         self.token = None
 
+        self._lock = threading.Lock()
+        # number of retries made and seconds spent waiting for them
+        self.retries = 0
+        self.retry_wait = 0.
+        # GET requests in flight and requests saved by waiting for them
+        self._in_flight = {}
+        self.saved = 0
+        # functions called with a `RequestEvent` after each request
+        self.request_hooks = []
+        self._events = threading.local()
+
+        self.set_concurrency(concurrency)
+
+    def set_concurrency(self, concurrency):
+        """Size the connection pools for `concurrency` parallel threads."""
+        if concurrency < 1:
+            raise ValueError("Concurrency has to be at least 1, not "
+                             "{}.".format(concurrency))
+        self.concurrency = concurrency
+
+        pool_size = max(DEFAULT_POOLSIZE, concurrency)
+        # retries are handled by `RetryPolicy`
+        for prefix in ('https://', 'http://', API_URL, FILES_URL):
+            if prefix in self.adapters:
+                self.adapters[prefix].close()
+            self.mount(prefix, HTTPAdapter(pool_connections=DEFAULT_POOLSIZE,
+                                           pool_maxsize=pool_size,
+                                           max_retries=0))
+
+    def wait_before_retry(self, attempt):
+        """Wait before retry number `attempt` and keep count of retries."""
+        wait = self.retry_policy.sleep(attempt)
+        with self._lock:
+            self.retries += 1
+            self.retry_wait += wait
+        event = self._current_event()
+        if event is not None:
+            event.retries += 1
+            event.retry_wait += wait
+
+    def decode_json(self, response):
+        """Decode the JSON body of `response` with `json_loads`."""
+        return self.json_loads(response.content)
+
+    def add_hook(self, hook):
+        """Call `hook` with a `RequestEvent` after every request."""
+        self.request_hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.request_hooks.remove(hook)
+
+    def _current_event(self):
+        # event of the request this thread is making, if anyone is listening
+        return getattr(self._events, 'current', None)
+
+    def set_rate_limit(self, rate_limit=1, burst=1):
+        """Change the number of requests per second and the burst size."""
+        self.rate_limiter.configure(rate_limit, burst)
+
     def basic_auth(self, username, password):
         self.auth = (username, password)
         if 'Authorization' in self.headers:
@@ -63,6 +524,8 @@ class OSFSession(requests.Session):
         # canonical OSF URLs end with a slash
         return '/'.join(parts) + '/'
 
+    @_instrument
+    @_retry
     @_rate_limit
     def put(self, url, *args, **kwargs):
         response = super(OSFSession, self).put(url, *args, **kwargs)
@@ -70,6 +533,10 @@ class OSFSession(requests.Session):
             raise UnauthorizedException()
         return response
 
+    @_single_flight
+    @_cache
+    @_instrument
+    @_retry
     @_rate_limit
     def get(self, url, *args, **kwargs):
         response = super(OSFSession, self).get(url, *args, **kwargs)
@@ -82,3 +549,21 @@ class OSFSession(requests.Session):
         if response.status_code == 401:
             raise UnauthorizedException()
         return response
+
+    @_instrument
+    @_retry
+    @_rate_limit
+    def head(self, url, *args, **kwargs):
+        response = super(OSFSession, self).head(url, *args, **kwargs)
+        if response.status_code == 401:
+            raise UnauthorizedException()
+        return response
+
+    @_instrument
+    @_retry
+    @_rate_limit
+    def delete(self, url, *args, **kwargs):
+        response = super(OSFSession, self).delete(url, *args, **kwargs)
+        if response.status_code == 401:
+            raise UnauthorizedException()
+        return response
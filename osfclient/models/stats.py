@@ -0,0 +1,104 @@
+"""Collect statistics about the requests made to the OSF."""
+import math
+import threading
+
+from six.moves.urllib.parse import urlparse
+
+from ..utils import monotonic
+
+
+def url_kind(url):
+    """Classify `url` as a request to the 'api', for 'files' or 'other'."""
+    path = urlparse(url).path
+    if path.startswith('/v1/resources/'):
+        return 'files'
+    if path.startswith('/v2/'):
+        return 'api'
+    return 'other'
+
+
+class RequestEvent(object):
+    """Describes one request made by an `OSFSession`.
+
+    `latency` is the time spent waiting for the server, `throttled` the
+    time spent waiting for the rate limiter and `retry_wait` the time spent
+    waiting between `retries`. All times are in seconds. `status` is `None`
+    if no response was received, `error` is then the exception raised.
+    For streamed requests `received` is the announced size of the body.
+    """
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.kind = url_kind(url)
+        self.status = None
+        self.error = None
+        self.latency = 0.
+        self.throttled = 0.
+        self.retry_wait = 0.
+        self.retries = 0
+        self.sent = 0
+        self.received = 0
+
+
+def percentile(values, p):
+    """The `p`-th percentile of the sorted list `values`."""
+    if not values:
+        return 0.
+    # nearest rank, `round()` rounds halves differently on Python 2 and 3
+    index = int(math.ceil(p / 100. * len(values))) - 1
+    return values[max(index, 0)]
+
+
+class RequestStats(object):
+    """Aggregate `RequestEvent`s, add an instance as a hook to a session::
+
+        stats = RequestStats()
+        session.add_hook(stats)
+        ...
+        print(stats.summary())
+    """
+    def __init__(self):
+        self.started = monotonic()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        """Describe the requests made so far in a few lines of text."""
+        elapsed = monotonic() - self.started
+        with self._lock:
+            events = list(self.events)
+
+        lines = ['{} requests in {:.2f}s'.format(len(events), elapsed)]
+        kinds = sorted(set(event.kind for event in events))
+        for kind in kinds:
+            of_kind = [event for event in events if event.kind == kind]
+            statuses = {}
+            for event in of_kind:
+                status = event.status or 'error'
+                statuses[status] = statuses.get(status, 0) + 1
+            latencies = sorted(event.latency for event in of_kind)
+            lines.append(
+                '  {:<6} {:>5} requests, latency p50 {:.3f}s p90 {:.3f}s '
+                'p99 {:.3f}s max {:.3f}s ({})'.format(
+                    kind, len(of_kind), percentile(latencies, 50),
+                    percentile(latencies, 90), percentile(latencies, 99),
+                    latencies[-1],
+                    ', '.join('{}: {}'.format(status, count)
+                              for status, count in sorted(statuses.items(),
+                                                          key=str))))
+
+        latency = sum(event.latency for event in events)
+        throttled = sum(event.throttled for event in events)
+        retry_wait = sum(event.retry_wait for event in events)
+        lines.append('waiting for the server {:.2f}s, rate limited {:.2f}s, '
+                     'before retries {:.2f}s ({} retries)'.format(
+                         latency, throttled, retry_wait,
+                         sum(event.retries for event in events)))
+        lines.append('sent {} bytes, received {} bytes'.format(
+            sum(event.sent for event in events),
+            sum(event.received for event in events)))
+        return '\n'.join(lines)
@@ -1,14 +1,22 @@
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 import os
+import threading
+
 import six
+from six.moves import queue
 
 from requests.exceptions import ConnectionError
 
 from .core import OSFCore
 from .file import ContainerMixin
 from .file import File
+from .index import Changeset
 from ..utils import checksum
 from ..utils import file_empty
 from ..utils import get_local_file_size
+from ..utils import makedirs
 from ..utils import norm_remote_path
 
 
@@ -20,7 +28,123 @@ if six.PY2:
         """
 
 
-class Storage(OSFCore, ContainerMixin):
+def _version(entry):
+    # whatever the OSF tells us that changes when a file or folder does
+    attributes = entry['attributes']
+    extra = attributes.get('extra') or {}
+    return (attributes.get('date_modified'), attributes.get('etag'),
+            attributes.get('current_version'), attributes.get('size'),
+            extra.get('hashes'))
+
+
+def _unchanged(old, folder):
+    # without a date or etag we can not tell if a folder changed
+    attributes = folder['attributes']
+    if old is None or old['attributes']['kind'] == 'file':
+        return False
+    if not (attributes.get('date_modified') or attributes.get('etag')):
+        return False
+    return _version(old) == _version(folder)
+
+
+def _clone_file(file_, directory, update, checksums):
+    """Download `file_` below `directory`, `False` if it was up to date."""
+    path = file_.path
+    if path.startswith('/'):
+        path = path[1:]
+
+    path = os.path.join(directory, path)
+    if os.path.exists(path) and update:
+        if checksums is not None:
+            local = checksums.checksum(path)
+        else:
+            local = checksum(path)
+        if local == file_.hashes.get('md5'):
+            return False
+    local_directory, _ = os.path.split(path)
+    makedirs(local_directory, exist_ok=True)
+
+    # an interrupted download continues from its partial file
+    file_.download(path, checksums=checksums)
+    return True
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def clone_storages(targets, jobs=1, update=False, callback=None,
+                   checksums=None):
+    """Download all files of several storages in parallel.
+
+    `targets` are pairs of a `Storage` and the local directory to copy its
+    files to. Every storage is listed by its own thread while `jobs`
+    threads download the files found. Only a few files per download thread
+    are queued, so listing does not get far ahead of downloading.
+
+    With `update=True` existing local files are only replaced if they
+    differ from the remote file. `callback` is called with every file
+    downloaded, one call at a time. Pass a `ChecksumStore` as `checksums`
+    to remember the hashes of downloaded files, `update=True` then does not
+    have to read them again.
+
+    A file that can not be downloaded or a storage that can not be listed
+    does not stop the others. Returns a list of (file or storage,
+    exception) pairs for everything that failed.
+    """
+    if jobs < 1:
+        raise ValueError("Need at least one job, not {}.".format(jobs))
+
+    files = queue.Queue(2 * jobs)
+    failed = []
+    lock = threading.Lock()
+
+    def list_files(storage, directory):
+        try:
+            for file_ in storage.walk():
+                files.put((file_, directory))
+        except Exception as e:
+            with lock:
+                failed.append((storage, e))
+
+    def download():
+        while True:
+            item = files.get()
+            if item is None:
+                break
+            file_, directory = item
+            try:
+                downloaded = _clone_file(file_, directory, update,
+                                         checksums)
+            except Exception as e:
+                with lock:
+                    failed.append((file_, e))
+            else:
+                if downloaded and callback is not None:
+                    with lock:
+                        callback(file_)
+
+    listers = [_start(list_files, storage, directory)
+               for storage, directory in targets]
+    downloaders = [_start(download) for _ in range(jobs)]
+    for thread in listers:
+        thread.join()
+    for _ in downloaders:
+        files.put(None)
+    for thread in downloaders:
+        thread.join()
+    return failed
+
+
+class _BaseStorage(OSFCore):
+    """Attributes of a storage, shared by `Storage` and `aio.AsyncStorage`.
+    """
+    __slots__ = ('id', 'path', 'name', 'node', 'provider', '_files_url',
+                 '_new_folder_url', '_new_file_url')
+
     _files_key = ('relationships', 'files', 'links', 'related', 'href')
 
     def _update_attributes(self, storage):
@@ -40,6 +164,10 @@ class Storage(OSFCore, ContainerMixin):
                                                    'links', 'new_folder')
         self._new_file_url = self._get_attribute(storage, 'links', 'upload')
 
+
+class Storage(_BaseStorage, ContainerMixin):
+    __slots__ = ()
+
     def __str__(self):
         return '<Storage [{0}]>'.format(self.id)
 
@@ -47,10 +175,226 @@ class Storage(OSFCore, ContainerMixin):
     def files(self):
         """Iterate over all files in this storage.
 
-        Recursively lists all files in all subfolders.
+        Recursively lists all files in all subfolders, see `walk()`.
+        """
+        return self.walk(ordered=True)
+
+    def walk(self, workers=None, ordered=False, cached=False):
+        """Iterate over all files in this storage and its subfolders.
+
+        Folders are listed in parallel by up to `workers` threads, by
+        default `session.concurrency` many. Files are yielded while the
+        walk continues, in the order their folders were listed. Set
+        `ordered=True` to always get them in the same order: the files of
+        a folder followed by the files of each of its subfolders in turn.
+
+        If the session has a `StorageIndex` a complete walk updates the
+        index of this storage. With `cached=True` the files are taken from
+        the index instead, sorted by path, if this storage was indexed.
         """
-        return self._iter_children(self._files_url, 'file', File,
-                                   self._files_key)
+        index = self.session.index
+        if cached and index is not None and index.indexed(self.id):
+            return (File(entry, self.session)
+                    for entry in index.files(self.id))
+
+        if workers is None:
+            workers = self.session.concurrency
+        if workers <= 1:
+            entries = self._walk_sequential()
+        else:
+            entries = self._walk_parallel(workers, ordered)
+        return self._files_in(entries)
+
+    def _files_in(self, entries):
+        # pick the files out of all `entries`, recording them in the index
+        index = self.session.index
+        writer = None
+        if index is not None:
+            writer = index.writer(self.id)
+
+        try:
+            for entry in entries:
+                if writer is not None:
+                    writer.add(entry)
+                if entry['attributes']['kind'] == 'file':
+                    yield File(entry, self.session)
+        except BaseException:
+            # includes the walk being abandoned half way
+            if writer is not None:
+                writer.abort()
+            raise
+        else:
+            if writer is not None:
+                writer.commit()
+
+    def _walk_sequential(self):
+        urls = [self._files_url]
+        while urls:
+            folders = []
+            for page in self._iter_pages(urls.pop()):
+                for child in page:
+                    yield child
+                    if child['attributes']['kind'] != 'file':
+                        folders.append(self._get_attribute(child,
+                                                           *self._files_key))
+            urls.extend(reversed(folders))
+
+    def _walk_parallel(self, workers, ordered):
+        # folders are listed ahead of the caller, but at most `window` of
+        # them are being listed or waiting to be read at any time
+        window = 2 * workers
+        pool = ThreadPoolExecutor(workers)
+        stop = threading.Event()
+
+        def list_folder(url):
+            # returns the entries of a folder and the URLs of its subfolders
+            entries, folders = [], []
+            if stop.is_set():
+                return entries, folders
+            for page in self._iter_pages(url):
+                if stop.is_set():
+                    break
+                entries.extend(page)
+                for child in page:
+                    if child['attributes']['kind'] != 'file':
+                        folders.append(
+                            self._get_attribute(child, *self._files_key))
+            return entries, folders
+
+        # URLs of folders still to be visited, the next one last
+        urls = [self._files_url]
+        try:
+            if ordered:
+                # depth first, listing the next folders on the stack ahead
+                futures = {}
+                while urls:
+                    for url in reversed(urls):
+                        if len(futures) >= window:
+                            break
+                        if url not in futures:
+                            futures[url] = pool.submit(list_folder, url)
+                    url = urls.pop()
+                    if url not in futures:
+                        futures[url] = pool.submit(list_folder, url)
+                    entries, folders = futures.pop(url).result()
+                    for entry in entries:
+                        yield entry
+                    urls.extend(reversed(folders))
+
+            else:
+                # in whichever order the listings finish
+                running = set()
+                while urls or running:
+                    while urls and len(running) < window:
+                        running.add(pool.submit(list_folder, urls.pop()))
+                    done, running = wait(running,
+                                         return_when=FIRST_COMPLETED)
+                    for future in done:
+                        entries, folders = future.result()
+                        urls.extend(reversed(folders))
+                        for entry in entries:
+                            yield entry
+
+        finally:
+            stop.set()
+            pool.shutdown()
+
+    def clone(self, directory, jobs=1, update=False, callback=None,
+              checksums=None):
+        """Download all files in this storage to `directory`.
+
+        The files are downloaded by `jobs` threads while the storage is
+        listed. See `clone_storages()` for the other arguments and the
+        list of failures returned.
+        """
+        return clone_storages([(self, directory)], jobs=jobs, update=update,
+                              callback=callback, checksums=checksums)
+
+    def refresh_index(self):
+        """Bring the index of this storage up to date and return a `Changeset`.
+
+        Folders whose date of modification is the same as in the index are
+        not listed again, so the cost of a refresh depends on how much
+        changed rather than on the size of the storage. Folders for which
+        the OSF reports no date of modification are always listed. A
+        storage that was never indexed is walked completely.
+        """
+        index = self.session.index
+        if index is None:
+            raise RuntimeError("Refreshing the index needs a session with "
+                               "a StorageIndex.")
+
+        changes = Changeset()
+        writer = index.writer(self.id)
+        try:
+            folders = [('', self._files_url)]
+            while folders:
+                folder, url = folders.pop()
+                known = index.children(self.id, folder)
+                for page in self._iter_pages(url):
+                    for child in page:
+                        writer.add(child)
+                        path = norm_remote_path(
+                            child['attributes']['materialized_path'])
+                        old = known.pop(path, None)
+
+                        if child['attributes']['kind'] == 'file':
+                            if old is None:
+                                changes.added.append(File(child, self.session))
+                            elif _version(old) != _version(child):
+                                changes.modified.append(File(child,
+                                                             self.session))
+                        elif _unchanged(old, child):
+                            writer.keep(path)
+                        else:
+                            folders.append((path, self._get_attribute(
+                                child, *self._files_key)))
+
+                # whatever is left is gone
+                for path, old in known.items():
+                    if old['attributes']['kind'] == 'file':
+                        removed = [old]
+                    else:
+                        removed = index.files(self.id, path)
+                    changes.removed.extend(File(entry, self.session)
+                                           for entry in removed)
+
+        except BaseException:
+            writer.abort()
+            raise
+        else:
+            writer.commit()
+
+        return changes
+
+    def file_at(self, path, cached=False):
+        """Return the file at `path` in this storage, `None` if there is none.
+
+        Only the folders along `path` are listed, one after the other, so
+        this is much quicker than searching `files` in a large storage.
+        With `cached=True` the session's `StorageIndex` is asked first.
+        """
+        path = norm_remote_path(path)
+        index = self.session.index
+        if cached and index is not None:
+            entry = index.get(self.id, path)
+            if entry is not None and entry['attributes']['kind'] == 'file':
+                return File(entry, self.session)
+        directory, fname = os.path.split(path)
+
+        url = self._files_url
+        for directory in directory.split(os.path.sep):
+            # skip empty directory names
+            if not directory:
+                continue
+            folder = self._find_child(url, directory, 'folder')
+            if folder is None:
+                return None
+            url = self._get_attribute(folder, *self._files_key)
+
+        file_ = self._find_child(url, fname, 'file')
+        if file_ is not None:
+            return File(file_, self.session)
 
     def create_file(self, path, fp, force=False, update=False):
         """Store a new file at `path` in this storage.
@@ -82,16 +426,21 @@ class Storage(OSFCore, ContainerMixin):
         # When uploading a large file (>a few MB) that already exists
         # we sometimes get a ConnectionError instead of a status == 409.
         connection_error = False
-        
+        # Creating a file is not retried: a retry after a lost response
+        # would get a 409 for the file we just created, and the connection
+        # error above has to reach us without sending the file again.
+
         # peek at the file to check if it is an empty file which needs special
         # handling in requests. If we pass a file like object to data that
         # turns out to be of length zero then no file is created on the OSF.
         # See: https://github.com/osfclient/osfclient/pull/135
         if file_empty(fp):
-            response = self._put(url, params={'name': fname}, data=b'')
+            response = self._put(url, params={'name': fname}, data=b'',
+                                 retry=False)
         else:
             try:
-                response = self._put(url, params={'name': fname}, data=fp)
+                response = self._put(url, params={'name': fname}, data=fp,
+                                     retry=False)
             except ConnectionError:
                 connection_error = True
 
@@ -114,19 +463,18 @@ class Storage(OSFCore, ContainerMixin):
 
             else:
                 # find the upload URL for the file we are trying to update
-                for file_ in self.files:
-                    if norm_remote_path(file_.path) == path:
-                        if not force:
-                            if checksum(path) == file_.hashes.get('md5'):
-                                # If the hashes are equal and force is False,
-                                # we're done here
-                                break
-                        # in the process of attempting to upload the file we
-                        # moved through it -> reset read position to beginning
-                        # of the file
-                        fp.seek(0)
-                        file_.update(fp)
-                        break
-                else:
+                file_ = self.file_at(path)
+                if file_ is None:
                     raise RuntimeError("Could not create a new file at "
                                        "({}) nor update it.".format(path))
+
+                if not force:
+                    if checksum(path) == file_.hashes.get('md5'):
+                        # If the hashes are equal and force is False,
+                        # we're done here
+                        return
+                # in the process of attempting to upload the file we
+                # moved through it -> reset read position to beginning
+                # of the file
+                fp.seek(0)
+                file_.update(fp)
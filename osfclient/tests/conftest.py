@@ -0,0 +1,8 @@
+import sys
+
+
+# osfclient.aio is written for Python 3.7+, older versions can not even
+# parse its tests
+collect_ignore = []
+if sys.version_info < (3, 7):
+    collect_ignore.append('test_aio.py')
@@ -1,5 +1,9 @@
+import json
+
 from mock import MagicMock, PropertyMock
 
+from osfclient.utils import norm_remote_path
+
 
 # When using a PropertyMock store it as an attribute
 # of the mock it belongs to so that later on a caller
@@ -29,8 +33,15 @@ def MockFolder(name):
 
 
 def MockStorage(name):
-    mock = MagicMock(name='Storage-%s' % name,
-                     files=[MockFile('/a/a/a'), MockFile('b/b/b')])
+    files = [MockFile('/a/a/a'), MockFile('b/b/b')]
+    mock = MagicMock(name='Storage-%s' % name, files=files)
+    mock.walk.return_value = files
+
+    def file_at(path, cached=False):
+        for file_ in files:
+            if norm_remote_path(file_.path) == norm_remote_path(path):
+                return file_
+    mock.file_at.side_effect = file_at
     name = PropertyMock(return_value=name)
     type(mock).name = name
     mock._name_mock = name
@@ -95,3 +106,10 @@ class FakeResponse:
 
     def json(self):
         return self._json
+
+    @property
+    def content(self):
+        return json.dumps(self._json).encode('utf-8')
+
+    def close(self):
+        pass
@@ -0,0 +1,249 @@
+"""Test the asyncio client against a local mock of the OSF API."""
+import asyncio
+import hashlib
+import io
+import json
+import re
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from osfclient.aio import AsyncFile
+from osfclient.aio import AsyncOSF
+from osfclient.aio import AsyncProject
+from osfclient.aio import AsyncStorage
+from osfclient.exceptions import HashMismatchException
+from osfclient.exceptions import UnauthorizedException
+from osfclient.tests import fake_responses
+
+
+class MockOSF(object):
+    """Serve fake OSF responses with all links pointing at the server."""
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.server = TestServer(web.Application())
+        self.server.app.router.add_route('*', '/{tail:.*}', self.handle)
+
+    async def __aenter__(self):
+        await self.server.start_server()
+        self.url = str(self.server.make_url('')).rstrip('/')
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.server.close()
+
+    def add(self, path, *responses):
+        """Respond to `path` with `responses` one after the other."""
+        self.routes[path] = list(responses)
+
+    def add_json(self, path, document, status=200):
+        text = json.dumps(document)
+        text = text.replace('https://api.osf.io', '{url}')
+        text = text.replace('https://files.osf.io', '{url}')
+        self.add(path, (status, text))
+
+    async def handle(self, request):
+        path = re.sub('/+', '/', request.path)
+        body = await request.read()
+        self.requests.append((request.method, path, request.query, body))
+
+        responses = self.routes.get(path)
+        if not responses:
+            return web.Response(status=404)
+        status, body = (responses.pop(0) if len(responses) > 1
+                        else responses[0])
+        if isinstance(body, str):
+            body = body.replace('{url}', self.url).encode('utf-8')
+        return web.Response(status=status, body=body)
+
+
+def _setup_project(server):
+    server.add_json('/v2/guids/f3szh/', fake_responses.project_node)
+    server.add_json('/v2/nodes/f3szh/', fake_responses.project_node)
+    server.add_json('/v2/nodes/f3szh/files/',
+                    fake_responses.storage_node('f3szh',
+                                                ['osfstorage', 'github']))
+    server.add_json('/v2/nodes/f3szh/files/osfstorage/',
+                    fake_responses.files_node('f3szh', 'osfstorage',
+                                              ['hello.txt', 'bye.txt'],
+                                              folder_names=['foo']))
+    server.add_json('/v2/nodes/9zpcy/files/osfstorage/foo123/',
+                    fake_responses.files_node('f3szh', 'osfstorage',
+                                              ['foo/hello2.txt']))
+
+
+def _osf(server, **kwargs):
+    kwargs.setdefault('rate_limit', None)
+    osf = AsyncOSF(**kwargs)
+    osf.session.base_url = server.url + '/v2/'
+    osf.session.retry_policy.backoff_factor = 0.
+    return osf
+
+
+def run(coroutine):
+    return asyncio.run(coroutine())
+
+
+def test_list_files():
+    async def main():
+        async with MockOSF() as server:
+            _setup_project(server)
+            async with _osf(server) as osf:
+                project = await osf.project('f3szh')
+                storages = [store async for store in project.storages]
+                store = await project.storage('osfstorage')
+                files = [f async for f in store.files]
+                folders = [f async for f in store.folders]
+
+        assert [s.name for s in storages] == ['osfstorage', 'github']
+        assert isinstance(store, AsyncStorage)
+        assert sorted(f.path for f in files) == ['/bye.txt',
+                                                 '/foo/hello2.txt',
+                                                 '/hello.txt']
+        assert all(isinstance(f, AsyncFile) for f in files)
+        assert [f.name for f in folders] == ['foo']
+
+    run(main)
+
+
+def test_write_to():
+    async def main():
+        async with MockOSF() as server:
+            _setup_project(server)
+            server.add('/v1/resources/f3szh/providers/osfstorage/hello.txt',
+                       (200, b'hello world'))
+            async with _osf(server) as osf:
+                project = await osf.project('f3szh')
+                store = await project.storage()
+                async for file_ in store.files:
+                    if file_.name == 'hello.txt':
+                        fp = io.BytesIO()
+                        fp.mode = 'wb'
+                        await file_.write_to(fp)
+
+        assert fp.getvalue() == b'hello world'
+
+    run(main)
+
+
+def test_download(tmpdir):
+    async def main():
+        async with MockOSF() as server:
+            _setup_project(server)
+            server.add('/v1/resources/f3szh/providers/osfstorage/hello.txt',
+                       (200, b'hello world'))
+            async with _osf(server) as osf:
+                project = await osf.project('f3szh')
+                store = await project.storage()
+                file_ = await store.file_at('hello.txt')
+
+                await file_.download(str(tmpdir.join('hello.txt')))
+
+                file_.hashes = {'md5': hashlib.md5(b'bye').hexdigest()}
+                with pytest.raises(HashMismatchException):
+                    await file_.download(str(tmpdir.join('bye.txt')))
+
+        assert tmpdir.join('hello.txt').read_binary() == b'hello world'
+        assert tmpdir.listdir() == [tmpdir.join('hello.txt')]
+
+    run(main)
+
+
+def test_retry_after_throttling_and_server_errors():
+    async def main():
+        async with MockOSF() as server:
+            _setup_project(server)
+            document = server.routes['/v2/guids/f3szh/'][0]
+            server.add('/v2/guids/f3szh/', (429, ''), (502, ''), document)
+            async with _osf(server, rate_limit=100) as osf:
+                project = await osf.project('f3szh')
+
+                assert project.id == 'f3szh'
+                assert osf.session.retries == 1
+                # the 429 reduced the rate
+                assert osf.session.rate_limiter.rate < 100
+
+    run(main)
+
+
+def test_unauthorized():
+    async def main():
+        async with MockOSF() as server:
+            server.add('/v2/guids/f3szh/', (401, ''))
+            async with _osf(server, token='secret') as osf:
+                with pytest.raises(UnauthorizedException):
+                    await osf.project('f3szh')
+
+        method, path, query, body = server.requests[0]
+        assert path == '/v2/guids/f3szh/'
+
+    run(main)
+
+
+def test_create_file(tmpdir):
+    local = tmpdir.join('new.txt')
+    local.write_binary(b'some data')
+
+    async def main():
+        async with MockOSF() as server:
+            _setup_project(server)
+            server.add('/v1/resources/f3szh/providers/osfstorage/',
+                       (201, '{}'))
+            async with _osf(server, token='secret') as osf:
+                project = await osf.project('f3szh')
+                store = await project.storage()
+                with open(str(local), 'rb') as fp:
+                    await store.create_file('new.txt', fp)
+
+        method, path, query, body = server.requests[-1]
+        assert method == 'PUT'
+        assert query['name'] == 'new.txt'
+        assert body == b'some data'
+
+    run(main)
+
+
+def test_concurrent_projects():
+    async def main():
+        async with MockOSF() as server:
+            _setup_project(server)
+            async with _osf(server, concurrency=4) as osf:
+                projects = await asyncio.gather(
+                    *[osf.project('f3szh') for _ in range(10)])
+
+        assert len(projects) == 10
+        assert len(server.requests) == 10
+
+    run(main)
+
+
+def test_file_at():
+    async def main():
+        async with MockOSF() as server:
+            _setup_project(server)
+            async with _osf(server) as osf:
+                project = await osf.project('f3szh')
+                store = await project.storage()
+                n_requests = len(server.requests)
+                file_ = await store.file_at('/hello.txt')
+                missing = await store.file_at('foo/missing.txt')
+
+        assert isinstance(file_, AsyncFile)
+        assert file_.name == 'hello.txt'
+        assert missing is None
+        assert len(server.requests) - n_requests == 3
+
+    run(main)
+
+
+
+def test_no_sync_methods():
+    for name in ('walk', 'refresh_index', 'clone'):
+        assert not hasattr(AsyncStorage, name)
+    assert not hasattr(AsyncProject, 'clone')
+    assert not hasattr(AsyncFile, '_write_from')
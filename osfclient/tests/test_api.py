@@ -46,8 +46,8 @@ def test_get_project(OSFCore_get):
     osf = OSF()
     project = osf.project('f3szh')
 
-    calls = [call('https://api.osf.io/v2//guids/f3szh/'), call('https://api.osf.io/v2//nodes/f3szh/')]
-    OSFCore_get.assert_has_calls(calls)
+    # the GUID resolves to the project, no second request needed
+    OSFCore_get.assert_called_once_with('https://api.osf.io/v2//guids/f3szh/')
     assert isinstance(project, Project)
 
 
@@ -56,8 +56,8 @@ def test_get_registration(OSFCore_get):
     osf = OSF()
     project = osf.project('f3szh')
 
-    calls = [call('https://api.osf.io/v2//guids/f3szh/'), call('https://api.osf.io/v2//registrations/f3szh/')]
-    OSFCore_get.assert_has_calls(calls)
+    # the GUID resolves to the registration, no second request needed
+    OSFCore_get.assert_called_once_with('https://api.osf.io/v2//guids/f3szh/')
     assert isinstance(project, Project)
 
 
@@ -82,3 +82,36 @@ def test_failed_get_project(OSFCore_get):
     OSFCore_get.assert_called_once_with(
         'https://api.osf.io/v2//guids/f3szh/'
         )
+
+
+def test_session_options():
+    osf = OSF(rate_limit=10, burst=5)
+    assert osf.session.rate_limiter.rate == 10
+    assert osf.session.rate_limiter.burst == 5
+
+
+@patch.object(OSFCore, '_get')
+def test_get_project_from_unresolved_guid(OSFCore_get):
+    guid = {'data': {'id': 'f3szh', 'type': 'nodes', 'attributes': {}}}
+    OSFCore_get.side_effect = [FakeResponse(200, guid),
+                               FakeResponse(200, project_node)]
+    osf = OSF()
+    project = osf.project('f3szh')
+
+    calls = [call('https://api.osf.io/v2//guids/f3szh/'),
+             call('https://api.osf.io/v2//nodes/f3szh/')]
+    assert OSFCore_get.call_args_list == calls
+    assert project.id == 'f3szh'
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_get_project_with_one_request(mock_get):
+    # counted at the HTTP level, the GUID resolves to the project so no
+    # request for its type is made first
+    mock_get.return_value = FakeResponse(200, project_node)
+    mock_get.return_value.headers = {}
+    osf = OSF(rate_limit=None)
+    project = osf.project('f3szh')
+
+    assert mock_get.call_count == 1
+    assert project.id == 'f3szh'
@@ -0,0 +1,75 @@
+from mock import patch
+
+from osfclient.models import ResponseCache
+
+
+def test_store_and_retrieve(tmpdir):
+    cache = ResponseCache(str(tmpdir))
+
+    assert cache.get('key') is None
+    cache.put('key', {'ETag': '"abc"'}, b'{"data": []}')
+
+    headers, body, fresh = cache.get('key')
+    assert headers == {'ETag': '"abc"'}
+    assert body == b'{"data": []}'
+    # by default responses always have to be revalidated
+    assert not fresh
+    assert cache.misses == 1
+    assert cache.hits == 0
+
+
+def test_persists_between_sessions(tmpdir):
+    cache = ResponseCache(str(tmpdir))
+    cache.put('key', {}, b'hello')
+    cache.close()
+
+    cache = ResponseCache(str(tmpdir))
+    assert cache.get('key')[1] == b'hello'
+
+
+@patch('osfclient.models.cache.time')
+def test_ttl(mock_time, tmpdir):
+    mock_time.time.return_value = 1000.
+    cache = ResponseCache(str(tmpdir), ttl=60)
+    cache.put('key', {}, b'hello')
+
+    mock_time.time.return_value = 1059.
+    assert cache.get('key')[2]
+    assert cache.hits == 1
+
+    mock_time.time.return_value = 1061.
+    assert not cache.get('key')[2]
+
+    # revalidating makes the entry fresh again
+    cache.touch('key')
+    assert cache.get('key')[2]
+    assert cache.revalidated == 1
+
+
+@patch('osfclient.models.cache.time')
+def test_evict_least_recently_used(mock_time, tmpdir):
+    mock_time.time.return_value = 1000.
+    cache = ResponseCache(str(tmpdir), max_size=35)
+
+    for n, key in enumerate(['a', 'b', 'c']):
+        mock_time.time.return_value = 1000. + n
+        cache.put(key, {}, b'x' * 10)
+    mock_time.time.return_value = 1010.
+    cache.get('a')
+
+    mock_time.time.return_value = 1020.
+    cache.put('d', {}, b'x' * 10)
+
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert cache.get('c') is not None
+    assert cache.get('d') is not None
+
+
+def test_replacing_entry_keeps_size_right(tmpdir):
+    cache = ResponseCache(str(tmpdir), max_size=15)
+
+    for _ in range(5):
+        cache.put('key', {}, b'x' * 10)
+
+    assert cache.get('key') is not None
@@ -0,0 +1,75 @@
+import os
+
+from mock import patch
+
+import pytest
+
+from osfclient.models import ChecksumStore
+from osfclient.utils import checksum
+
+
+def test_record_and_get(tmpdir):
+    store = ChecksumStore(str(tmpdir.join('cache')))
+    path = str(tmpdir.join('a.txt'))
+    with open(path, 'wb') as fp:
+        fp.write(b'hello')
+
+    assert store.get(path) is None
+    store.record(path, {'md5': 'abc', 'sha256': None})
+
+    assert store.get(path) == 'abc'
+    assert store.get(path, 'sha256') is None
+    # the same file by another name
+    assert store.get(os.path.join(str(tmpdir), '.', 'a.txt')) == 'abc'
+    with pytest.raises(ValueError):
+        store.get(path, 'sha1')
+
+    # a changed file has to be hashed again
+    with open(path, 'ab') as fp:
+        fp.write(b' world')
+    assert store.get(path) is None
+
+    os.remove(path)
+    assert store.get(path) is None
+
+
+def test_checksum_reads_file_once(tmpdir):
+    store = ChecksumStore(str(tmpdir.join('cache')))
+    path = str(tmpdir.join('a.txt'))
+    with open(path, 'wb') as fp:
+        fp.write(b'hello')
+
+    with patch('osfclient.models.checksums.checksum',
+               side_effect=checksum) as mock_checksum:
+        assert store.checksum(path) == checksum(path)
+        assert store.checksum(path) == checksum(path)
+        assert store.checksum(path, 'sha256') == checksum(path, 'sha256')
+
+    assert mock_checksum.call_count == 2
+
+    # shared with later runs
+    store.close()
+    assert ChecksumStore(str(tmpdir.join('cache'))).get(path, 'sha256') == \
+        checksum(path, 'sha256')
+
+
+def test_both_hashes_are_kept(tmpdir):
+    store = ChecksumStore(str(tmpdir.join('cache')))
+    path = str(tmpdir.join('a.txt'))
+    with open(path, 'wb') as fp:
+        fp.write(b'hello')
+
+    md5 = store.checksum(path)
+    sha256 = store.checksum(path, 'sha256')
+
+    with patch('osfclient.models.checksums.checksum') as mock_checksum:
+        assert store.checksum(path) == md5
+        assert store.checksum(path, 'sha256') == sha256
+    assert not mock_checksum.called
+
+    # hashes of a changed file are all forgotten
+    with open(path, 'ab') as fp:
+        fp.write(b' world')
+    os.utime(path, (0, 0))
+    store.record(path, {'md5': checksum(path)})
+    assert store.get(path, 'sha256') is None
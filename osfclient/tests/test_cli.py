@@ -5,9 +5,12 @@ from mock import mock_open
 import pytest
 
 from osfclient.tests.mocks import MockArgs
+from osfclient.tests.mocks import MockFile
+from osfclient.tests.mocks import MockProject
 
 from osfclient import cli
 from osfclient.exceptions import UnauthorizedException
+from osfclient.models import StorageIndex
 
 
 @patch('osfclient.cli.os.path.exists', return_value=True)
@@ -134,3 +137,59 @@ def test_might_need_auth_no_username(config_from_file):
         dummy(mock_args)
 
     assert "set a username" in str(e.value)
+
+
+def test_session_options_from_args():
+    args = MockArgs(project='test')
+    assert cli._session_options(args) == {}
+
+    args.rate_limit = 0
+    args.burst = 4
+    args.retries = 7
+    args.concurrency = 8
+    assert cli._session_options(args) == {'rate_limit': None, 'burst': 4,
+                                          'retries': 7, 'concurrency': 8}
+
+
+@patch('osfclient.cli.atexit.register')
+def test_print_stats_at_exit(register, capsys):
+    args = MockArgs(project='test')
+    args.stats = True
+    osf = cli._setup_osf(args)
+
+    stats, = osf.session.request_hooks
+    register.assert_called_once_with(cli._print_stats, stats)
+
+    cli._print_stats(stats)
+    assert '0 requests' in capsys.readouterr().err
+
+
+def test_from_index_option_uses_index(tmpdir, monkeypatch):
+    monkeypatch.setenv('OSF_CACHE_DIR', str(tmpdir))
+    args = MockArgs(project='test')
+    args.from_index = True
+
+    options = cli._session_options(args)
+
+    assert isinstance(options['index'], StorageIndex)
+    assert options['index'].path == str(tmpdir.join('index.sqlite'))
+
+
+@patch('osfclient.cli.OSF')
+def test_refresh_prints_changes(MockOSF, tmpdir, monkeypatch, capsys):
+    monkeypatch.setenv('OSF_CACHE_DIR', str(tmpdir))
+    MockOSF.return_value.session.index = None
+    project = MockProject('test')
+    MockOSF.return_value.project.return_value = project
+    for store in project.storages:
+        changes = store.refresh_index.return_value
+        changes.added = [MockFile('/new.txt')]
+        changes.modified = []
+        changes.removed = [MockFile('/a/old.txt')]
+
+    cli.refresh(MockArgs(project='test'))
+
+    assert isinstance(MockOSF.return_value.session.index, StorageIndex)
+    assert capsys.readouterr().out.splitlines() == [
+        'A osfstorage/new.txt', 'D osfstorage/a/old.txt',
+        'A gh/new.txt', 'D gh/a/old.txt']
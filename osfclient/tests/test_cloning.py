@@ -2,26 +2,26 @@
 
 import os
 
-from mock import patch, mock_open, call
+from mock import patch
+
+import pytest
 
 from osfclient import OSF
 from osfclient.cli import clone
 
 from osfclient.tests.mocks import MockProject
 from osfclient.tests.mocks import MockArgs
+from osfclient.tests.mocks import MockFile
 
 
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
 def test_clone_project(OSF_project):
-    # check that `osf clone` opens files with the right names and modes
+    # check that `osf clone` downloads files to the right places
     args = MockArgs(project='1234')
 
-    mock_open_func = mock_open()
-
-    with patch('osfclient.cli.open', mock_open_func):
-        with patch('osfclient.cli.makedirs'):
-            with patch('osfclient.cli.os.getenv', side_effect='SECRET'):
-                clone(args)
+    with patch('osfclient.models.storage.makedirs'):
+        with patch('osfclient.cli.os.getenv', side_effect='SECRET'):
+            clone(args)
 
     OSF_project.assert_called_once_with('1234')
     # check that the project and the files have been accessed
@@ -38,29 +38,26 @@ def test_clone_project(OSF_project):
                                      store._name_mock.return_value,
                                      fname)
 
-            assert call(full_path, 'wb') in mock_open_func.mock_calls
+            f.download.assert_called_once_with(full_path, checksums=None)
 
 
-@patch('osfclient.cli.checksum', return_value = '0' * 32)
+@patch('osfclient.models.storage.checksum', return_value = '0' * 32)
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
 def test_clone_project_update_file_exists_and_matches(OSF_project, checksum):
     # check that `osf clone --update` downloads all files except for any that
     # already exist locally and match the corresponding remote file
     args = MockArgs(project='1234', update=True)
 
-    mock_open_func = mock_open()
-
     def exists(file_path):
         if file_path == '1234/osfstorage/a/a/a':
             return True
         else:
             return False
 
-    with patch('osfclient.cli.open', mock_open_func):
-        with patch('osfclient.cli.makedirs'):
-            with patch('osfclient.cli.os.getenv', side_effect='SECRET'):
-                with patch('osfclient.cli.os.path.exists', side_effect=exists):
-                    clone(args)
+    with patch('osfclient.models.storage.makedirs'):
+        with patch('osfclient.cli.os.getenv', side_effect='SECRET'):
+            with patch('osfclient.models.storage.os.path.exists', side_effect=exists):
+                clone(args)
 
     OSF_project.assert_called_once_with('1234')
     # check that the project and the files have been accessed
@@ -78,31 +75,28 @@ def test_clone_project_update_file_exists_and_matches(OSF_project, checksum):
                                      fname)
 
             if full_path == '1234/osfstorage/a/a/a':
-                assert call(full_path, 'wb') not in mock_open_func.mock_calls
+                assert not f.download.called
             else:
-                assert call(full_path, 'wb') in mock_open_func.mock_calls
+                f.download.assert_called_once_with(full_path, checksums=None)
 
 
-@patch('osfclient.cli.checksum', return_value = '1' * 32)
+@patch('osfclient.models.storage.checksum', return_value = '1' * 32)
 @patch.object(OSF, 'project', return_value=MockProject('1234'))
 def test_clone_project_update_file_exists_and_differs(OSF_project, checksum):
     # check that `osf clone --update` downloads all files and overwrites
     # existing files if they differ from the remote
     args = MockArgs(project='1234', update=True)
 
-    mock_open_func = mock_open()
-
     def exists(file_path):
         if file_path == '1234/osfstorage/a/a/a':
             return True
         else:
             return False
 
-    with patch('osfclient.cli.open', mock_open_func):
-        with patch('osfclient.cli.makedirs'):
-            with patch('osfclient.cli.os.getenv', side_effect='SECRET'):
-                with patch('osfclient.cli.os.path.exists', side_effect=exists):
-                    clone(args)
+    with patch('osfclient.models.storage.makedirs'):
+        with patch('osfclient.cli.os.getenv', side_effect='SECRET'):
+            with patch('osfclient.models.storage.os.path.exists', side_effect=exists):
+                clone(args)
 
     OSF_project.assert_called_once_with('1234')
     # check that the project and the files have been accessed
@@ -119,4 +113,26 @@ def test_clone_project_update_file_exists_and_differs(OSF_project, checksum):
                                      store._name_mock.return_value,
                                      fname)
 
-            assert call(full_path, 'wb') in mock_open_func.mock_calls
+            f.download.assert_called_once_with(full_path, checksums=None)
+
+
+@patch('osfclient.cli.clone_storages')
+@patch.object(OSF, 'project', return_value=MockProject('1234'))
+def test_clone_project_jobs_and_failures(OSF_project, clone_storages, capsys):
+    # files that could not be downloaded are reported and make `osf clone`
+    # fail once everything else was downloaded
+    args = MockArgs(project='1234')
+    args.jobs = 4
+    project = OSF_project.return_value
+    broken = MockFile('/broken.txt')
+    clone_storages.return_value = [(broken, RuntimeError('oops'))]
+
+    with patch('osfclient.cli.os.getenv', side_effect='SECRET'):
+        with pytest.raises(SystemExit):
+            clone(args)
+
+    targets = [(store, os.path.join('1234', store.name))
+               for store in project.storages]
+    assert clone_storages.call_args[0] == (targets,)
+    assert clone_storages.call_args[1]['jobs'] == 4
+    assert 'oops' in capsys.readouterr().err
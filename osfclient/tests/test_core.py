@@ -0,0 +1,137 @@
+import threading
+
+from mock import patch
+
+from osfclient.models import OSFCore
+from osfclient.models import OSFSession
+from osfclient.models.core import _page_count
+from osfclient.models.core import _page_url
+
+from osfclient.tests.mocks import FakeResponse
+
+
+URL = 'https://api.osf.io/v2/nodes/f3szh/files/osfstorage/'
+
+
+def _pages(n_entries, per_page, meta=True):
+    """Fake paginated responses keyed by URL."""
+    pages = {}
+    n_pages = (n_entries + per_page - 1) // per_page
+    for page in range(1, n_pages + 1):
+        url = URL if page == 1 else URL + '?page={}'.format(page)
+        next_url = None
+        if page < n_pages:
+            next_url = URL + '?page={}'.format(page + 1)
+        links = {'next': next_url}
+        if meta:
+            links['meta'] = {'total': n_entries, 'per_page': per_page}
+        start = (page - 1) * per_page
+        data = list(range(start, min(start + per_page, n_entries)))
+        pages[url] = {'data': data, 'links': links}
+    return pages
+
+
+def _fake_get(pages, threads=None):
+    def get(url, params=None):
+        if threads is not None:
+            threads.add(threading.current_thread())
+        return FakeResponse(200, pages[url])
+    return get
+
+
+def test_page_count():
+    assert _page_count({'links': {'meta': {'total': 21,
+                                           'per_page': 10}}}) == 3
+    assert _page_count({'meta': {'total': 20, 'per_page': 10}}) == 2
+    assert _page_count({'links': {'meta': {}}}) is None
+    assert _page_count({'links': {}}) is None
+
+
+def test_page_url():
+    url = _page_url(URL + '?page=2&page%5Bsize%5D=100', 7)
+    assert url == URL + '?page%5Bsize%5D=100&page=7'
+
+
+@patch.object(OSFCore, '_get')
+def test_fetch_pages_in_parallel(OSFCore_get):
+    threads = set()
+    OSFCore_get.side_effect = _fake_get(_pages(95, 10), threads)
+    core = OSFCore({}, OSFSession(concurrency=4))
+
+    assert core._follow_next(URL) == list(range(95))
+    assert OSFCore_get.call_count == 10
+    assert len(threads) > 1
+
+
+@patch.object(OSFCore, '_get')
+def test_sequential_without_page_counts(OSFCore_get):
+    threads = set()
+    OSFCore_get.side_effect = _fake_get(_pages(95, 10, meta=False), threads)
+    core = OSFCore({}, OSFSession(concurrency=4))
+
+    assert core._follow_next(URL) == list(range(95))
+    assert threads == {threading.current_thread()}
+
+
+@patch.object(OSFCore, '_get')
+def test_sequential_without_concurrency(OSFCore_get):
+    threads = set()
+    OSFCore_get.side_effect = _fake_get(_pages(95, 10), threads)
+    core = OSFCore({}, OSFSession())
+
+    assert core._follow_next(URL) == list(range(95))
+    assert threads == {threading.current_thread()}
+
+
+@patch.object(OSFCore, '_get')
+def test_follow_pages_added_while_fetching(OSFCore_get):
+    pages = _pages(25, 10)
+    # the listing grew to 35 entries after the first page was fetched
+    grown = _pages(35, 10)
+    for url in list(pages)[1:]:
+        pages[url] = grown[url]
+    pages[URL + '?page=4'] = grown[URL + '?page=4']
+    OSFCore_get.side_effect = _fake_get(pages)
+    core = OSFCore({}, OSFSession(concurrency=4))
+
+    assert core._follow_next(URL) == list(range(35))
+
+
+@patch.object(OSFCore, '_get')
+def test_request_page_size(OSFCore_get):
+    OSFCore_get.side_effect = _fake_get(_pages(5, 10))
+
+    core = OSFCore({}, OSFSession())
+    core._follow_next(URL)
+    OSFCore_get.assert_called_once_with(URL, params={'page[size]': 100})
+
+    core = OSFCore({}, OSFSession(page_size=None))
+    core._follow_next(URL)
+    OSFCore_get.assert_called_with(URL)
+
+
+@patch.object(OSFCore, '_get')
+def test_pages_yielded_as_they_arrive(OSFCore_get):
+    OSFCore_get.side_effect = _fake_get(_pages(95, 10))
+    core = OSFCore({}, OSFSession())
+
+    pages = core._iter_pages(URL)
+    assert next(pages) == list(range(10))
+    assert OSFCore_get.call_count == 1
+    assert next(pages) == list(range(10, 20))
+    assert OSFCore_get.call_count == 2
+
+
+@patch.object(OSFCore, '_get')
+def test_bounded_number_of_pages_in_flight(OSFCore_get):
+    OSFCore_get.side_effect = _fake_get(_pages(95, 10))
+    core = OSFCore({}, OSFSession(concurrency=2))
+
+    pages = core._iter_pages(URL)
+    next(pages)
+    next(pages)
+    # the first page, the one we are looking at and two more
+    assert OSFCore_get.call_count <= 4
+    pages.close()
+
+    assert OSFCore_get.call_count <= 4
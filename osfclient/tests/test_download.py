@@ -0,0 +1,95 @@
+import gzip
+import io
+
+from mock import MagicMock
+from mock import patch
+from requests.packages.urllib3.response import HTTPResponse
+
+from osfclient.models import download
+from osfclient.models.download import ChunkSize
+from osfclient.models.download import Progress
+from osfclient.models.download import read_chunks
+
+
+def test_chunk_size_adapts():
+    sizes = ChunkSize()
+    sizes.observe(download.CHUNK_SIZE, 0.)
+    assert sizes.size == 2 * download.CHUNK_SIZE
+
+    # a short read does not mean the connection is fast
+    sizes.observe(10, 0.)
+    assert sizes.size == 2 * download.CHUNK_SIZE
+
+    sizes.observe(sizes.size, 1.)
+    sizes.observe(sizes.size, 1.)
+    assert sizes.size == download.CHUNK_SIZE // 2
+
+    for _ in range(10):
+        sizes.observe(sizes.size, 1.)
+    assert sizes.size == download.MIN_CHUNK_SIZE
+    for _ in range(10):
+        sizes.observe(sizes.size, 0.)
+    assert sizes.size == download.MAX_CHUNK_SIZE
+
+
+def test_read_chunks_reuses_buffer():
+    content = bytes(bytearray(range(256))) * 1000
+    data = b''
+
+    with patch('osfclient.models.download.bytearray', create=True,
+               side_effect=bytearray) as mock_bytearray:
+        for chunk in read_chunks(io.BytesIO(content),
+                                 limit=len(content) - 5):
+            assert isinstance(chunk, memoryview)
+            data += chunk.tobytes()
+
+    assert data == content[:-5]
+    mock_bytearray.assert_called_once_with(download.MAX_CHUNK_SIZE)
+
+
+def test_read_chunks_without_readinto():
+    fsrc = MagicMock()
+    fsrc.read = io.BytesIO(b'hello world').read
+
+    assert b''.join(read_chunks(fsrc)) == b'hello world'
+
+
+def test_read_chunks_of_compressed_response():
+    # decompressing can return more than asked for, so no `readinto()`
+    content = b'hello world' * 100000
+    body = io.BytesIO()
+    with gzip.GzipFile(fileobj=body, mode='wb') as fp:
+        fp.write(content)
+    compressed = body.getvalue()
+    response = HTTPResponse(body=io.BytesIO(compressed),
+                            preload_content=False,
+                            decode_content=True,
+                            headers={'Content-Encoding': 'gzip'})
+
+    assert not download._can_read_into(response)
+    assert b''.join(bytes(c) for c in read_chunks(response)) == content
+
+    raw = HTTPResponse(body=io.BytesIO(compressed),
+                       preload_content=False,
+                       decode_content=False,
+                       headers={'Content-Encoding': 'gzip'})
+    assert download._can_read_into(raw)
+
+
+def test_progress_is_throttled():
+    update = MagicMock()
+
+    with patch('osfclient.models.download.monotonic') as mock_monotonic:
+        mock_monotonic.return_value = 100.
+        progress = Progress(update)
+        progress(10)
+        progress(20)
+        assert not update.called
+
+        mock_monotonic.return_value = 101.
+        progress(30)
+        update.assert_called_once_with(60)
+
+        progress(40)
+        progress.flush()
+        assert update.call_args_list[-1][0] == (40,)
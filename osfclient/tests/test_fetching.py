@@ -3,7 +3,7 @@
 import pytest
 
 import mock
-from mock import call, patch, mock_open
+from mock import call, patch
 
 from osfclient import OSF
 from osfclient.cli import fetch
@@ -20,19 +20,18 @@ def test_fetch_file(OSF_project, os_path_exists, os_makedirs):
     # check that `osf fetch` opens the right files with the right name and mode
     args = MockArgs(project='1234', remote='osfstorage/a/a/a')
 
-    mock_open_func = mock_open()
-
-    with patch('osfclient.cli.open', mock_open_func):
-        fetch(args)
+    fetch(args)
 
     OSF_project.assert_called_once_with('1234')
     # check that the project and the files have been accessed
     store = OSF_project.return_value.storages[0]
     assert store._name_mock.return_value == 'osfstorage'
+    fetched = OSF_project.return_value._storage_mock.return_value.files[0]
 
     # should create a file in the same directory when no local
     # filename is specified
-    assert mock.call('a', 'wb') in mock_open_func.mock_calls
+    assert call.download('a', segments=1,
+                         checksums=None) in fetched.mock_calls
 
 
 @patch('osfclient.cli.makedirs')
@@ -45,10 +44,7 @@ def test_fetch_file_local_name_specified(OSF_project, os_path_exists,
     args = MockArgs(project='1234', remote='osfstorage/a/a/a',
                     local='foobar.txt')
 
-    mock_open_func = mock_open()
-
-    with patch('osfclient.cli.open', mock_open_func):
-        fetch(args)
+    fetch(args)
 
     OSF_project.assert_called_once_with('1234')
 
@@ -57,14 +53,16 @@ def test_fetch_file_local_name_specified(OSF_project, os_path_exists,
     store = project._storage_mock.return_value
     assert store._name_mock.return_value == 'osfstorage'
 
-    expected = [call._path_mock(), call.write_to(mock_open_func())]
+    expected = [call._path_mock(),
+                call.download('foobar.txt', segments=1, checksums=None)]
     assert expected == store.files[0].mock_calls
     # second file should not have been looked at
     assert not store.files[1].mock_calls
 
     # should create a file in the same directory when no local
     # filename is specified
-    assert mock.call('foobar.txt', 'wb') in mock_open_func.mock_calls
+    assert call.download('foobar.txt', segments=1,
+                         checksums=None) in store.files[0].mock_calls
     assert not os_makedirs.called
 
 
@@ -78,18 +76,16 @@ def test_fetch_file_local_dir_specified(OSF_project, os_path_exists,
     args = MockArgs(project='1234', remote='osfstorage/a/a/a',
                     local='subdir/foobar.txt')
 
-    mock_open_func = mock_open()
-
-    with patch('osfclient.cli.open', mock_open_func):
-        fetch(args)
+    fetch(args)
 
     OSF_project.assert_called_once_with('1234')
     # check that the project and the files have been accessed
     store = OSF_project.return_value.storages[0]
     assert store._name_mock.return_value == 'osfstorage'
+    fetched = OSF_project.return_value._storage_mock.return_value.files[0]
 
-    assert (mock.call('subdir/foobar.txt', 'wb') in
-            mock_open_func.mock_calls)
+    assert call.download('subdir/foobar.txt', segments=1,
+                         checksums=None) in fetched.mock_calls
     assert mock.call('subdir', exist_ok=True) in os_makedirs.mock_calls
 
 
@@ -125,20 +121,19 @@ def test_fetch_local_file_exists_force(OSF_project, os_makedirs):
         else:
             return True
 
-    mock_open_func = mock_open()
-
-    with patch('osfclient.cli.open', mock_open_func):
-        with patch('osfclient.cli.os.path.exists', side_effect=exists):
-            fetch(args)
+    with patch('osfclient.cli.os.path.exists', side_effect=exists):
+        fetch(args)
 
     OSF_project.assert_called_once_with('1234')
     # check that the project and the files have been accessed
     store = OSF_project.return_value.storages[0]
     assert store._name_mock.return_value == 'osfstorage'
+    fetched = OSF_project.return_value._storage_mock.return_value.files[0]
 
     # should create a file in the same directory when no local
     # filename is specified
-    assert mock.call('a', 'wb') in mock_open_func.mock_calls
+    assert call.download('a', segments=1,
+                         checksums=None) in fetched.mock_calls
 
 
 @patch('osfclient.cli.makedirs')
@@ -157,21 +152,20 @@ def test_fetch_local_file_exists_update_files_differ(OSF_project, os_makedirs):
     def simple_checksum(file_path):
         return '1' * 32
 
-    mock_open_func = mock_open()
-
-    with patch('osfclient.cli.open', mock_open_func):
-        with patch('osfclient.cli.os.path.exists', side_effect=exists):
-            with patch('osfclient.cli.checksum', side_effect=simple_checksum):
-                fetch(args)
+    with patch('osfclient.cli.os.path.exists', side_effect=exists):
+        with patch('osfclient.cli.checksum', side_effect=simple_checksum):
+            fetch(args)
 
     OSF_project.assert_called_once_with('1234')
     # check that the project and the files have been accessed
     store = OSF_project.return_value.storages[0]
     assert store._name_mock.return_value == 'osfstorage'
+    fetched = OSF_project.return_value._storage_mock.return_value.files[0]
 
     # should create a file in the same directory when no local
     # filename is specified
-    assert mock.call('a', 'wb') in mock_open_func.mock_calls
+    assert call.download('a', segments=1,
+                         checksums=None) in fetched.mock_calls
 
 
 @patch('osfclient.cli.makedirs')
@@ -190,21 +184,19 @@ def test_fetch_local_file_exists_update_files_match(OSF_project, os_makedirs):
     def simple_checksum(file_path):
         return '0' * 32
 
-    mock_open_func = mock_open()
-
-    with patch('osfclient.cli.open', mock_open_func):
-        with patch('osfclient.cli.os.path.exists', side_effect=exists):
-            with patch('osfclient.cli.checksum', side_effect=simple_checksum):
-                fetch(args)
+    with patch('osfclient.cli.os.path.exists', side_effect=exists):
+        with patch('osfclient.cli.checksum', side_effect=simple_checksum):
+            fetch(args)
 
     OSF_project.assert_called_once_with('1234')
     # check that the project and the files have been accessed
     store = OSF_project.return_value.storages[0]
     assert store._name_mock.return_value == 'osfstorage'
+    fetched = OSF_project.return_value._storage_mock.return_value.files[0]
 
     # should create a file in the same directory when no local
     # filename is specified
-    assert mock.call('a', 'wb') not in mock_open_func.mock_calls
+    assert not fetched.download.called
 
 
 @patch('osfclient.cli.makedirs')
@@ -224,20 +216,19 @@ def test_fetch_local_file_exists_force_overrides_update(OSF_project, os_makedirs
     def simple_checksum(file_path):
         return '0' * 32
 
-    mock_open_func = mock_open()
-
-    with patch('osfclient.cli.open', mock_open_func):
-        with patch('osfclient.cli.os.path.exists', side_effect=exists):
-            with patch('osfclient.cli.checksum', side_effect=simple_checksum):
-                fetch(args)
+    with patch('osfclient.cli.os.path.exists', side_effect=exists):
+        with patch('osfclient.cli.checksum', side_effect=simple_checksum):
+            fetch(args)
 
     OSF_project.assert_called_once_with('1234')
     # check that the project and the files have been accessed
     store = OSF_project.return_value.storages[0]
     assert store._name_mock.return_value == 'osfstorage'
+    fetched = OSF_project.return_value._storage_mock.return_value.files[0]
 
     # should create a file in the same directory when no local
     # filename is specified.
     # file should be created even though local matches remote and update is
     # True, because force overrides update
-    assert mock.call('a', 'wb') in mock_open_func.mock_calls
+    assert call.download('a', segments=1,
+                         checksums=None) in fetched.mock_calls
@@ -2,18 +2,22 @@ import io
 from mock import call
 from mock import patch
 from mock import MagicMock
-from mock import PropertyMock
 
 import pytest
 
 from osfclient.models import OSFCore
 from osfclient.models import File
 from osfclient.models import Folder
+from osfclient.models import Storage
 from osfclient.exceptions import FolderExistsException
+from osfclient.exceptions import HashMismatchException
 from osfclient.models.file import _WaterButlerFolder
 
+from requests.exceptions import ConnectionError
+from requests.packages.urllib3.exceptions import ProtocolError
+
 from osfclient.tests import fake_responses
-from osfclient.tests.mocks import FakeResponse, MockFolder
+from osfclient.tests.mocks import FakeResponse
 
 _files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage/foo123'
 
@@ -36,7 +40,8 @@ def test_iterate_files(OSFCore_get):
         assert file_.session == store.session
 
     OSFCore_get.assert_called_once_with(
-        'https://api.osf.io/v2//nodes/f3szh/files/osfstorage/foo123')
+        'https://api.osf.io/v2//nodes/f3szh/files/osfstorage/foo123',
+        params={'page[size]': 100})
 
 
 @patch.object(OSFCore, '_get')
@@ -58,7 +63,8 @@ def test_iterate_folders(OSFCore_get):
         assert folder.name in ('foo/bar', 'foo/baz')
 
     OSFCore_get.assert_called_once_with(
-        'https://api.osf.io/v2//nodes/f3szh/files/osfstorage/foo123')
+        'https://api.osf.io/v2//nodes/f3szh/files/osfstorage/foo123',
+        params={'page[size]': 100})
 
 
 def test_iterate_files_and_folders():
@@ -71,7 +77,7 @@ def test_iterate_files_and_folders():
                                      folder_names=['bar'])
     top_level_response = FakeResponse(200, json)
 
-    def simple_OSFCore_get(url):
+    def simple_OSFCore_get(url, params=None):
         if url == store._files_url:
             return top_level_response
         else:
@@ -89,7 +95,7 @@ def test_iterate_files_and_folders():
         assert file_.name in ('hello.txt', 'bye.txt')
 
     # check we did not try to recurse into subfolders
-    expected = [((_files_url,),)]
+    expected = [call(_files_url, params={'page[size]': 100})]
     assert mock_osf_get.call_args_list == expected
 
 
@@ -98,13 +104,13 @@ def test_create_existing_folder():
     new_folder_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
                       'osfstorage/foo123/?kind=folder')
     folder._new_folder_url = new_folder_url
-    folder._put = MagicMock(return_value=FakeResponse(409, None))
-
-    with pytest.raises(FolderExistsException):
-        folder.create_folder('foobar')
+    with patch.object(Folder, '_put',
+                      return_value=FakeResponse(409, None)) as mock_put:
+        with pytest.raises(FolderExistsException):
+            folder.create_folder('foobar')
 
-    folder._put.assert_called_once_with(new_folder_url,
-                                        params={'name': 'foobar'})
+    mock_put.assert_called_once_with(new_folder_url,
+                                     params={'name': 'foobar'}, retry=False)
 
 
 def test_create_existing_folder_exist_ok():
@@ -112,17 +118,26 @@ def test_create_existing_folder_exist_ok():
     new_folder_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
                       'osfstorage/foo123/?kind=folder')
     folder._new_folder_url = new_folder_url
-    folder._put = MagicMock(return_value=FakeResponse(409, None))
-
-    with patch.object(Folder, 'folders',
-                      new_callable=PropertyMock) as mock_folder:
-        mock_folder.return_value = [MockFolder('foobar'), MockFolder('fudge')]
+    folder._files_url = ('https://api.osf.io/v2//nodes/f3szh/files/'
+                         'osfstorage/foo123/')
+
+    # the OSF also returns folders whose name contains the one we asked for
+    listing = fake_responses.files_node('f3szh', 'osfstorage', [],
+                                        folder_names=['foobar2', 'foobar'])
+    with patch.object(Folder, '_put',
+                      return_value=FakeResponse(409, None)) as mock_put, \
+            patch.object(OSFCore, '_get',
+                         return_value=FakeResponse(200, listing)) as mock_get:
         existing_folder = folder.create_folder('foobar', exist_ok=True)
 
+    assert isinstance(existing_folder, Folder)
     assert existing_folder.name == 'foobar'
 
-    folder._put.assert_called_once_with(new_folder_url,
-                                        params={'name': 'foobar'})
+    mock_put.assert_called_once_with(new_folder_url,
+                                     params={'name': 'foobar'}, retry=False)
+    mock_get.assert_called_once_with(folder._files_url, params={
+        'page[size]': 100, 'filter[name]': 'foobar',
+        'filter[kind]': 'folder'})
 
 
 def test_create_new_folder():
@@ -131,24 +146,38 @@ def test_create_new_folder():
                       'osfstorage/foo123/?kind=folder')
     folder._new_folder_url = new_folder_url
     # use an empty response as we won't do anything with the returned instance
-    folder._put = MagicMock(return_value=FakeResponse(201, {'data': {}}))
-
-    new_folder = folder.create_folder('foobar')
+    with patch.object(Folder, '_put',
+                      return_value=FakeResponse(201, {'data': {}})) as mock_put:
+        new_folder = folder.create_folder('foobar')
 
     assert isinstance(new_folder, _WaterButlerFolder)
 
-    folder._put.assert_called_once_with(new_folder_url,
-                                        params={'name': 'foobar'})
+    mock_put.assert_called_once_with(new_folder_url,
+                                     params={'name': 'foobar'}, retry=False)
+
+
+@patch('osfclient.models.session.requests.Session.put')
+def test_create_folder_is_not_retried(mock_put):
+    mock_put.side_effect = ConnectionError()
+    folder = Folder({})
+    folder._new_folder_url = ('https://files.osf.io/v1/resources/9zpcy/'
+                              'providers/osfstorage/foo123/?kind=folder')
+    folder.session.retry_policy.backoff_factor = 0.
+
+    with pytest.raises(ConnectionError):
+        folder.create_folder('foobar')
+
+    assert mock_put.call_count == 1
 
 
 def test_remove_file():
     f = File({})
     f._delete_url = 'http://delete.me/uri'
-    f._delete = MagicMock(return_value=FakeResponse(204, {'data': {}}))
-
-    f.remove()
+    with patch.object(File, '_delete',
+                      return_value=FakeResponse(204, {'data': {}})) as delete:
+        f.remove()
 
-    assert f._delete.called
+    assert delete.called
 
 
 def test_file_uses_streaming_request():
@@ -182,11 +211,368 @@ def test_remove_file_failed():
     f = File({})
     f.path = 'some/path'
     f._delete_url = 'http://delete.me/uri'
-    f._delete = MagicMock(return_value=FakeResponse(404, {'data': {}}))
-
-    with pytest.raises(RuntimeError) as e:
-        f.remove()
+    with patch.object(File, '_delete',
+                      return_value=FakeResponse(404, {'data': {}})) as delete:
+        with pytest.raises(RuntimeError) as e:
+            f.remove()
 
-    assert f._delete.called
+    assert delete.called
 
     assert 'Could not delete' in e.value.args[0]
+
+
+def test_file_download_restarts_after_dropped_connection():
+    # a server that ignores Range requests sends the whole file again
+    fp = io.BytesIO(b"")
+    fp.mode = "b"
+    file_content = b"hello world"
+    attempts = []
+
+    def fake_get(url, stream, headers=None):
+        attempts.append(url)
+        raw = MagicMock()
+        src = io.BytesIO(file_content)
+        if len(attempts) == 1:
+            # connection drops after the first few bytes
+            raw.read = MagicMock(side_effect=[src.read(5), ProtocolError()])
+        else:
+            raw.read = src.read
+
+        res = FakeResponse(200, {})
+        res.raw = raw
+        res.headers = {'Content-Length': str(len(file_content))}
+        return res
+
+    with patch.object(File, "_get", side_effect=fake_get):
+        f = File({})
+        f.session.retry_policy.backoff_factor = 0.
+        f._download_url = "http://example.com/download_url/"
+        f.write_to(fp)
+
+    assert fp.getvalue() == file_content
+    assert len(attempts) == 2
+    assert f.session.retries == 1
+
+
+def test_models_have_no_dict():
+    for model in (File({}), Folder({}), Storage({})):
+        assert not hasattr(model, '__dict__')
+
+
+def test_file_links_and_hashes():
+    entry = fake_responses.files_node('f3szh', 'osfstorage',
+                                      ['hello.txt'])['data'][0]
+    entry['links']['html'] = 'https://example.com/not/a/template'
+    entry['attributes']['extra']['hashes'] = {'md5': 'abc', 'sha256': None}
+    f = File(entry)
+    other = File(fake_responses.files_node('f3szh', 'osfstorage',
+                                           ['bye.txt'])['data'][0])
+
+    assert f._upload_url == ('https://files.osf.io/v1/resources/f3szh/'
+                             'providers/osfstorage/hello.txt')
+    assert f._download_url == f._upload_url
+    assert f._delete_url == f._upload_url
+    assert f._endpoint == ('https://api.osf.io/v2/files/'
+                           '58becc229ad5a101f98293a3/')
+    assert f._html_url == 'https://example.com/not/a/template'
+    assert other._upload_url.endswith('/osfstorage/bye.txt')
+    # files of the same storage share the template of their links
+    assert f._upload_link is other._upload_link
+    assert f.hashes == {'md5': 'abc', 'sha256': None}
+
+    f._download_url = 'https://example.com/download'
+    assert f._download_url == 'https://example.com/download'
+    assert f._upload_url.endswith('/osfstorage/hello.txt')
+
+
+def _range_server(content, ranges=True, drop=None):
+    # fake `File._get` that answers Range requests for `content`, the
+    # connection serving the segment starting at `drop` breaks once
+    requests = []
+
+    def fake_get(url, stream, headers=None):
+        requests.append(headers)
+        begin, end = 0, len(content) - 1
+        status = 200
+        if ranges and headers and 'Range' in headers:
+            first, last = headers['Range'][len('bytes='):].split('-')
+            begin = int(first)
+            if last:
+                end = int(last)
+            status = 206
+            if begin >= len(content):
+                res = FakeResponse(416, {})
+                res.headers = {'Content-Range': 'bytes */{}'.format(
+                    len(content))}
+                return res
+
+        src = io.BytesIO(content[begin:end + 1])
+        raw = MagicMock()
+        if begin == drop and requests.count(headers) == 1:
+            raw.read = MagicMock(side_effect=[src.read(3), ProtocolError()])
+        else:
+            raw.read = src.read
+
+        res = FakeResponse(status, {})
+        res.raw = raw
+        res.headers = {'Content-Length': str(end + 1 - begin)}
+        if status == 206:
+            res.headers['Content-Range'] = 'bytes {}-{}/{}'.format(
+                begin, end, len(content))
+        return res
+
+    return fake_get, requests
+
+
+@pytest.mark.parametrize('drop', [None, 0, 26])
+def test_segmented_download(drop, tmpdir):
+    content = bytes(bytearray(range(50)))
+    fake_get, requests = _range_server(content, drop=drop)
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get), \
+            patch('osfclient.models.download.MIN_SEGMENT_SIZE', 10):
+        f = File({})
+        f.session.retry_policy.backoff_factor = 0.
+        f._download_url = 'http://example.com/download_url/'
+        with open(path, 'wb') as fp:
+            fp.write(b'head')
+            f.write_to(fp, segments=4)
+            assert fp.tell() == 4 + len(content)
+
+    with open(path, 'rb') as fp:
+        assert fp.read() == b'head' + content
+    ranges = sorted(h['Range'] for h in requests)
+    expected = ['bytes=0-', 'bytes=13-25', 'bytes=26-38', 'bytes=39-49']
+    if drop is not None:
+        # the segment is continued after the three bytes that arrived
+        expected.append('bytes={}-{}'.format(drop + 3, drop + 12))
+    assert ranges == sorted(expected)
+
+
+def test_segmented_download_without_range_support(tmpdir):
+    content = b'hello world' * 5
+    fake_get, requests = _range_server(content, ranges=False)
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get), \
+            patch('osfclient.models.download.MIN_SEGMENT_SIZE', 10):
+        f = File({})
+        f._download_url = 'http://example.com/download_url/'
+        with open(path, 'wb') as fp:
+            f.write_to(fp, segments=4)
+
+    with open(path, 'rb') as fp:
+        assert fp.read() == content
+    # the answer to the first request is used for a normal download
+    assert len(requests) == 1
+
+
+def test_segmented_download_needs_real_file():
+    fp = io.BytesIO(b"")
+    fp.mode = "b"
+    fake_get, requests = _range_server(b'hello world')
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        f = File({})
+        f._download_url = 'http://example.com/download_url/'
+        f.write_to(fp, segments=4)
+
+    assert fp.getvalue() == b'hello world'
+    assert requests == [None]
+
+
+def _downloading_file(hashes=None):
+    f = File({})
+    f.session.retry_policy.backoff_factor = 0.
+    f._download_url = 'http://example.com/download_url/'
+    f.path = '/out'
+    f.hashes = hashes
+    return f
+
+
+def test_file_download_continues_after_dropped_connection():
+    fp = io.BytesIO(b"")
+    fp.mode = "b"
+    content = b'hello world'
+    fake_get, requests = _range_server(content, drop=0)
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        _downloading_file().write_to(fp)
+
+    assert fp.getvalue() == content
+    # only the bytes that did not arrive are asked for again
+    assert requests == [None, {'Range': 'bytes=3-',
+                               'Accept-Encoding': 'identity'}]
+
+
+def test_segmented_download_keeps_complete_part(tmpdir):
+    # a failed segmented download is cut back to the bytes without gaps
+    content = bytes(bytearray(range(50)))
+    fake_get, requests = _range_server(content, drop=13)
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get), \
+            patch('osfclient.models.download.MIN_SEGMENT_SIZE', 10):
+        f = _downloading_file()
+        f.session.retry_policy.total = 0
+        with open(path, 'wb') as fp:
+            with pytest.raises(ProtocolError):
+                f.write_to(fp, segments=4)
+
+    with open(path, 'rb') as fp:
+        assert fp.read() == content[:16]
+
+
+def test_file_download_to_path(tmpdir):
+    content = b'hello world'
+    fake_get, requests = _range_server(content)
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        _downloading_file(
+            {'md5': '5eb63bbbe01eeed093cb22bb8f5acdc3'}).download(path)
+
+    assert tmpdir.join('out').read_binary() == content
+    assert not tmpdir.join('out.part').exists()
+    assert requests == [None]
+
+
+@pytest.mark.parametrize('ranges', [True, False])
+def test_file_download_continues_partial_file(ranges, tmpdir):
+    content = b'hello world'
+    fake_get, requests = _range_server(content, ranges=ranges)
+    tmpdir.join('out.part').write_binary(b'hello')
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        _downloading_file({'md5': None, 'sha256': (
+            'b94d27b9934d3e08a52e52d7da7dabfac484efe37a5380ee9088f7ace2efcde9'
+            )}).download(path)
+
+    assert tmpdir.join('out').read_binary() == content
+    assert not tmpdir.join('out.part').exists()
+    assert requests == [{'Range': 'bytes=5-', 'Accept-Encoding': 'identity'}]
+
+
+def test_file_download_of_complete_partial_file(tmpdir):
+    content = b'hello world'
+    fake_get, requests = _range_server(content)
+    tmpdir.join('out.part').write_binary(content)
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        _downloading_file().download(path)
+
+    assert tmpdir.join('out').read_binary() == content
+
+
+def test_file_download_restarts_too_long_partial_file(tmpdir):
+    # the remote file was replaced by a shorter one
+    content = b'hello world'
+    fake_get, requests = _range_server(content)
+    tmpdir.join('out.part').write_binary(b'hello world and more')
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        _downloading_file().download(path)
+
+    assert tmpdir.join('out').read_binary() == content
+    assert requests == [{'Range': 'bytes=20-', 'Accept-Encoding': 'identity'},
+                        None]
+
+
+def test_segmented_download_of_empty_file(tmpdir):
+    fake_get, requests = _range_server(b'')
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        with open(path, 'wb') as fp:
+            _downloading_file().write_to(fp, segments=4)
+
+    assert tmpdir.join('out').read_binary() == b''
+
+
+def test_file_download_restarts_mismatching_partial_file(tmpdir):
+    # the partial file is left over from an older version of the file
+    content = b'hello world'
+    fake_get, requests = _range_server(content)
+    tmpdir.join('out.part').write_binary(b'HELLO')
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        _downloading_file(
+            {'md5': '5eb63bbbe01eeed093cb22bb8f5acdc3'}).download(path)
+
+    assert tmpdir.join('out').read_binary() == content
+    assert requests == [{'Range': 'bytes=5-', 'Accept-Encoding': 'identity'},
+                        None]
+
+
+def test_file_download_hash_mismatch(tmpdir):
+    fake_get, requests = _range_server(b'hello world')
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        with pytest.raises(HashMismatchException) as e:
+            _downloading_file({'md5': '0' * 32}).download(path)
+
+    assert 'does not match' in str(e.value)
+    assert not tmpdir.join('out').exists()
+    assert not tmpdir.join('out.part').exists()
+
+
+def test_write_to_checks_hash_while_writing():
+    fake_get, requests = _range_server(b'hello world')
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        fp = io.BytesIO(b"")
+        fp.mode = "b"
+        _downloading_file(
+            {'md5': '5eb63bbbe01eeed093cb22bb8f5acdc3'}).write_to(fp)
+
+        fp = io.BytesIO(b"")
+        fp.mode = "b"
+        with pytest.raises(HashMismatchException):
+            _downloading_file({'md5': None, 'sha256': '0' * 64}
+                              ).write_to(fp)
+
+
+@pytest.mark.parametrize('mode, split', [('w+b', True), ('wb', False)])
+def test_segmented_download_checks_hash(mode, split, tmpdir):
+    # segments are read back to hash them, a file that can not be read is
+    # downloaded in one piece instead
+    content = bytes(bytearray(range(50)))
+    fake_get, requests = _range_server(content)
+    path = str(tmpdir.join('out'))
+
+    with patch.object(File, '_get', side_effect=fake_get), \
+            patch('osfclient.models.download.MIN_SEGMENT_SIZE', 10):
+        with open(path, mode) as fp:
+            f = _downloading_file({'md5': '0' * 32})
+            with pytest.raises(HashMismatchException):
+                f.write_to(fp, segments=4)
+
+    assert (len(requests) > 1) == split
+
+
+def test_continued_download_needs_readable_file(tmpdir):
+    path = str(tmpdir.join('out'))
+    tmpdir.join('out').write_binary(b'hello')
+
+    with open(path, 'ab') as fp:
+        with pytest.raises(ValueError):
+            _downloading_file({'md5': '0' * 32}).write_to(fp, offset=5)
+
+
+def test_file_download_records_checksums(tmpdir):
+    fake_get, requests = _range_server(b'hello world')
+    path = str(tmpdir.join('out'))
+    checksums = MagicMock()
+    hashes = {'md5': '5eb63bbbe01eeed093cb22bb8f5acdc3'}
+
+    with patch.object(File, '_get', side_effect=fake_get):
+        _downloading_file(hashes).download(path,
+                                                     checksums=checksums)
+
+    checksums.record.assert_called_once_with(path, hashes)
@@ -0,0 +1,104 @@
+from osfclient.models import StorageIndex
+from osfclient.tests import fake_responses
+
+
+def _entries(names, folders=None):
+    return fake_responses.files_node('f3szh', 'osfstorage', names,
+                                     folder_names=folders)['data']
+
+
+def _index(index, storage, entries):
+    writer = index.writer(storage)
+    for entry in entries:
+        writer.add(entry)
+    writer.commit()
+
+
+def test_lookup(tmpdir):
+    index = StorageIndex(str(tmpdir))
+    assert index.indexed('f3szh:osfstorage') is None
+    assert index.get('f3szh:osfstorage', 'hello.txt') is None
+
+    _index(index, 'f3szh:osfstorage', _entries(['hello.txt', 'bye.txt'],
+                                               ['foo']))
+
+    assert index.indexed('f3szh:osfstorage') is not None
+    entry = index.get('f3szh:osfstorage', '/hello.txt')
+    assert entry['attributes']['name'] == 'hello.txt'
+    assert index.get('f3szh:osfstorage', 'foo')['attributes']['kind'] == \
+        'folder'
+    assert index.get('f3szh:github', 'hello.txt') is None
+    # folders are not files
+    names = [e['attributes']['name'] for e in index.files('f3szh:osfstorage')]
+    assert names == ['bye.txt', 'hello.txt']
+
+
+def test_files_in_batches(tmpdir):
+    index = StorageIndex(str(tmpdir))
+    index.batch_size = 3
+    names = ['file%02d' % n for n in range(10)]
+    _index(index, 'f3szh:osfstorage', _entries(names))
+
+    found = [e['attributes']['name'] for e in index.files('f3szh:osfstorage')]
+    assert found == names
+
+
+def test_new_generation_replaces_old_one(tmpdir):
+    index = StorageIndex(str(tmpdir))
+    _index(index, 'f3szh:osfstorage', _entries(['hello.txt', 'bye.txt']))
+
+    writer = index.writer('f3szh:osfstorage')
+    writer.add(_entries(['new.txt'])[0])
+    # until the new generation is complete the old one is used
+    assert index.get('f3szh:osfstorage', 'new.txt') is None
+    assert index.get('f3szh:osfstorage', 'bye.txt') is not None
+    writer.commit()
+
+    assert index.get('f3szh:osfstorage', 'new.txt') is not None
+    assert index.get('f3szh:osfstorage', 'bye.txt') is None
+
+
+def test_abort_keeps_old_generation(tmpdir):
+    index = StorageIndex(str(tmpdir))
+    _index(index, 'f3szh:osfstorage', _entries(['hello.txt']))
+
+    writer = index.writer('f3szh:osfstorage')
+    writer.add(_entries(['new.txt'])[0])
+    writer.abort()
+    index.close()
+
+    index = StorageIndex(str(tmpdir))
+    assert index.get('f3szh:osfstorage', 'hello.txt') is not None
+    assert index.get('f3szh:osfstorage', 'new.txt') is None
+
+
+def test_remove(tmpdir):
+    index = StorageIndex(str(tmpdir))
+    _index(index, 'f3szh:osfstorage', _entries(['hello.txt', 'bye.txt']))
+
+    index.remove('f3szh:osfstorage', '/hello.txt')
+
+    assert index.get('f3szh:osfstorage', 'hello.txt') is None
+    assert len(list(index.files('f3szh:osfstorage'))) == 1
+
+
+def test_children_and_keep(tmpdir):
+    index = StorageIndex(str(tmpdir))
+    entries = _entries(['a.txt', 'b.txt', 'c.txt'])
+    for entry, path in zip(entries, ['/a.txt', '/x/b.txt', '/x/y/c.txt']):
+        entry['attributes']['materialized_path'] = path
+    _index(index, 'f3szh:osfstorage', entries)
+
+    assert sorted(index.children('f3szh:osfstorage')) == ['a.txt']
+    assert sorted(index.children('f3szh:osfstorage', 'x')) == ['x/b.txt']
+    assert [e['attributes']['name']
+            for e in index.files('f3szh:osfstorage', 'x')] == ['b.txt',
+                                                             'c.txt']
+
+    # only keep what is in x
+    writer = index.writer('f3szh:osfstorage')
+    writer.keep('x')
+    writer.commit()
+
+    assert index.get('f3szh:osfstorage', 'a.txt') is None
+    assert index.get('f3szh:osfstorage', 'x/y/c.txt') is not None
@@ -1,3 +1,5 @@
+import os
+
 from mock import patch
 import pytest
 
@@ -86,3 +88,83 @@ def test_pass_down_session_to_storages(OSFCore_get):
 
     for store in project.storages:
         assert store.session == project.session
+
+
+@patch.object(OSFCore, '_get')
+def test_storages_fetched_once(OSFCore_get):
+    project = Project({})
+    project._storages_url = 'https://api.osf.io/v2//nodes/f3szh/files/'
+
+    store_json = fake_responses.storage_node('f3szh',
+                                             ['osfstorage', 'github'])
+    OSFCore_get.return_value = FakeResponse(200, store_json)
+
+    osfstorage = project.storage('osfstorage')
+    github = project.storage('github')
+    stores = list(project.storages)
+
+    OSFCore_get.assert_called_once_with(
+        'https://api.osf.io/v2//nodes/f3szh/files/')
+    assert stores == [osfstorage, github]
+    assert project.storage('osfstorage') is osfstorage
+    with pytest.raises(RuntimeError):
+        project.storage('does-not-exist')
+    assert OSFCore_get.call_count == 1
+
+
+@patch.object(OSFCore, '_get')
+def test_refresh_storages(OSFCore_get):
+    project = Project({})
+    project._storages_url = 'https://api.osf.io/v2//nodes/f3szh/files/'
+
+    OSFCore_get.return_value = FakeResponse(
+        200, fake_responses.storage_node('f3szh'))
+    project.storage()
+    with pytest.raises(RuntimeError):
+        project.storage('github')
+
+    OSFCore_get.return_value = FakeResponse(
+        200, fake_responses.storage_node('f3szh', ['osfstorage', 'github']))
+    project.refresh()
+    assert project.storage('github').provider == 'github'
+    assert OSFCore_get.call_count == 2
+
+
+@patch('osfclient.models.project.monotonic')
+@patch.object(OSFCore, '_get')
+def test_storages_expire(OSFCore_get, mock_monotonic):
+    project = Project({})
+    project._storages_url = 'https://api.osf.io/v2//nodes/f3szh/files/'
+    project.storages_ttl = 60
+
+    OSFCore_get.return_value = FakeResponse(
+        200, fake_responses.storage_node('f3szh'))
+    mock_monotonic.return_value = 100.
+    project.storage()
+    mock_monotonic.return_value = 160.
+    project.storage()
+    assert OSFCore_get.call_count == 1
+
+    mock_monotonic.return_value = 161.
+    project.storage()
+    assert OSFCore_get.call_count == 2
+
+
+@patch.object(OSFCore, '_get')
+def test_clone(OSFCore_get):
+    project = Project({})
+    project._storages_url = 'https://api.osf.io/v2//nodes/f3szh/files/'
+    store_json = fake_responses.storage_node('f3szh',
+                                             ['osfstorage', 'github'])
+    OSFCore_get.return_value = FakeResponse(200, store_json)
+
+    with patch('osfclient.models.project.clone_storages',
+               return_value=[]) as clone_storages:
+        assert project.clone('out', jobs=4, update=True) == []
+
+    osfstorage = project.storage('osfstorage')
+    github = project.storage('github')
+    clone_storages.assert_called_once_with(
+        [(osfstorage, os.path.join('out', osfstorage.name)),
+         (github, os.path.join('out', github.name))],
+        jobs=4, update=True, callback=None, checksums=None)
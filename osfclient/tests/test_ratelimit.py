@@ -0,0 +1,172 @@
+from mock import patch
+
+import pytest
+
+from osfclient.models.ratelimit import TokenBucket
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_first_requests_use_burst(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=2, burst=3)
+
+    delays = [bucket.reserve() for _ in range(4)]
+
+    assert delays == [0., 0., 0., 0.5]
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_tokens_refill_over_time(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.reserve()
+    bucket.reserve()
+
+    mock_monotonic.return_value = 101.
+    assert bucket.reserve() == 0.
+    # refilling never goes above the burst size
+    mock_monotonic.return_value = 200.
+    assert [bucket.reserve() for _ in range(3)] == [0., 0., 1.]
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_waiting_callers_queue_up(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=1, burst=1)
+
+    assert [bucket.reserve() for _ in range(3)] == [0., 1., 2.]
+
+
+@patch('osfclient.models.ratelimit.time')
+@patch('osfclient.models.ratelimit.monotonic')
+def test_acquire_sleeps(mock_monotonic, mock_time):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=4, burst=1)
+
+    assert bucket.acquire() == 0.
+    assert not mock_time.sleep.called
+
+    assert bucket.acquire() == 0.25
+    mock_time.sleep.assert_called_once_with(0.25)
+
+
+@patch('osfclient.models.ratelimit.time')
+@patch('osfclient.models.ratelimit.monotonic')
+def test_no_rate_limit(mock_monotonic, mock_time):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=None)
+
+    for _ in range(10):
+        assert bucket.acquire() == 0.
+    assert not mock_time.sleep.called
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 1), (-1, 1), (1, 0)])
+def test_invalid_configuration(rate, burst):
+    with pytest.raises(ValueError):
+        TokenBucket(rate, burst)
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_backoff_halves_rate_and_recovers(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=10, burst=1, increase=0.1)
+
+    bucket.backoff()
+    assert bucket.rate == 5
+    mock_monotonic.return_value = 101.
+    bucket.backoff()
+    assert bucket.rate == 2.5
+
+    for _ in range(7):
+        bucket.recover()
+    assert bucket.rate == 9.5
+    # never goes above the configured rate
+    bucket.recover()
+    assert bucket.rate == 10
+    bucket.recover()
+    assert bucket.rate == 10
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_backoff_never_goes_below_min_rate(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=1, min_rate=0.4)
+
+    bucket.backoff()
+    mock_monotonic.return_value = 110.
+    bucket.backoff()
+    assert bucket.rate == 0.4
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_backoff_keeps_rate_below_min_rate(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=0.05, min_rate=0.1)
+
+    bucket.backoff()
+    assert bucket.rate == 0.05
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_backoff_once_per_interval(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=8, burst=1)
+
+    # many requests in flight are throttled at the same time
+    for _ in range(10):
+        bucket.backoff()
+    assert bucket.rate == 4
+
+    # one request later at the reduced rate we slow down further
+    mock_monotonic.return_value = 100.25
+    bucket.backoff()
+    assert bucket.rate == 2
+
+    # but not before the server told us to wait
+    mock_monotonic.return_value = 101.
+    bucket.backoff(delay=10)
+    assert bucket.rate == 1
+    mock_monotonic.return_value = 105.
+    bucket.backoff()
+    assert bucket.rate == 1
+    assert bucket.reserve() == 6.
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_backoff_waits_for_delay(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=10, burst=5)
+
+    bucket.backoff(delay=30)
+
+    assert bucket.reserve() == 30.
+    mock_monotonic.return_value = 110.
+    assert bucket.reserve() == 20.
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_backoff_without_rate_limit(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=None, increase=0.5)
+    # make requests at 20 per second
+    for _ in range(50):
+        mock_monotonic.return_value += 0.05
+        bucket.reserve()
+
+    bucket.backoff()
+    assert bucket.rate == pytest.approx(10)
+
+    bucket.recover()
+    assert bucket.rate is None
+
+
+@patch('osfclient.models.ratelimit.monotonic')
+def test_pause_without_rate_limit(mock_monotonic):
+    mock_monotonic.return_value = 100.
+    bucket = TokenBucket(rate=None)
+
+    bucket.pause(3)
+
+    assert bucket.reserve() == 3.
+    assert bucket.rate is None
@@ -0,0 +1,43 @@
+from mock import patch
+
+import pytest
+
+from osfclient.models.retry import RetryPolicy
+
+
+@pytest.mark.parametrize("method", ['GET', 'get', 'HEAD', 'DELETE', 'PUT'])
+def test_retry_idempotent_methods(method):
+    policy = RetryPolicy(total=2)
+
+    assert policy.can_retry(method, 0)
+    assert policy.can_retry(method, 1)
+    assert not policy.can_retry(method, 2)
+
+
+@pytest.mark.parametrize("method", ['POST', 'PATCH'])
+def test_dont_retry_other_methods(method):
+    assert not RetryPolicy().can_retry(method, 0)
+
+
+@patch('osfclient.models.retry.random.uniform', side_effect=lambda a, b: b)
+def test_exponential_backoff(mock_uniform):
+    policy = RetryPolicy(backoff_factor=0.5, max_backoff=3)
+
+    assert [policy.backoff(n) for n in range(5)] == [0.5, 1, 2, 3, 3]
+
+
+def test_backoff_has_jitter():
+    policy = RetryPolicy(backoff_factor=1)
+
+    delays = set(policy.backoff(4) for _ in range(20))
+
+    assert len(delays) > 1
+    assert all(0 <= delay <= 16 for delay in delays)
+
+
+@patch('osfclient.models.retry.time.sleep')
+def test_sleep(mock_sleep):
+    policy = RetryPolicy(backoff_factor=0.)
+
+    assert policy.sleep(3) == 0.
+    mock_sleep.assert_called_once_with(0.)
@@ -1,10 +1,24 @@
+from email.utils import formatdate
+import io
+import math
+import threading
+import time
+
 from mock import patch
 from mock import MagicMock
 
 import pytest
 
+from requests.exceptions import ConnectionError
+
 from osfclient.models import OSFSession
+from osfclient.models import ResponseCache
+from osfclient.models.session import API_URL, FILES_URL
+from osfclient.models import session as session_module
+from osfclient.models.session import loads
+from osfclient.models.session import _cache_key, _retry_after
 from osfclient.exceptions import UnauthorizedException
+from osfclient.tests.mocks import FakeResponse
 
 
 def test_basic_auth():
@@ -93,3 +107,515 @@ def test_get(mock_get):
 
     assert response == mock_response
     mock_get.assert_called_once_with(url)
+
+
+def test_default_rate_limit():
+    session = OSFSession()
+    assert session.rate_limiter.rate == 1
+    assert session.rate_limiter.burst == 1
+
+
+def test_set_rate_limit():
+    session = OSFSession(rate_limit=5, burst=10)
+    assert session.rate_limiter.rate == 5
+    assert session.rate_limiter.burst == 10
+
+    session.set_rate_limit(None)
+    assert session.rate_limiter.rate is None
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_get_is_rate_limited(mock_get):
+    mock_get.return_value = MagicMock(status_code=200)
+    session = OSFSession()
+
+    with patch.object(session.rate_limiter, 'acquire') as mock_acquire:
+        session.get('http://example.com/foo')
+        session.get('http://example.com/foo')
+
+    assert mock_acquire.call_count == 2
+
+
+def _response(status_code, headers=None):
+    response = MagicMock(status_code=status_code)
+    response.headers = headers or {}
+    return response
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_retry_throttled_get(mock_get):
+    mock_get.side_effect = [_response(429, {'Retry-After': '2'}),
+                            _response(200)]
+    session = OSFSession(rate_limit=10)
+
+    with patch.object(session.rate_limiter, 'acquire'):
+        with patch.object(session.rate_limiter, 'backoff') as mock_backoff:
+            response = session.get('http://example.com/foo')
+
+    assert response.status_code == 200
+    assert mock_get.call_count == 2
+    mock_backoff.assert_called_once_with(2.)
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_give_up_when_throttled_too_often(mock_get):
+    mock_get.return_value = _response(503)
+    session = OSFSession(throttle_retries=2)
+
+    with patch.object(session.rate_limiter, 'acquire'):
+        response = session.get('http://example.com/foo')
+
+    assert response.status_code == 503
+    assert mock_get.call_count == 3
+    # responses throttled in quick succession only halve the rate once
+    assert session.rate_limiter.rate == 0.5
+
+
+@patch('osfclient.models.session.requests.Session.put')
+def test_retry_throttled_put_rewinds_body(mock_put):
+    body = io.BytesIO(b'hello world')
+    positions = []
+
+    def fake_put(url, data):
+        positions.append(data.tell())
+        data.read()
+        if len(positions) == 1:
+            return _response(429)
+        return _response(201)
+
+    mock_put.side_effect = fake_put
+    session = OSFSession()
+
+    with patch.object(session.rate_limiter, 'acquire'):
+        response = session.put('http://example.com/foo', data=body)
+
+    assert response.status_code == 201
+    assert positions == [0, 0]
+
+
+@patch('osfclient.models.session.requests.Session.put')
+def test_dont_retry_unrepeatable_put(mock_put):
+    mock_put.return_value = _response(429)
+    session = OSFSession()
+
+    with patch.object(session.rate_limiter, 'acquire'):
+        response = session.put('http://example.com/foo',
+                               data=iter([b'hello']))
+
+    assert response.status_code == 429
+    assert mock_put.call_count == 1
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_pause_when_running_out_of_requests(mock_get):
+    mock_get.return_value = _response(200, {'X-RateLimit-Remaining': '0',
+                                            'X-RateLimit-Reset': '7'})
+    session = OSFSession()
+
+    with patch.object(session.rate_limiter, 'acquire'):
+        with patch.object(session.rate_limiter, 'pause') as mock_pause:
+            session.get('http://example.com/foo')
+
+    mock_pause.assert_called_once_with(7.)
+
+
+def test_retry_after_http_date():
+    date = formatdate(time.time() + 60, usegmt=True)
+    delay = _retry_after(_response(429, {'Retry-After': date}))
+    assert 55 < delay <= 60
+
+    assert _retry_after(_response(429, {'Retry-After': 'garbage'})) is None
+    assert _retry_after(_response(429)) is None
+
+
+def _no_wait(session):
+    session.rate_limiter.configure(None)
+    session.retry_policy.backoff_factor = 0.
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_retry_connection_error(mock_get):
+    mock_get.side_effect = [ConnectionError(), _response(200)]
+    session = OSFSession()
+    _no_wait(session)
+
+    response = session.get('http://example.com/foo')
+
+    assert response.status_code == 200
+    assert mock_get.call_count == 2
+    assert session.retries == 1
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_retry_server_error(mock_get):
+    failed = _response(502)
+    mock_get.side_effect = [failed, failed, _response(200)]
+    session = OSFSession()
+    _no_wait(session)
+
+    response = session.get('http://example.com/foo')
+
+    assert response.status_code == 200
+    assert session.retries == 2
+    assert failed.close.called
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_give_up_after_too_many_retries(mock_get):
+    mock_get.side_effect = ConnectionError()
+    session = OSFSession(retries=2)
+    _no_wait(session)
+
+    with pytest.raises(ConnectionError):
+        session.get('http://example.com/foo')
+
+    assert mock_get.call_count == 3
+
+
+@patch('osfclient.models.session.requests.Session.delete')
+def test_retry_delete(mock_delete):
+    mock_delete.side_effect = [_response(500), _response(204)]
+    session = OSFSession()
+    _no_wait(session)
+
+    response = session.delete('http://example.com/foo')
+
+    assert response.status_code == 204
+
+
+@patch('osfclient.models.session.requests.Session.put')
+def test_dont_retry_put_of_generator(mock_put):
+    mock_put.side_effect = ConnectionError()
+    session = OSFSession()
+    _no_wait(session)
+
+    with pytest.raises(ConnectionError):
+        session.put('http://example.com/foo', data=iter([b'hello']))
+
+    assert mock_put.call_count == 1
+
+
+@patch('osfclient.models.session.requests.Session.put')
+def test_dont_retry_when_asked_not_to(mock_put):
+    mock_put.side_effect = ConnectionError()
+    session = OSFSession()
+    _no_wait(session)
+
+    with pytest.raises(ConnectionError):
+        session.put('http://example.com/foo', data=b'hello', retry=False)
+
+    assert mock_put.call_count == 1
+    assert 'retry' not in mock_put.call_args[1]
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_default_timeout(mock_get):
+    mock_get.return_value = _response(200)
+    session = OSFSession(timeout=10)
+    _no_wait(session)
+
+    session.get('http://example.com/foo')
+    session.get('http://example.com/foo', timeout=3)
+
+    assert mock_get.call_args_list == [
+        (('http://example.com/foo',), {'timeout': 10}),
+        (('http://example.com/foo',), {'timeout': 3})]
+
+
+def test_connection_pools_sized_for_concurrency():
+    session = OSFSession(concurrency=32)
+
+    api = session.get_adapter(API_URL + 'v2/nodes/f3szh/')
+    files = session.get_adapter(FILES_URL + 'v1/resources/f3szh/')
+    assert api is not files
+    for adapter in (api, files):
+        assert adapter._pool_maxsize == 32
+        assert adapter.max_retries.total == 0
+
+
+def test_minimum_pool_size():
+    session = OSFSession()
+    assert session.get_adapter(API_URL)._pool_maxsize == 10
+
+    with pytest.raises(ValueError):
+        session.set_concurrency(0)
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_share_session_between_threads(mock_get):
+    calls = []
+    state = threading.local()
+
+    def fake_get(url):
+        calls.append(url)
+        # in every thread the first attempt of each request fails
+        state.fail = not getattr(state, 'fail', False)
+        if state.fail:
+            raise ConnectionError()
+        return _response(200)
+
+    mock_get.side_effect = fake_get
+    session = OSFSession(rate_limit=1000, burst=1000, concurrency=8)
+    session.retry_policy.backoff_factor = 0.
+
+    def worker(n):
+        for i in range(25):
+            session.get('http://example.com/foo/{}/{}'.format(n, i))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 400
+    assert session.retries == 200
+    assert session.saved == 0
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_identical_requests_share_one_response(mock_get):
+    sent = threading.Event()
+    release = threading.Event()
+
+    def fake_get(url, **kwargs):
+        sent.set()
+        release.wait()
+        return _response(200)
+
+    mock_get.side_effect = fake_get
+    session = OSFSession(rate_limit=None, concurrency=4)
+    url = 'https://api.osf.io/v2/nodes/f3szh/files/'
+    responses = []
+
+    def worker():
+        responses.append(session.get(url))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    threads[0].start()
+    sent.wait()
+    for thread in threads[1:]:
+        thread.start()
+    # wait until all other threads are waiting for the first request
+    while session.saved < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert mock_get.call_count == 1
+    assert session.saved == 3
+    assert len(responses) == 4
+    assert all(r.status_code == 200 for r in responses)
+    assert not session._in_flight
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_waiting_requests_get_the_exception(mock_get):
+    release = threading.Event()
+
+    def fake_get(url, **kwargs):
+        release.wait()
+        raise UnauthorizedException()
+
+    mock_get.side_effect = fake_get
+    session = OSFSession(rate_limit=None)
+    url = 'https://api.osf.io/v2/nodes/f3szh/'
+    errors = []
+
+    def worker():
+        try:
+            session.get(url)
+        except UnauthorizedException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while session.saved < 1:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert mock_get.call_count == 1
+    assert len(errors) == 2
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_streamed_requests_are_not_shared(mock_get):
+    mock_get.return_value = _response(200)
+    session = OSFSession(rate_limit=None)
+    url = 'https://files.osf.io/v1/resources/f3szh/providers/osfstorage/foo'
+
+    session._in_flight[_cache_key(session, url, {})] = None
+    session.get(url, stream=True)
+
+    mock_get.assert_called_once_with(url, stream=True)
+    assert session.saved == 0
+
+
+def _json_response(status_code, content=b'{"data": []}', headers=None):
+    response = _response(status_code, dict({'Content-Type':
+                                            'application/vnd.api+json'},
+                                           **(headers or {})))
+    response.content = content
+    return response
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_conditional_get_from_cache(mock_get, tmpdir):
+    cache = ResponseCache(str(tmpdir))
+    session = OSFSession(cache=cache)
+    _no_wait(session)
+    url = 'https://api.osf.io/v2/nodes/f3szh/files/'
+
+    mock_get.return_value = _json_response(200, headers={'ETag': '"v1"'})
+    first = session.get(url)
+    mock_get.assert_called_once_with(url)
+
+    mock_get.return_value = _json_response(304, b'')
+    second = session.get(url)
+    mock_get.assert_called_with(url, headers={'If-None-Match': '"v1"'})
+
+    assert first.content == second.content
+    assert second.json() == {'data': []}
+    assert second.status_code == 200
+    assert cache.revalidated == 1
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_changed_response_replaces_cached_one(mock_get, tmpdir):
+    cache = ResponseCache(str(tmpdir))
+    session = OSFSession(cache=cache)
+    _no_wait(session)
+    url = 'https://api.osf.io/v2/nodes/f3szh/files/'
+
+    mock_get.return_value = _json_response(
+        200, headers={'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+    session.get(url)
+    mock_get.return_value = _json_response(200, b'{"data": [1]}',
+                                           headers={'ETag': '"v2"'})
+    response = session.get(url)
+
+    assert mock_get.call_args[1]['headers'] == {
+        'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+    assert response.content == b'{"data": [1]}'
+    assert cache.get(_cache_key(session, url, {}))[0] == {
+        'Content-Type': 'application/vnd.api+json', 'ETag': '"v2"'}
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_fresh_cached_response_needs_no_request(mock_get, tmpdir):
+    session = OSFSession(cache=ResponseCache(str(tmpdir), ttl=60))
+    _no_wait(session)
+    url = 'https://api.osf.io/v2/nodes/f3szh/files/'
+
+    mock_get.return_value = _json_response(200)
+    session.get(url)
+    response = session.get(url)
+
+    assert mock_get.call_count == 1
+    assert response.json() == {'data': []}
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_downloads_are_not_cached(mock_get, tmpdir):
+    cache = ResponseCache(str(tmpdir), ttl=60)
+    session = OSFSession(cache=cache)
+    _no_wait(session)
+    url = 'https://files.osf.io/v1/resources/f3szh/providers/osfstorage/foo'
+
+    mock_get.return_value = _json_response(200, headers={'ETag': '"v1"'})
+    session.get(url, stream=True)
+    mock_get.return_value = _response(200, {'ETag': '"v1"',
+                                            'Content-Type': 'text/plain'})
+    session.get(url)
+    session.get(url)
+
+    assert mock_get.call_count == 3
+    assert cache.misses == 0
+
+
+def test_cache_key_depends_on_user_and_params():
+    session = OSFSession()
+    url = 'https://api.osf.io/v2/nodes/f3szh/files/'
+
+    anonymous = _cache_key(session, url, {})
+    assert anonymous != _cache_key(session, url, {'params': {'page': 2}})
+    session.token_auth('secret')
+    assert anonymous != _cache_key(session, url, {})
+
+
+@patch('osfclient.models.session.requests.Session.put')
+@patch('osfclient.models.session.requests.Session.get')
+def test_request_hooks(mock_get, mock_put):
+    response = _response(200)
+    response.content = b'{"data": []}'
+    mock_get.side_effect = [ConnectionError(), response]
+    mock_put.return_value = _response(201)
+    session = OSFSession(rate_limit=None)
+    session.retry_policy.backoff_factor = 0.
+    events = []
+    session.add_hook(events.append)
+
+    session.get('https://api.osf.io/v2/nodes/f3szh/')
+    session.put('https://files.osf.io/v1/resources/f3szh/providers/'
+                'osfstorage/', data=b'hello')
+
+    get, put = events
+    assert (get.method, get.kind, get.status) == ('GET', 'api', 200)
+    assert get.retries == 1
+    assert get.received == 12
+    assert get.latency >= 0
+    assert (put.method, put.kind, put.status) == ('PUT', 'files', 201)
+    assert put.sent == 5
+
+    session.remove_hook(events.append)
+    mock_get.side_effect = None
+    mock_get.return_value = response
+    session.get('https://api.osf.io/v2/nodes/f3szh/')
+    assert len(events) == 2
+
+
+@patch('osfclient.models.session.requests.Session.get')
+def test_request_hooks_see_throttling_and_errors(mock_get):
+    mock_get.side_effect = [_response(429, {'Retry-After': '1'}),
+                            UnauthorizedException()]
+    events = []
+
+    with patch('osfclient.models.ratelimit.time') as mock_time, \
+            patch('osfclient.models.ratelimit.monotonic') as mock_monotonic:
+        mock_monotonic.return_value = 0.
+        session = OSFSession(rate_limit=None)
+        session.add_hook(events.append)
+        with pytest.raises(UnauthorizedException):
+            session.get('https://api.osf.io/v2/nodes/f3szh/')
+
+    event, = events
+    assert event.status is None
+    assert isinstance(event.error, UnauthorizedException)
+    assert event.throttled == 1.
+    mock_time.sleep.assert_called_once_with(1.)
+
+
+@pytest.mark.parametrize('fast', [True, False])
+def test_loads(fast):
+    with patch('osfclient.models.session.orjson',
+               session_module.orjson if fast else None):
+        assert loads(b'{"data": [1, "\xc3\xa9"]}') == {'data': [1, u'\xe9']}
+        assert loads(u'{"data": null}') == {'data': None}
+        # orjson does not accept NaN
+        assert math.isnan(loads(b'{"a": NaN}')['a'])
+        with pytest.raises(ValueError):
+            loads(b'{"data": ')
+
+
+def test_decode_json():
+    json_loads = MagicMock(return_value={'data': []})
+    session = OSFSession(json_loads=json_loads)
+    response = MagicMock(content=b'{"data": []}')
+
+    assert session.decode_json(response) == {'data': []}
+    json_loads.assert_called_once_with(b'{"data": []}')
+    assert OSFSession().decode_json(FakeResponse(200, {'x': 1})) == {'x': 1}
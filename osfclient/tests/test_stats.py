@@ -0,0 +1,54 @@
+from mock import patch
+
+from osfclient.models import RequestEvent
+from osfclient.models import RequestStats
+from osfclient.models.stats import percentile
+from osfclient.models.stats import url_kind
+
+
+def test_url_kind():
+    assert url_kind('https://api.osf.io/v2/nodes/f3szh/') == 'api'
+    assert url_kind('https://files.osf.io/v1/resources/f3szh/providers/'
+                    'osfstorage/foo') == 'files'
+    assert url_kind('https://example.com/') == 'other'
+
+
+def test_percentile():
+    values = list(range(101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.], 90) == 3.
+    assert percentile([], 50) == 0.
+
+
+def _event(url, status, latency, **attributes):
+    event = RequestEvent('GET', url)
+    event.status = status
+    event.latency = latency
+    for name, value in attributes.items():
+        setattr(event, name, value)
+    return event
+
+
+@patch('osfclient.models.stats.monotonic')
+def test_summary(mock_monotonic):
+    mock_monotonic.return_value = 10.
+    stats = RequestStats()
+    stats(_event('https://api.osf.io/v2/nodes/f3szh/', 200, 0.1,
+                 throttled=1., received=100))
+    stats(_event('https://api.osf.io/v2/nodes/f3szh/files/', 200, 0.3,
+                 retries=2, retry_wait=0.5, received=200))
+    stats(_event('https://files.osf.io/v1/resources/f3szh/providers/'
+                 'osfstorage/foo', None, 2., sent=50))
+
+    mock_monotonic.return_value = 15.
+    summary = stats.summary().splitlines()
+
+    assert summary[0] == '3 requests in 5.00s'
+    assert summary[1].split() == ['api', '2', 'requests,', 'latency',
+                                  'p50', '0.100s', 'p90', '0.300s', 'p99',
+                                  '0.300s', 'max', '0.300s', '(200:', '2)']
+    assert summary[2].endswith('max 2.000s (error: 1)')
+    assert summary[3] == ('waiting for the server 2.40s, rate limited 1.00s, '
+                          'before retries 0.50s (2 retries)')
+    assert summary[4] == 'sent 50 bytes, received 300 bytes'
@@ -1,6 +1,8 @@
 from mock import patch, MagicMock, call
 
 import os
+import threading
+import time
 import pytest
 import six
 
@@ -10,6 +12,9 @@ from osfclient.models import OSFCore
 from osfclient.models import Storage
 from osfclient.models import File
 from osfclient.models import Folder
+from osfclient.models import StorageIndex
+from osfclient.models.storage import clone_storages
+from osfclient.utils import checksum
 
 from osfclient.tests import fake_responses
 from osfclient.tests.mocks import FakeResponse, MockFile
@@ -33,7 +38,8 @@ def test_iterate_files(OSFCore_get):
         assert file_.session == store.session
 
     OSFCore_get.assert_called_once_with(
-        'https://api.osf.io/v2//nodes/f3szh/files/osfstorage')
+        'https://api.osf.io/v2//nodes/f3szh/files/osfstorage',
+        params={'page[size]': 100})
 
 
 @patch.object(OSFCore, '_get')
@@ -55,7 +61,8 @@ def test_iterate_folders(OSFCore_get):
         assert folder.name in ('foo', 'bar')
 
     OSFCore_get.assert_called_once_with(
-        'https://api.osf.io/v2//nodes/f3szh/files/osfstorage')
+        'https://api.osf.io/v2//nodes/f3szh/files/osfstorage',
+        params={'page[size]': 100})
 
 
 def test_iterate_files_and_folders():
@@ -75,7 +82,7 @@ def test_iterate_files_and_folders():
                                                  'foo/bye2.txt'])
     second_level_response = FakeResponse(200, json)
 
-    def simple_OSFCore_get(url):
+    def simple_OSFCore_get(url, params=None):
         if url == store._files_url:
             return top_level_response
         elif url == second_level_url:
@@ -91,17 +98,19 @@ def test_iterate_files_and_folders():
         assert file_.session == store.session
 
     # check right URLs are called in the right order
-    expected = [((store._files_url,),), ((second_level_url,),)]
+    expected = [call(store._files_url, params={'page[size]': 100}),
+                call(second_level_url, params={'page[size]': 100})]
     assert mock_osf_get.call_args_list == expected
 
 
-def test_create_existing_file():
+def test_create_existing_file(monkeypatch):
     # try to create file with a name that is already taken
     new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
                     'osfstorage/foo123/')
     store = Storage({})
     store._new_file_url = new_file_url
-    store._put = MagicMock(return_value=FakeResponse(409, None))
+    monkeypatch.setattr(Storage, '_put',
+                        MagicMock(return_value=FakeResponse(409, None)))
 
     try:
         exception = FileExistsError
@@ -115,7 +124,8 @@ def test_create_existing_file():
 
     store._put.assert_called_once_with(new_file_url,
                                        data=fake_fp,
-                                       params={'name': 'foo.txt'})
+                                       params={'name': 'foo.txt'},
+                                       retry=False)
 
     assert fake_fp.call_count == 0
 
@@ -127,7 +137,7 @@ def test_force_existing_file():
     store = Storage({})
     store._new_file_url = new_file_url
 
-    def simple_OSFCore_put(url, params=None, data=None):
+    def simple_OSFCore_put(url, params=None, data=None, retry=True):
         if url == new_file_url:
             return FakeResponse(409, None)
         elif url.endswith("osfstorage/foo.txt"):
@@ -138,7 +148,7 @@ def test_force_existing_file():
                                      file_names=['hello.txt', 'foo.txt'])
     top_level_response = FakeResponse(200, json)
 
-    def simple_OSFCore_get(url):
+    def simple_OSFCore_get(url, params=None):
         if url == store._files_url:
             return top_level_response
 
@@ -167,7 +177,7 @@ def test_update_existing_file_files_differ():
     store = Storage({})
     store._new_file_url = new_file_url
 
-    def simple_OSFCore_put(url, params=None, data=None):
+    def simple_OSFCore_put(url, params=None, data=None, retry=True):
         if url == new_file_url:
             return FakeResponse(409, None)
         elif url.endswith("osfstorage/foo.txt"):
@@ -180,7 +190,7 @@ def test_update_existing_file_files_differ():
         json['data'][i_file]['attributes']['extra']['hashes']['md5'] = '1' * 32
     top_level_response = FakeResponse(200, json)
 
-    def simple_OSFCore_get(url):
+    def simple_OSFCore_get(url, params=None):
         if url == store._files_url:
             return top_level_response
 
@@ -214,7 +224,7 @@ def test_update_existing_file_files_match():
     store = Storage({})
     store._new_file_url = new_file_url
 
-    def simple_OSFCore_put(url, params=None, data=None):
+    def simple_OSFCore_put(url, params=None, data=None, retry=True):
         if url == new_file_url:
             return FakeResponse(409, None)
         elif url.endswith("osfstorage/foo.txt"):
@@ -227,7 +237,7 @@ def test_update_existing_file_files_match():
         json['data'][i_file]['attributes']['extra']['hashes']['md5'] = '0' * 32
     top_level_response = FakeResponse(200, json)
 
-    def simple_OSFCore_get(url):
+    def simple_OSFCore_get(url, params=None):
         if url == store._files_url:
             return top_level_response
 
@@ -261,7 +271,7 @@ def test_update_existing_file_files_match_force_overrides_update():
     store = Storage({})
     store._new_file_url = new_file_url
 
-    def simple_OSFCore_put(url, params=None, data=None):
+    def simple_OSFCore_put(url, params=None, data=None, retry=True):
         if url == new_file_url:
             return FakeResponse(409, None)
         elif url.endswith("osfstorage/foo.txt"):
@@ -274,7 +284,7 @@ def test_update_existing_file_files_match_force_overrides_update():
         json['data'][i_file]['attributes']['extra']['hashes']['md5'] = '0' * 32
     top_level_response = FakeResponse(200, json)
 
-    def simple_OSFCore_get(url):
+    def simple_OSFCore_get(url, params=None):
         if url == store._files_url:
             return top_level_response
 
@@ -309,7 +319,7 @@ def test_update_existing_file_fails():
     store = Storage({})
     store._new_file_url = new_file_url
 
-    def simple_OSFCore_put(url, params=None, data=None):
+    def simple_OSFCore_put(url, params=None, data=None, retry=True):
         if url == new_file_url:
             return FakeResponse(409, None)
         elif url.endswith("osfstorage/foo.txt"):
@@ -323,7 +333,7 @@ def test_update_existing_file_fails():
                                      file_names=['hello.txt', 'bar.txt'])
     top_level_response = FakeResponse(200, json)
 
-    def simple_OSFCore_get(url):
+    def simple_OSFCore_get(url, params=None):
         if url == store._files_url:
             return top_level_response
 
@@ -337,13 +347,14 @@ def test_update_existing_file_fails():
                 store.create_file('foo.txt', fake_fp, update=True)
 
 
-def test_create_new_file():
+def test_create_new_file(monkeypatch):
     # create a new file at the top level
     new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
                     'osfstorage/foo123/')
     store = Storage({})
     store._new_file_url = new_file_url
-    store._put = MagicMock(return_value=FakeResponse(201, None))
+    monkeypatch.setattr(Storage, '_put',
+                        MagicMock(return_value=FakeResponse(201, None)))
 
     fake_fp = MagicMock()
     fake_fp.mode = 'rb'
@@ -352,7 +363,8 @@ def test_create_new_file():
 
     store._put.assert_called_once_with(new_file_url,
                                        data=fake_fp,
-                                       params={'name': 'foo.txt'})
+                                       params={'name': 'foo.txt'},
+                                       retry=False)
 
     assert fake_fp.call_count == 0
 
@@ -367,7 +379,7 @@ def test_create_new_file_subdirectory():
     store._new_file_url = new_file_url
     store._new_folder_url = new_folder_url
 
-    def simple_put(url, params={}, data=None):
+    def simple_put(url, params={}, data=None, retry=True):
         if url == new_folder_url:
             # this is a full fledged Folder response but also works as a
             # fake for _WaterButlerFolder
@@ -387,19 +399,21 @@ def test_create_new_file_subdirectory():
     with patch.object(Storage, '_put', side_effect=simple_put) as mock_put:
         store.create_file('bar/foo.txt', fake_fp)
 
-    expected = [call(new_folder_url, params={'name': 'bar'}),
-                call(new_file_url, params={'name': 'foo.txt'}, data=fake_fp)]
+    expected = [call(new_folder_url, params={'name': 'bar'}, retry=False),
+                call(new_file_url, params={'name': 'foo.txt'}, data=fake_fp,
+                     retry=False)]
     assert mock_put.call_args_list == expected
     assert fake_fp.call_count == 0
 
 
-def test_create_new_zero_length_file():
+def test_create_new_zero_length_file(monkeypatch):
     # check zero length files are special cased
     new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
                     'osfstorage/foo123/')
     store = Storage({})
     store._new_file_url = new_file_url
-    store._put = MagicMock(return_value=FakeResponse(201, None))
+    monkeypatch.setattr(Storage, '_put',
+                        MagicMock(return_value=FakeResponse(201, None)))
 
     fake_fp = MagicMock()
     fake_fp.mode = 'rb'
@@ -414,19 +428,21 @@ def test_create_new_zero_length_file():
                                        # this is the important check in
                                        # this test
                                        data=b'',
-                                       params={'name': 'foo.txt'})
+                                       params={'name': 'foo.txt'},
+                                       retry=False)
 
     assert fake_fp.call_count == 0
 
 
-def test_create_small_file_connection_error():
+def test_create_small_file_connection_error(monkeypatch):
     # turn a requests.ConnectionError into a RuntimeError with a more helpful
     # message that the file might exist
     new_file_url = ('https://files.osf.io/v1/resources/9zpcy/providers/' +
                     'osfstorage/foo123/')
     store = Storage({})
     store._new_file_url = new_file_url
-    store._put = MagicMock(side_effect=ConnectionError)
+    monkeypatch.setattr(Storage, '_put',
+                        MagicMock(side_effect=ConnectionError))
 
     try:
         exception = RuntimeError
@@ -443,7 +459,8 @@ def test_create_small_file_connection_error():
 
     store._put.assert_called_once_with(new_file_url,
                                        data=fake_fp,
-                                       params={'name': 'foo.txt'})
+                                       params={'name': 'foo.txt'},
+                                       retry=False)
 
     assert fake_fp.call_count == 0
 
@@ -455,7 +472,8 @@ def test_create_big_file_connection_error(monkeypatch):
                     'osfstorage/foo123/')
     store = Storage({})
     store._new_file_url = new_file_url
-    store._put = MagicMock(side_effect=ConnectionError)
+    monkeypatch.setattr(Storage, '_put',
+                        MagicMock(side_effect=ConnectionError))
 
     try:
         exception = FileExistsError
@@ -472,7 +490,8 @@ def test_create_big_file_connection_error(monkeypatch):
 
     store._put.assert_called_once_with(new_file_url,
                                        data=fake_fp,
-                                       params={'name': 'foo.txt'})
+                                       params={'name': 'foo.txt'},
+                                       retry=False)
 
     assert fake_fp.call_count == 0
 
@@ -484,7 +503,7 @@ def test_update_existing_file_overrides_connection_error():
     store = Storage({})
     store._new_file_url = new_file_url
 
-    def simple_OSFCore_put(url, params=None, data=None):
+    def simple_OSFCore_put(url, params=None, data=None, retry=True):
         if url == new_file_url:
             raise ConnectionError
         elif url.endswith("osfstorage/foo.txt"):
@@ -498,7 +517,7 @@ def test_update_existing_file_overrides_connection_error():
                                      file_names=['hello.txt', 'foo.txt'])
     top_level_response = FakeResponse(200, json)
 
-    def simple_OSFCore_get(url):
+    def simple_OSFCore_get(url, params=None):
         if url == store._files_url:
             return top_level_response
 
@@ -519,3 +538,416 @@ def test_update_existing_file_overrides_connection_error():
     assert fake_put.call_count == 2
     # should have made one GET request to list files
     assert fake_get.call_count == 1
+
+
+def test_iterate_files_without_reading_all_pages():
+    store = Storage({})
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    page = fake_responses.files_node('f3szh', 'osfstorage',
+                                     ['hello.txt', 'bye.txt'])
+    page['links']['next'] = store._files_url + '?page=2'
+
+    with patch.object(OSFCore, '_get',
+                      return_value=FakeResponse(200, page)) as mock_get:
+        files = store.files
+        first = next(files)
+
+    assert first.name == 'hello.txt'
+    assert mock_get.call_count == 1
+
+
+def _folder_url(name):
+    return 'https://api.osf.io/v2/nodes/9zpcy/files/osfstorage/%s123/' % name
+
+
+def _tree_responses(store):
+    # root: a.txt, x/, y/ -- x: x1.txt, z/ -- y: y1.txt -- z: z1.txt
+    listings = {
+        store._files_url: (['a.txt'], ['x', 'y']),
+        _folder_url('x'): (['x1.txt'], ['z']),
+        _folder_url('y'): (['y1.txt'], None),
+        _folder_url('z'): (['z1.txt'], None),
+    }
+    return dict((url, FakeResponse(200, fake_responses.files_node(
+                     'f3szh', 'osfstorage', files, folder_names=folders)))
+                for url, (files, folders) in listings.items())
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_walk_ordered(workers):
+    store = Storage({})
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    responses = _tree_responses(store)
+
+    def simple_OSFCore_get(url, params=None):
+        return responses[url]
+
+    with patch.object(OSFCore, '_get', side_effect=simple_OSFCore_get):
+        files = list(store.walk(workers=workers, ordered=True))
+
+    assert [f.name for f in files] == ['a.txt', 'x1.txt', 'z1.txt',
+                                       'y1.txt']
+    assert all(isinstance(f, File) for f in files)
+
+
+def test_walk_in_parallel():
+    store = Storage({})
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    responses = _tree_responses(store)
+    threads = set()
+
+    def simple_OSFCore_get(url, params=None):
+        threads.add(threading.current_thread())
+        return responses[url]
+
+    with patch.object(OSFCore, '_get', side_effect=simple_OSFCore_get):
+        files = list(store.walk(workers=4))
+
+    assert sorted(f.name for f in files) == ['a.txt', 'x1.txt', 'y1.txt',
+                                             'z1.txt']
+    assert threading.current_thread() not in threads
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_walk_stays_close_to_reader(ordered):
+    # taking one file from a large tree only lists a few folders ahead
+    store = Storage({})
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    names = ['f%d' % n for n in range(100)]
+    responses = {store._files_url: FakeResponse(200, fake_responses.files_node(
+        'f3szh', 'osfstorage', ['a.txt'], folder_names=names))}
+    for name in names:
+        responses[_folder_url(name)] = FakeResponse(
+            200, fake_responses.files_node('f3szh', 'osfstorage',
+                                           [name + '.txt']))
+    requested = []
+
+    def simple_OSFCore_get(url, params=None):
+        requested.append(url)
+        return responses[url]
+
+    with patch.object(OSFCore, '_get', side_effect=simple_OSFCore_get):
+        files = store.walk(workers=4, ordered=ordered)
+        next(files)
+        next(files)
+        time.sleep(0.1)
+        files.close()
+
+    assert len(requested) <= 1 + 2 * 4 + 1
+
+
+def test_walk_raises_listing_errors():
+    store = Storage({})
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    responses = _tree_responses(store)
+    responses[_folder_url('z')] = FakeResponse(500, {})
+
+    def simple_OSFCore_get(url, params=None):
+        return responses[url]
+
+    with patch.object(OSFCore, '_get', side_effect=simple_OSFCore_get):
+        with pytest.raises(RuntimeError):
+            list(store.walk(workers=4))
+
+
+def test_files_uses_session_concurrency():
+    store = Storage({})
+    store.session.set_concurrency(4)
+
+    with patch.object(Storage, 'walk') as walk:
+        store.files
+
+    walk.assert_called_once_with(ordered=True)
+
+
+def test_file_at():
+    store = Storage({})
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    responses = _tree_responses(store)
+
+    def simple_OSFCore_get(url, params=None):
+        return responses[url]
+
+    with patch.object(OSFCore, '_get',
+                      side_effect=simple_OSFCore_get) as mock_get:
+        file_ = store.file_at('/x/z/z1.txt')
+
+    assert isinstance(file_, File)
+    assert file_.name == 'z1.txt'
+    # only the folders on the way were listed
+    assert [c[0][0] for c in mock_get.call_args_list] == [
+        store._files_url, _folder_url('x'), _folder_url('z')]
+    # the OSF was asked to only send the entries we are looking for
+    assert mock_get.call_args_list[-1][1]['params'] == {
+        'page[size]': 100, 'filter[name]': 'z1.txt', 'filter[kind]': 'file'}
+
+
+@pytest.mark.parametrize('path', ['x/missing.txt', 'missing/z1.txt',
+                                  'x/z', 'y/y1.txt/foo'])
+def test_file_at_missing(path):
+    store = Storage({})
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    responses = _tree_responses(store)
+
+    def simple_OSFCore_get(url, params=None):
+        return responses[url]
+
+    with patch.object(OSFCore, '_get', side_effect=simple_OSFCore_get):
+        assert store.file_at(path) is None
+
+
+def _indexed_store(tmpdir):
+    store = Storage({})
+    store.id = 'f3szh:osfstorage'
+    store._files_url = 'https://api.osf.io/v2//nodes/f3szh/files/osfstorage'
+    store.session.index = StorageIndex(str(tmpdir))
+    return store
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_walk_fills_index(workers, tmpdir):
+    store = _indexed_store(tmpdir)
+    responses = _tree_responses(store)
+
+    def simple_OSFCore_get(url, params=None):
+        return responses[url]
+
+    with patch.object(OSFCore, '_get', side_effect=simple_OSFCore_get):
+        list(store.walk(workers=workers))
+
+    with patch.object(OSFCore, '_get') as mock_get:
+        files = list(store.walk(cached=True))
+        file_ = store.file_at('/a.txt', cached=True)
+
+    assert not mock_get.called
+    assert [f.name for f in files] == ['a.txt', 'x1.txt', 'y1.txt',
+                                       'z1.txt']
+    assert all(isinstance(f, File) for f in files)
+    assert file_.name == 'a.txt'
+
+
+def test_incomplete_walk_does_not_fill_index(tmpdir):
+    store = _indexed_store(tmpdir)
+    responses = _tree_responses(store)
+
+    def simple_OSFCore_get(url, params=None):
+        return responses[url]
+
+    with patch.object(OSFCore, '_get', side_effect=simple_OSFCore_get):
+        files = store.walk()
+        next(files)
+        files.close()
+
+        # not indexed, so we walk the storage again
+        assert len(list(store.walk(cached=True))) == 4
+
+    assert store.session.index.indexed(store.id) is not None
+
+
+def test_file_at_falls_back_to_osf(tmpdir):
+    store = _indexed_store(tmpdir)
+    responses = _tree_responses(store)
+
+    def simple_OSFCore_get(url, params=None):
+        return responses[url]
+
+    with patch.object(OSFCore, '_get',
+                      side_effect=simple_OSFCore_get) as mock_get:
+        file_ = store.file_at('y/y1.txt', cached=True)
+
+    assert file_.name == 'y1.txt'
+    assert mock_get.call_count == 2
+
+
+def _dated_responses(store, tree):
+    # `tree` maps folder paths to the names and dates of modification of
+    # their entries, names of folders end in a slash
+    responses = {}
+    for folder, children in tree.items():
+        entries = []
+        for name, modified in children:
+            path = folder + '/' + name if folder else name
+            if name.endswith('/'):
+                entry = fake_responses._folder(path[:-1] + '123', name[:-1])
+            else:
+                entry = fake_responses.files_node('f3szh', 'osfstorage',
+                                                  [name])['data'][0]
+            entry['attributes']['materialized_path'] = '/' + path
+            entry['attributes']['date_modified'] = modified
+            entries.append(entry)
+
+        url = _folder_url(folder) if folder else store._files_url
+        responses[url] = FakeResponse(200, {'data': entries,
+                                            'links': {'next': None}})
+    return responses
+
+
+_TREE = {
+    '': [('a.txt', '2017-01-01'), ('x/', '2017-01-01'),
+         ('y/', '2017-01-01')],
+    'x': [('x1.txt', '2017-01-01'), ('z/', '2017-01-01')],
+    'x/z': [('z1.txt', '2017-01-01')],
+    'y': [('y1.txt', '2017-01-01')],
+}
+
+
+def _refresh(store, tree):
+    responses = _dated_responses(store, tree)
+
+    def simple_OSFCore_get(url, params=None):
+        return responses[url]
+
+    with patch.object(OSFCore, '_get',
+                      side_effect=simple_OSFCore_get) as mock_get:
+        changes = store.refresh_index()
+    return changes, [c[0][0] for c in mock_get.call_args_list]
+
+
+def _paths(files):
+    return sorted(f.path for f in files)
+
+
+def test_refresh_index_first_time(tmpdir):
+    store = _indexed_store(tmpdir)
+
+    changes, _ = _refresh(store, _TREE)
+
+    assert _paths(changes.added) == ['/a.txt', '/x/x1.txt', '/x/z/z1.txt',
+                                     '/y/y1.txt']
+    assert not changes.modified
+    assert not changes.removed
+    assert store.session.index.get(store.id, 'x/z/z1.txt') is not None
+
+
+def test_refresh_index_only_lists_changed_folders(tmpdir):
+    store = _indexed_store(tmpdir)
+    _refresh(store, _TREE)
+
+    tree = dict(_TREE)
+    tree[''] = [('x/', '2017-01-01'), ('y/', '2017-02-01')]
+    tree['y'] = [('y1.txt', '2017-02-01'), ('y2.txt', '2017-02-01')]
+    changes, urls = _refresh(store, tree)
+
+    assert urls == [store._files_url, _folder_url('y')]
+    assert _paths(changes.added) == ['/y/y2.txt']
+    assert _paths(changes.modified) == ['/y/y1.txt']
+    assert _paths(changes.removed) == ['/a.txt']
+    assert len(changes) == 3
+    # the files of the folder that did not change are still indexed
+    index = store.session.index
+    assert [f['attributes']['materialized_path']
+            for f in index.files(store.id)] == [
+        '/x/x1.txt', '/x/z/z1.txt', '/y/y1.txt', '/y/y2.txt']
+
+
+def test_refresh_index_removed_folder(tmpdir):
+    store = _indexed_store(tmpdir)
+    _refresh(store, _TREE)
+
+    tree = dict(_TREE)
+    tree[''] = [('a.txt', '2017-01-01'), ('y/', '2017-01-01')]
+    changes, urls = _refresh(store, tree)
+
+    assert urls == [store._files_url]
+    assert not changes.added
+    assert _paths(changes.removed) == ['/x/x1.txt', '/x/z/z1.txt']
+    assert store.session.index.get(store.id, 'x/x1.txt') is None
+
+
+def test_refresh_index_lists_folders_without_date(tmpdir):
+    store = _indexed_store(tmpdir)
+    tree = dict(_TREE)
+    tree[''] = [('a.txt', '2017-01-01'), ('x/', None), ('y/', None)]
+    _refresh(store, tree)
+
+    changes, urls = _refresh(store, tree)
+
+    # x/z has a date and did not change
+    assert sorted(urls) == sorted([store._files_url, _folder_url('x'),
+                                   _folder_url('y')])
+    assert not changes
+
+
+def test_refresh_index_needs_index():
+    store = Storage({})
+
+    with pytest.raises(RuntimeError):
+        store.refresh_index()
+
+
+def _cloned_file(path, error=None):
+    file_ = MockFile(path)
+
+    def download(local_path, checksums=None):
+        with open(local_path + '.part', 'wb') as fp:
+            fp.write(b'data of ' + path.encode('utf-8'))
+        if error is not None:
+            raise error
+        os.rename(local_path + '.part', local_path)
+    file_.download.side_effect = download
+    return file_
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_clone_storages(jobs, tmpdir):
+    files = [_cloned_file('/a.txt'), _cloned_file('/x/b.txt'),
+             _cloned_file('/x/c.txt', error=ConnectionError())]
+    store = MagicMock(walk=MagicMock(return_value=files))
+    broken = MagicMock(walk=MagicMock(side_effect=RuntimeError))
+    callback = MagicMock()
+
+    failed = clone_storages([(store, str(tmpdir.join('store'))),
+                             (broken, str(tmpdir.join('broken')))],
+                            jobs=jobs, callback=callback)
+
+    assert tmpdir.join('store', 'a.txt').read_binary() == b'data of /a.txt'
+    assert tmpdir.join('store', 'x', 'b.txt').read_binary() == \
+        b'data of /x/b.txt'
+    # half downloaded files are kept to continue from later
+    assert not tmpdir.join('store', 'x', 'c.txt').exists()
+    assert tmpdir.join('store', 'x', 'c.txt.part').exists()
+    assert sorted(c[0][0].path for c in callback.call_args_list) == [
+        '/a.txt', '/x/b.txt']
+    assert set(item for item, _ in failed) == set([files[2], broken])
+
+
+def test_clone_storages_update(tmpdir):
+    tmpdir.join('a.txt').write_binary(b'old')
+    same = _cloned_file('/a.txt')
+    type(same).hashes = {'md5': checksum(str(tmpdir.join('a.txt')))}
+    store = MagicMock(walk=MagicMock(return_value=[same]))
+
+    assert clone_storages([(store, str(tmpdir))], update=True) == []
+
+    assert not same.download.called
+
+
+def test_clone_storages_needs_a_job():
+    with pytest.raises(ValueError):
+        clone_storages([], jobs=0)
+
+
+def test_storage_clone(tmpdir):
+    store = Storage({})
+
+    with patch('osfclient.models.storage.clone_storages') as clone_storages:
+        store.clone(str(tmpdir), jobs=3)
+
+    clone_storages.assert_called_once_with([(store, str(tmpdir))], jobs=3,
+                                           update=False, callback=None,
+                                           checksums=None)
+
+
+def test_clone_storages_update_uses_checksums(tmpdir):
+    tmpdir.join('a.txt').write_binary(b'old')
+    same = _cloned_file('/a.txt')
+    type(same).hashes = {'md5': '0' * 32}
+    store = MagicMock(walk=MagicMock(return_value=[same]))
+    checksums = MagicMock()
+    checksums.checksum.return_value = '0' * 32
+
+    assert clone_storages([(store, str(tmpdir))], update=True,
+                          checksums=checksums) == []
+
+    checksums.checksum.assert_called_once_with(str(tmpdir.join('a.txt')))
+    assert not same.download.called
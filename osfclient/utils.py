@@ -5,10 +5,29 @@ Helpers and other assorted functions.
 
 import hashlib
 import os
+import time
+
 import six
 
 KNOWN_PROVIDERS = ['osfstorage', 'github', 'figshare', 'googledrive', 'owncloud']
 
+# clock for measuring intervals, Python 2 only has the wall clock
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+def default_cache_dir():
+    """Directory in which osfclient keeps cached data.
+
+    Set the `OSF_CACHE_DIR` environment variable to use a different
+    directory.
+    """
+    path = os.getenv('OSF_CACHE_DIR')
+    if path is None:
+        base = os.getenv('XDG_CACHE_HOME',
+                         os.path.join(os.path.expanduser('~'), '.cache'))
+        path = os.path.join(base, 'osfclient')
+    return path
+
 
 def norm_remote_path(path):
     """Normalize `path`.
@@ -75,6 +75,12 @@ setup(
     # https://packaging.python.org/en/latest/requirements.html
     install_requires=required,
 
+    # Optional dependencies, install with `pip install osfclient[async]`
+    extras_require={
+        'async': ['aiohttp; python_version>="3.7"'],
+        'fast': ['orjson'],
+    },
+
     # To provide executable scripts, use entry points in preference to the
     # "scripts" keyword. Entry points provide cross-platform support and allow
     # pip to create the appropriate form of executable for the target platform.